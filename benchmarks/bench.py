@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# Micro-benchmarks of the simulator hot paths, with JSON baselines to compare changes against.
+#
+#   python3 benchmarks/bench.py run -o benchmarks/baselines/main.json
+#   python3 benchmarks/bench.py run -o current.json
+#   python3 benchmarks/bench.py compare benchmarks/baselines/main.json current.json --threshold 10
+
+import argparse
+import datetime
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+from cases import BENCHMARKS
+
+
+def measure(setup, ops, rounds, min_time):
+    """Operations per second of every round, each round repeating the case for at least min_time seconds"""
+    run = setup()
+    # warm up, and find how many calls fill a round
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4:
+            break
+        calls *= 2
+    calls = max(1, int(calls * min_time / elapsed))
+    results = []
+    # as timeit does, so a collection triggered by earlier garbage does not land in a random round
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(calls):
+                run()
+            results.append(calls * ops / (time.perf_counter() - start))
+    finally:
+        gc.enable()
+    return results
+
+
+def run_benchmarks(patterns, rounds, min_time):
+    results = {}
+    for name, (setup, ops) in BENCHMARKS.items():
+        if patterns and not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            continue
+        try:
+            per_round = measure(setup, ops, rounds, min_time)
+        except NameError as e:
+            # a payload format whose package is not installed
+            print(f"{name:32} skipped: {e}")
+            continue
+        # the fastest round is the one least disturbed by the rest of the machine
+        best = max(per_round)
+        median = statistics.median(per_round)
+        results[name] = {
+            'ops_per_sec': best,
+            'ns_per_op': 1e9 / best,
+            'median_ops_per_sec': median,
+            'stdev_pct': statistics.stdev(per_round) / median * 100 if len(per_round) > 1 else 0.0,
+            'rounds': per_round
+        }
+        print(f"{name:32} {best:14,.0f} ops/s {1e9 / best:12,.0f} ns/op  +-{results[name]['stdev_pct']:.1f}%")
+    return results
+
+
+def compare(baseline, current, threshold):
+    """Print the change of every benchmark in both files, returns the names that got slower by more than threshold percent"""
+    regressions = []
+    print(f'{"Benchmark":32} {"Baseline ops/s":>16} {"Current ops/s":>16} {"Change":>9}')
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        if name not in baseline['results'] or name not in current['results']:
+            where = 'baseline' if name not in baseline['results'] else 'current results'
+            print(f"{name:32} missing from the {where}")
+            continue
+        before = baseline['results'][name]['ops_per_sec']
+        after = current['results'][name]['ops_per_sec']
+        change = (after - before) / before * 100
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change > threshold:
+            flag = '  faster'
+        print(f"{name:32} {before:16,.0f} {after:16,.0f} {change:+8.1f}%{flag}")
+    if baseline.get('machine') != current.get('machine'):
+        print(f"Note: measured on different machines ({baseline.get('machine')} and {current.get('machine')})")
+    return regressions
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(prog='bench', description='micro-benchmarks of the simulator hot paths')
+    commands = ap.add_subparsers(dest='command', required=True)
+    run_command = commands.add_parser('run', help='run the benchmarks and write their results as JSON')
+    run_command.add_argument('patterns', nargs='*', help='only the benchmarks matching these glob patterns, e.g. "payload.*"')
+    run_command.add_argument('-o', '--output', default=None, help='JSON file the results are written to, e.g. a baseline in benchmarks/baselines')
+    run_command.add_argument('-r', '--rounds', type=int, default=5, help='rounds per benchmark, the fastest one is reported')
+    run_command.add_argument('-t', '--min-time', type=float, default=0.2, help='minimum seconds per round')
+    run_command.add_argument('-l', '--list', action='store_true', help='list the benchmarks and exit')
+    compare_command = commands.add_parser('compare', help='compare results with a baseline, exits with 1 on a regression')
+    compare_command.add_argument('baseline', help='baseline JSON file')
+    compare_command.add_argument('current', help='JSON file of the results to check')
+    compare_command.add_argument('--threshold', type=float, default=10.0, help='percent of throughput lost before a benchmark counts as a regression')
+    opts = ap.parse_args()
+
+    if opts.command == 'compare':
+        with open(opts.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(opts.current, encoding='utf-8') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, opts.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {opts.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        sys.exit(0)
+
+    if opts.list:
+        for name, (_, ops) in BENCHMARKS.items():
+            print(f"{name:32} {ops:8} ops per call")
+        sys.exit(0)
+
+    results = run_benchmarks(opts.patterns, opts.rounds, opts.min_time)
+    from log_writer import close_log_writer
+    close_log_writer()
+    if opts.output:
+        document = {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': f"{platform.machine()} {platform.processor() or platform.system()} {os.cpu_count()} cpus",
+            'results': results
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(opts.output)), exist_ok=True)
+        with open(opts.output, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+        print(f"Results written to {opts.output}")
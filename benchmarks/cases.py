@@ -0,0 +1,239 @@
+# Benchmark cases for the hot paths of the simulator and the analysis tools.
+# Every case is set up once and returns a function doing `ops` operations per call, so results are operations per second on one core.
+
+import csv
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'clients' / 'simulate'))
+sys.path.insert(0, str(ROOT / 'tools'))
+sys.path.insert(0, str(ROOT))
+
+import paho.mqtt.client as mqtt
+from data_classes import BrokerSettings, ClientSettings
+from topic import Topic
+from topic_data import TopicDataNumber, TopicDataBool, TopicDataRawValue, TopicDataMathExpression
+from topic_data.topic_data_math_expression import ExpressionEvaluator
+from log_writer import LogWriter, get_log_writer
+
+# name -> (setup function, operations per call of the function it returns)
+BENCHMARKS = {}
+
+def benchmark(name, ops=1):
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops)
+        return setup
+    return register
+
+
+NUMBER = {'NAME': 'temperature', 'TYPE': 'int', 'INITIAL_VALUE': 2750, 'MIN_VALUE': 2700, 'MAX_VALUE': 6500, 'MAX_STEP': 250,
+          'RETAIN_PROBABILITY': 0.3, 'RESET_PROBABILITY': 0.1, 'INCREASE_PROBABILITY': 0.8, 'RESTART_ON_BOUNDARIES': True}
+FLOAT = {'NAME': 'pollution_particles', 'TYPE': 'float', 'MIN_VALUE': 0, 'MAX_VALUE': 1, 'MAX_STEP': 0.15, 'RETAIN_PROBABILITY': 0.5}
+BOOL = {'NAME': 'on', 'TYPE': 'bool', 'RETAIN_PROBABILITY': 0.85}
+RAW_VALUES = {'NAME': 'coordinate', 'TYPE': 'raw_values', 'VALUE_DEFAULT': {'alt': 0}, 'RESTART_ON_END': True,
+              'VALUES': [{'alt': 0.1, 'lat': -121.883682, 'long': 37.354635}, {'lat': -121.883352, 'long': 37.354192}]}
+MATH_EXPRESSION = {'NAME': 'temperature', 'TYPE': 'math_expression', 'RETAIN_PROBABILITY': 0.1, 'MATH_EXPRESSION': '2*math.pow(x,2)+1',
+                   'INTERVAL_START': 0, 'INTERVAL_END': 5, 'MIN_DELTA': 0.3, 'MAX_DELTA': 0.5}
+
+BROKER = BrokerSettings(url='localhost', port=1883, protocol=mqtt.MQTTv311)
+CLIENT = ClientSettings(clean=True, retain=False, qos=2, time_interval=1)
+
+
+def generate_values(data_class, data, ops):
+    topic_data = data_class(data)
+    generate_value = topic_data.generate_value
+
+    def run():
+        for _ in range(ops):
+            generate_value()
+    return run
+
+@benchmark('topic_data.int', ops=1000)
+def topic_data_int():
+    return generate_values(TopicDataNumber, NUMBER, 1000)
+
+@benchmark('topic_data.float', ops=1000)
+def topic_data_float():
+    return generate_values(TopicDataNumber, FLOAT, 1000)
+
+@benchmark('topic_data.bool', ops=1000)
+def topic_data_bool():
+    return generate_values(TopicDataBool, BOOL, 1000)
+
+@benchmark('topic_data.raw_values', ops=1000)
+def topic_data_raw_values():
+    return generate_values(TopicDataRawValue, RAW_VALUES, 1000)
+
+@benchmark('topic_data.math_expression', ops=1000)
+def topic_data_math_expression():
+    return generate_values(TopicDataMathExpression, MATH_EXPRESSION, 1000)
+
+@benchmark('expression_evaluator', ops=1000)
+def expression_evaluator():
+    evaluator = ExpressionEvaluator('2*math.pow(x,2)+1', 0, 5, 0.3, 0.5)
+    next_value = evaluator.get_next_expression_value
+
+    def run():
+        for _ in range(1000):
+            next_value()
+    return run
+
+
+def payload_topic(payload_format, message_id_mode='uuid4'):
+    metadata_config = {
+        'include_message_id': True,
+        'include_timestamp': True,
+        'metadata_field_prefix': '_',
+        'message_id_mode': message_id_mode,
+        'payload_format': payload_format
+    }
+    data = [NUMBER, FLOAT, BOOL] if payload_format == 'struct' else [NUMBER, FLOAT, BOOL, RAW_VALUES]
+    return Topic(BROKER, 'bench/payload', data, {'user_id': 'abc123'}, CLIENT, metadata_config)
+
+def generate_payloads(payload_format, message_id_mode='uuid4'):
+    next_payload = payload_topic(payload_format, message_id_mode).next_payload
+
+    def run():
+        for _ in range(1000):
+            next_payload()
+    return run
+
+@benchmark('payload.json', ops=1000)
+def payload_json():
+    return generate_payloads('json')
+
+@benchmark('payload.json_counter_ids', ops=1000)
+def payload_json_counter_ids():
+    return generate_payloads('json', 'counter')
+
+@benchmark('payload.msgpack', ops=1000)
+def payload_msgpack():
+    return generate_payloads('msgpack')
+
+@benchmark('payload.cbor', ops=1000)
+def payload_cbor():
+    return generate_payloads('cbor')
+
+@benchmark('payload.struct', ops=1000)
+def payload_struct():
+    return generate_payloads('struct')
+
+
+def scratch_dir():
+    """Temporary directory removed when the benchmark process exits"""
+    path = tempfile.mkdtemp(prefix='mqtt-bench-')
+    import atexit
+    atexit.register(shutil.rmtree, path, True)
+    return path
+
+@benchmark('subscriber.on_message', ops=1000)
+def subscriber_on_message():
+    from receive_pipeline import ReceivePipeline
+    from SubscriberClient import SubscriberClient
+    # the pipeline thread is not started, the queue is emptied after every call instead
+    pipeline = ReceivePipeline(queue_size=0)
+    subscriber = SubscriberClient(BROKER, 'subscriber-bench-0', 'bench/#', pipeline, log_file=os.path.join(scratch_dir(), 'subscriber-bench-0.log'))
+    message = mqtt.MQTTMessage(topic=b'bench/payload')
+    message.payload = payload_topic('json').next_payload()
+    on_message = subscriber.on_message
+
+    def run():
+        for _ in range(1000):
+            on_message(None, None, message)
+        pipeline.queue.queue.clear()
+    return run
+
+@benchmark('receive_pipeline.record', ops=1000)
+def receive_pipeline_record():
+    # what the receive pipeline thread does per message: decode, latency and the default sinks
+    from receive_pipeline import build_record
+    from receive_sinks import create_sink
+    from SubscriberClient import SubscriberClient
+    subscriber = SubscriberClient(BROKER, 'subscriber-bench-1', 'bench/#', None, log_file=os.path.join(scratch_dir(), 'subscriber-bench-1.log'))
+    sinks = [create_sink(name) for name in ('text_log', 'latency_csv', 'histogram')]
+    payload = payload_topic('json').next_payload()
+
+    log_writer = get_log_writer()
+
+    def run():
+        for _ in range(1000):
+            record = build_record(subscriber, 'bench/payload', payload, time.time_ns())
+            for sink in sinks:
+                sink.handle(record)
+        # the records count once they are written, and the queue never fills up into the drop path
+        while log_writer.queue_depth:
+            time.sleep(0.0005)
+    return run
+
+@benchmark('log_writer.write', ops=10000)
+def log_writer_write():
+    # queueing and writing to disk, until the writer thread has flushed everything
+    path = os.path.join(scratch_dir(), 'bench.log')
+    record = '2026-01-01 00:00:00.000,bench/payload,7c9e6679-7425-40de-944b-e07fc1f90ae7,1790000000000000000,1790000000001000000,1000.0,0'
+
+    def run():
+        log_writer = LogWriter()
+        log_writer.start()
+        for _ in range(10000):
+            log_writer.write(path, record)
+        log_writer.close()
+    return run
+
+
+# synthetic logs of a known size for the analysis tools
+LOG_MESSAGES = 50000
+LOG_TOPICS = 10
+LOG_SUBSCRIBERS = 2
+
+def write_synthetic_logs(logdir):
+    """publisher-sends.csv and LOG_SUBSCRIBERS latency files receiving LOG_MESSAGES messages over LOG_TOPICS topics"""
+    rng = random.Random(1)
+    sends = []
+    start = 1_790_000_000_000_000_000
+    for index in range(LOG_MESSAGES):
+        sends.append((str(uuid.UUID(int=rng.getrandbits(128), version=4)), f"bench/{index % LOG_TOPICS}", start + index * 1_000_000))
+    with open(os.path.join(logdir, 'publisher-sends.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['message_id', 'topic', 'mid', 'qos', 'payload_bytes', 'publish_time_ns', 'socket_time_ns', 'ack_time_ns'])
+        for index, (message_id, topic, send_ns) in enumerate(sends):
+            writer.writerow([message_id, topic, index % 65535 + 1, 1, 150, send_ns, send_ns + 50_000, send_ns + 900_000])
+    for subscriber in range(LOG_SUBSCRIBERS):
+        name = f"subscriber-bench-{subscriber}"
+        with open(os.path.join(logdir, f"{name}.log"), 'w', encoding='utf-8') as f:
+            f.write(f"=== MQTT Subscriber Log: {name} ===\nTopic: bench/#\n\n")
+        with open(os.path.join(logdir, f"{name}.latency.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'topic', 'message_id', 'send_time_ns', 'receive_time_ns', 'latency_us', 'clock_error_us'])
+            for message_id, topic, send_ns in sends:
+                latency_us = rng.lognormvariate(7, 0.5)
+                writer.writerow(['2026-01-01 00:00:00.000', topic, message_id, send_ns, send_ns + int(latency_us * 1000), f"{latency_us:.1f}", 0])
+
+@benchmark('collector.collect', ops=LOG_MESSAGES * LOG_SUBSCRIBERS)
+def collector_collect():
+    import collector
+    logdir = scratch_dir()
+    write_synthetic_logs(logdir)
+
+    def run():
+        collector.collect(logdir, 1, 8)
+    return run
+
+@benchmark('analyze_latency.load', ops=LOG_MESSAGES * LOG_SUBSCRIBERS)
+def analyze_latency_load():
+    import contextlib
+    import io
+    import analyze_latency
+    logdir = scratch_dir()
+    write_synthetic_logs(logdir)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyze_latency.load_latency_data(logdir, jobs=1, use_cache=False)
+    return run
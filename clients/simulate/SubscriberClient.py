@@ -1,23 +1,35 @@
-import json
+import threading
 import time
 import os
 import datetime
 import paho.mqtt.client as mqtt
 import paho.mqtt.properties as properties
+from paho.mqtt.packettypes import PacketTypes
 from topic import Topic
 from data_classes import BrokerSettings, ClientSettings
+from log_writer import get_log_writer
 
 class SubscriberClient:
-    def __init__(self, broker_settings, client_id, topic, data_callback, log_file=None, description="", user="", password="", purpose = ""):
+    def __init__(self, broker_settings, client_id, topic, pipeline, log_file=None, description="", user="", password="", purpose = ""):
         self.broker_settings = broker_settings
         self.client_id = client_id
         self.topic = topic
-        self.data_callback = data_callback
+        self.pipeline = pipeline
         self.description = description
         self.client = None
         self.user = user
         self.password = password
         self.purpose = purpose
+        self.received_count = 0
+        self.received_bytes = 0
+        # set once the broker acknowledged the connection
+        self.connected = threading.Event()
+        # set by every CONNACK, accepted or not, with its result code and monotonic arrival time for the ConnectionRamp
+        self.acknowledged = threading.Event()
+        self.connack_rc = None
+        self.connack_time = None
+        # AsyncioClientDriver of a SubscriberPool driving this client instead of a loop_start() thread
+        self.driver = None
         
         # Set up logging
         self.log_file = log_file or f"{client_id}.log"
@@ -28,20 +40,27 @@ class SubscriberClient:
             os.makedirs(log_dir, exist_ok=True)
 
         # Create initial log file with header
+        timestamp = self._get_timestamp_ms()
+        header = f"=== MQTT Subscriber Log: {self.client_id} ===\n"
+        header += f"Client ID: {self.client_id}\n"
+        header += f"User: {self.user}\n"
+        header += f"Password: {self.password}\n"
+        header += f"Started: {timestamp}\n"
+        header += f"Topic: {self.topic}\n"
+        if self.description:
+            header += f"Description: {self.description}\n"
+        if self.purpose:
+            header += f"Purpose: {self.purpose}\n"
+        header += f"Broker: {broker_settings.url}:{broker_settings.port}\n"
+        header += "=" * 50 + "\n\n"
         with open(self.log_file, "w", encoding="utf-8") as f:
-            timestamp = self._get_timestamp_ms()
-            f.write(f"=== MQTT Subscriber Log: {self.client_id} ===\n")
-            f.write(f"Client ID: {self.client_id}\n")
-            f.write(f"User: {self.user}\n")
-            f.write(f"Password: {self.password}\n")
-            f.write(f"Started: {timestamp}\n")
-            f.write(f"Topic: {self.topic}\n")
-            if self.description:
-                f.write(f"Description: {self.description}\n")
-            if self.purpose:
-                f.write(f"Purpose: {self.purpose}\n")
-            f.write(f"Broker: {broker_settings.url}:{broker_settings.port}\n")
-            f.write("=" * 50 + "\n\n")
+            f.write(header)
+
+        # Everything after the header goes through the log writer thread of the process
+        self.log_writer = get_log_writer()
+        self.log_writer.set_header(self.log_file, header)
+        self.latency_log_file = self.log_file.replace(".log", ".latency.csv")
+        self.log_writer.set_header(self.latency_log_file, "timestamp,topic,message_id,send_time_ns,receive_time_ns,latency_us,clock_error_us\n")
 
     def _get_timestamp_ms(self):
         """Get current timestamp with millisecond precision"""
@@ -49,6 +68,8 @@ class SubscriberClient:
         return dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]  # Truncate to milliseconds
 
     def on_connect(self, client, userdata, flags, rc):
+        self.connack_time = time.monotonic()
+        self.connack_rc = getattr(rc, 'value', rc)
         timestamp = self._get_timestamp_ms()
         print(f"[{timestamp}] Connected with result code {rc}, subscribed to '{self.topic}' with user '{self.user}' and password '{self.password}'")
         
@@ -60,76 +81,25 @@ class SubscriberClient:
         
         # Log the connection event
         self._write_to_log(f"[{timestamp}] Connected with result code {rc}, subscribed to '{self.topic}' with user '{self.user}' and password '{self.password}'")
+        if rc == 0:
+            self.connected.set()
+        self.acknowledged.set()
 
     def on_message(self, client, userdata, msg):
-        # Record receive timestamp with millisecond precision immediately
-        receive_timestamp = self._get_timestamp_ms()
-        receive_timestamp_epoch_ms = int(datetime.datetime.now().timestamp() * 1000)
+        # Record receive timestamp once, before anything else
+        receive_time_ns = time.time_ns()
+        self.received_count += 1
+        self.received_bytes += len(msg.payload)
         
-        # Call the callback function for central processing
-        self.data_callback(client, msg.topic, msg.payload, receive_timestamp)
-        
-        # Log the received message
-        try:
-            # Try to decode as JSON for better logging
-            payload_str = msg.payload.decode('utf-8')
-            try:
-                payload_json = json.loads(payload_str)
-                
-                # Calculate latency if message has a timestamp field
-                latency_ms = None
-                message_id = None
-                
-                # Look for timestamp field with different possible prefixes
-                for prefix in ['_', '']:
-                    ts_field = f"{prefix}timestamp"
-                    id_field = f"{prefix}message_id"
-                    
-                    if ts_field in payload_json:
-                        send_timestamp_ms = payload_json[ts_field]
-                        latency_ms = receive_timestamp_epoch_ms - send_timestamp_ms
-                        # Add latency to the JSON for logging
-                        payload_json[f"{prefix}latency_ms"] = round(latency_ms, 2)
-                        message_id = payload_json.get(id_field, "N/A")
-                        break
-                
-                payload_formatted = json.dumps(payload_json, indent=2)
-                
-                # Add latency and message ID info to the log entry if available
-                latency_info = f" | Latency: {latency_ms:.2f}ms | Message ID: {message_id}" if latency_ms is not None else ""
-                
-            except json.JSONDecodeError:
-                payload_formatted = payload_str if len(payload_str) < 100 else f"{payload_str[:97]}..."
-                latency_info = ""
-        except UnicodeDecodeError:
-            # If not text, just log the size
-            payload_formatted = f"<binary data: {len(msg.payload)} bytes>"
-            latency_info = ""
-            
-        log_entry = f"[{receive_timestamp}] Received on '{msg.topic}'{latency_info}\n{payload_formatted}\n{'-'*40}"
-        self._write_to_log(log_entry)
-        
-        # Also write to a dedicated latency log if we have latency information
-        if latency_ms is not None:
-            try:
-                latency_log_file = self.log_file.replace(".log", ".latency.csv")
-                # Create header if file doesn't exist
-                if not os.path.exists(latency_log_file):
-                    with open(latency_log_file, "w", encoding="utf-8") as f:
-                        f.write("timestamp,topic,message_id,send_time_ms,receive_time_ms,latency_ms\n")
-                
-                # Append latency data
-                with open(latency_log_file, "a", encoding="utf-8") as f:
-                    f.write(f"{receive_timestamp},{msg.topic},{message_id},{send_timestamp_ms},{receive_timestamp_epoch_ms},{latency_ms:.2f}\n")
-            except Exception as e:
-                print(f"Error writing to latency log: {str(e)}")
+        # Decoding, latency and logging happen on the receive pipeline thread so the network loop keeps reading
+        self.pipeline.submit(self, msg.topic, msg.payload, receive_time_ns)
 
     def _write_to_log(self, message):
-        """Write a message to this subscriber's log file"""
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(f"{message}\n")
+        """Queue a message for this subscriber's log file"""
+        self.log_writer.write(self.log_file, message)
 
-    def connect(self):
+    def connect(self, driver=None):
+        """Connect with a network thread of its own, or on the event loop of driver"""
         clean_session = None if self.broker_settings.protocol == mqtt.MQTTv5 else True
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=self.client_id, protocol=self.broker_settings.protocol, clean_session=clean_session)
         self.client.on_connect = self.on_connect
@@ -138,12 +108,27 @@ class SubscriberClient:
         timestamp = self._get_timestamp_ms()
         self._write_to_log(f"[{timestamp}] Attempting connection to {self.broker_settings.url}:{self.broker_settings.port} with client ID '{self.client_id}' and user '{self.user}' and password '{self.password}'")
         self.client.username_pw_set(self.user, self.password)
+        if driver is not None:
+            self.driver = driver
+            driver.attach(self.client)
         self.client.connect(self.broker_settings.url, self.broker_settings.port, 60)
-        self.client.loop_start()
+        if driver is None:
+            self.client.loop_start()
+
+    def retry_in_background(self):
+        """After the last connect failed, leave further attempts to the paho network thread. Pooled clients are not
+        reconnected, so they are detached from the pool"""
+        if self.driver is None:
+            self.client.loop_start()
+        else:
+            self.disconnect()
 
     def disconnect(self):
         if self.client:
             timestamp = self._get_timestamp_ms()
             self._write_to_log(f"[{timestamp}] Disconnecting from broker")
-            self.client.loop_stop()
-            self.client.disconnect()
\ No newline at end of file
+            self.client.disconnect()
+            if self.driver is None:
+                self.client.loop_stop()
+            else:
+                self.driver.detach(self.client)
\ No newline at end of file
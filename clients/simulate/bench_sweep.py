@@ -0,0 +1,135 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import threading
+from mini_broker import MiniBroker
+from simulator import Simulator
+from latency_histogram import LatencyHistogram
+
+# sweep of the bench mode, each key is a list of values and every combination is one run
+BENCH_DEFAULTS = {
+    'BENCH_TOPICS': [10, 100],
+    'BENCH_INTERVALS': [0.1],
+    'BENCH_PAYLOAD_SIZES': [100],
+    'BENCH_QOS': [0, 1],
+    'BENCH_SUBSCRIBERS': [1]
+}
+# a run is saturated once it publishes or delivers less than this share of its offered rate
+SATURATION_RATIO = 0.95
+COLUMNS = ['topics', 'interval', 'payload_size', 'qos', 'subscribers', 'offered_per_sec', 'published_per_sec',
+           'delivered_per_sec', 'loss_pct', 'p50_ms', 'p99_ms', 'p999_ms', 'saturated']
+
+
+def sweep(config):
+    keys = list(BENCH_DEFAULTS)
+    values = [config.get(key, default) for key, default in BENCH_DEFAULTS.items()]
+    for combination in itertools.product(*values):
+        yield dict(zip(keys, combination))
+
+
+def run_settings(config, port, topics, interval, payload_size, qos, subscribers):
+    """Settings of one run: the base settings file publishing and subscribing through the local broker"""
+    settings = {key: value for key, value in config.items() if not key.startswith('BENCH_')}
+    settings.update({
+        'BROKER_URL': '127.0.0.1',
+        'BROKER_PORT': port,
+        'QOS': qos,
+        'TIME_INTERVAL': interval,
+        'METRICS_PORT': 0,
+        'CLOCK_SYNC_INTERVAL': 0,
+        'TOPICS': [{
+            'TYPE': 'multiple',
+            'PREFIX': 'bench',
+            'RANGE_START': 1,
+            'RANGE_END': topics,
+            'DATA': [
+                {'NAME': 'value', 'TYPE': 'int', 'MIN_VALUE': 0, 'MAX_VALUE': 1000, 'MAX_STEP': 10},
+                # padding up to the payload size, the metadata fields come on top of it
+                {'NAME': 'padding', 'TYPE': 'raw_values', 'VALUES': ['x' * payload_size], 'RESTART_ON_END': True}
+            ]
+        }],
+        'SUBSCRIBERS': [{
+            'TOPIC': 'bench/#',
+            'NUMBER': subscribers,
+            'USERS': [None] * subscribers,
+            'PASSWORDS': [None] * subscribers
+        }] if subscribers else []
+    })
+    # printing every message would measure the terminal
+    settings.setdefault('RECEIVE_SINKS', ['histogram'])
+    return settings
+
+
+def sample(simulator):
+    """Messages sent, acknowledged and received so far"""
+    return (sum(topic.schedule.sends for topic in simulator.topics),
+            sum(topic.published_count for topic in simulator.topics),
+            sum(subscriber.received_count for subscriber in simulator.subscribers))
+
+def run_once(run_dir, settings, engine, duration, warmup):
+    """Run the simulator for warmup + duration seconds, returns the counts of the last duration seconds, the totals and the latency"""
+    settings_file = os.path.join(run_dir, 'settings.json')
+    os.makedirs(run_dir, exist_ok=True)
+    with open(settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
+    samples = []
+    # the per topic and per subscriber messages of the simulator would drown the table
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulator = Simulator(settings_file, run_dir, engine)
+        # connecting and stopping are left out of the rates, which are only counted between the two samples
+        timers = [threading.Timer(delay, lambda: samples.append(sample(simulator))) for delay in (warmup, warmup + duration)]
+        for timer in timers:
+            timer.start()
+        simulator.run(warmup + duration + 0.1)
+        for timer in timers:
+            timer.cancel()
+    if len(samples) < 2:
+        raise RuntimeError(f"The run in {run_dir} stopped before its measurement window ended")
+    window = [end - start for start, end in zip(*samples)]
+    latency = LatencyHistogram(settings.get('HISTOGRAM_PRECISION', 2))
+    for histogram in simulator.latency_histograms().values():
+        latency.merge(histogram)
+    return window, sample(simulator), latency
+
+
+def run_bench(settings_file, output_dir, engine='thread', duration=10):
+    """Run the simulator against a local broker for every combination of the BENCH_ settings and print a saturation table"""
+    with open(settings_file) as json_file:
+        config = json.load(json_file)
+    warmup = config.get('BENCH_WARMUP', 2)
+    broker = MiniBroker()
+    port = broker.start()
+    print(f"Local broker listening on 127.0.0.1:{port}, {warmup:g} seconds of warm-up and {duration:g} seconds of measurement per run")
+    print(f'{"Topics":>7} {"Interval":>9} {"Bytes":>6} {"QoS":>4} {"Subs":>5} {"Offered/s":>10} {"Published/s":>12} '
+          f'{"Delivered/s":>12} {"Loss %":>7} {"p50 ms":>8} {"p99 ms":>8} {"p99.9 ms":>9}')
+    rows = []
+    try:
+        for index, run in enumerate(sweep(config)):
+            topics, interval, payload_size = run['BENCH_TOPICS'], run['BENCH_INTERVALS'], run['BENCH_PAYLOAD_SIZES']
+            qos, subscribers = run['BENCH_QOS'], run['BENCH_SUBSCRIBERS']
+            settings = run_settings(config, port, topics, interval, payload_size, qos, subscribers)
+            window, totals, latency = run_once(os.path.join(output_dir, f"bench-{index}"), settings, engine, duration, warmup)
+            offered = topics / interval
+            published = window[1] / duration
+            delivered = window[2] / duration
+            # every message handed to the client and not received, once the run is over and nothing is in flight any more
+            expected = totals[0] * subscribers
+            loss = (1 - totals[2] / expected) * 100 if expected else 0.0
+            percentiles = [latency.percentile(percentile) for percentile in (50, 99, 99.9)]
+            percentiles = [value / 1000 if value is not None else float('nan') for value in percentiles]
+            saturated = published < offered * SATURATION_RATIO or (subscribers and delivered < published * subscribers * SATURATION_RATIO)
+            rows.append([topics, interval, payload_size, qos, subscribers, offered, published, delivered, loss] + percentiles + [bool(saturated)])
+            print(f'{topics:>7} {interval:>9g} {payload_size:>6} {qos:>4} {subscribers:>5} {offered:>10,.0f} {published:>12,.0f} '
+                  f'{delivered:>12,.0f} {loss:>7.2f} ' + ' '.join(f'{value:>8.2f}' for value in percentiles[:2]) +
+                  f' {percentiles[2]:>9.2f}' + ('  saturated' if saturated else ''))
+    finally:
+        broker.stop()
+    table_file = os.path.join(output_dir, 'bench.csv')
+    with open(table_file, 'w', encoding='utf-8') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        for row in rows:
+            f.write(','.join(f'{value:.3f}' if isinstance(value, float) else str(value) for value in row) + '\n')
+    print(f"Saturation table written to {table_file}")
+    return rows
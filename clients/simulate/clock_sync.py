@@ -0,0 +1,135 @@
+import collections
+import json
+import os
+import threading
+import time
+import paho.mqtt.client as mqtt
+from data_classes import BrokerSettings
+
+class ClockSample:
+    """One ping/pong exchange, NTP style: t1 ping sent, t2 ping received by the peer, t3 pong sent, t4 pong received"""
+    __slots__ = ('offset_ns', 'delay_ns')
+
+    def __init__(self, t1, t2, t3, t4):
+        # peer clock minus local clock
+        self.offset_ns = ((t2 - t1) + (t3 - t4)) // 2
+        self.delay_ns = (t4 - t1) - (t3 - t2)
+
+
+class PeerClock:
+    """Offset estimate of one peer instance, taken from the sample with the smallest round trip delay"""
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.best = None
+        self.count = 0
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.count += 1
+        self.best = min(self.samples, key=lambda s: s.delay_ns)
+
+    @property
+    def offset_ns(self):
+        return self.best.offset_ns
+
+    @property
+    def error_ns(self):
+        # the true offset is within half the round trip delay of the estimate
+        return self.best.delay_ns // 2
+
+
+class ClockSync(threading.Thread):
+    """Estimates the clock offset to every other simulator instance by pinging them over a control topic"""
+    def __init__(self, broker_settings: BrokerSettings, instance_id: str, topic='testbed/clock-sync', interval=5.0, window=8):
+        threading.Thread.__init__(self, name='clock-sync', daemon=True)
+        self.broker_settings = broker_settings
+        self.instance_id = instance_id
+        self.topic = topic
+        self.interval = interval
+        self.window = window
+        # tells the worker processes of one instance apart, they share the instance id and the clock
+        self.nonce = os.getpid()
+        self.client = None
+        self.peers = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+
+    def run(self):
+        clean_session = None if self.broker_settings.protocol == mqtt.MQTTv5 else True
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, f"clock-sync-{self.instance_id}-{self.nonce}", protocol=self.broker_settings.protocol, clean_session=clean_session)
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.connect(self.broker_settings.url, self.broker_settings.port)
+        self.client.loop_start()
+        self.connected.wait(self.interval)
+        while not self.stopped.is_set():
+            self.ping()
+            self.stopped.wait(self.interval)
+
+    def on_connect(self, client, userdata, flags, rc):
+        client.subscribe([(f"{self.topic}/ping", 0), (f"{self.topic}/pong/{self.instance_id}", 0)])
+        self.connected.set()
+
+    def ping(self):
+        t1 = time.time_ns()
+        with self.lock:
+            self.pending[t1] = True
+            # a ping nobody answered is forgotten after a few intervals
+            while len(self.pending) > self.window:
+                self.pending.pop(next(iter(self.pending)))
+        self.client.publish(f"{self.topic}/ping", json.dumps({'instance': self.instance_id, 'nonce': self.nonce, 't1': t1}), qos=0)
+
+    def on_message(self, client, userdata, msg):
+        receive_ns = time.time_ns()
+        try:
+            message = json.loads(msg.payload)
+        except ValueError:
+            return
+        if msg.topic.endswith('/ping'):
+            if message['instance'] == self.instance_id:
+                return
+            pong = dict(message, peer=self.instance_id, t2=receive_ns, t3=time.time_ns())
+            client.publish(f"{self.topic}/pong/{message['instance']}", json.dumps(pong), qos=0)
+            return
+        if message.get('nonce') != self.nonce:
+            # answer to a ping of another worker process of this instance
+            return
+        with self.lock:
+            if self.pending.pop(message['t1'], None) is None:
+                return
+            peer = self.peers.get(message['peer'])
+            if peer is None:
+                peer = self.peers[message['peer']] = PeerClock(self.window)
+            peer.add(ClockSample(message['t1'], message['t2'], message['t3'], receive_ns))
+
+    def correction(self, instance):
+        """(offset, error) in ns to add to a latency measured against the send time of the given instance"""
+        if instance == self.instance_id:
+            return 0, 0
+        peer = self.peers.get(instance)
+        if peer is None and instance is None and len(self.peers) == 1:
+            # payloads without the instance field can only come from the single peer
+            peer = next(iter(self.peers.values()))
+        if peer is None or peer.best is None:
+            return 0, None
+        return peer.offset_ns, peer.error_ns
+
+    def write_offsets(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("instance,peer,offset_us,error_us,delay_us,samples\n")
+            for name, peer in sorted(self.peers.items()):
+                f.write(f"{self.instance_id},{name},{peer.offset_ns / 1000:.1f},{peer.error_ns / 1000:.1f},{peer.best.delay_ns / 1000:.1f},{peer.count}\n")
+
+    def print_summary(self):
+        for name, peer in sorted(self.peers.items()):
+            print(f"Clock offset of {name}: {peer.offset_ns / 1000:+.1f}us (+/- {peer.error_ns / 1000:.1f}us, {peer.count} samples)")
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        if self.client is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import pickle
+from topic_data import compile_data
+from topic_data.topic_data_spec import NUMBER_TYPES, optional, require
+
+# raised whenever the compiled form changes, caches of an older version are compiled again
+COMPILER_VERSION = 1
+
+# top level key -> type. Keys not listed are passed through unchecked, defaults stay where the keys are read
+SETTINGS_SCHEMA = {
+    'BROKER_URL': str,
+    'BROKER_PORT': int,
+    'PROTOCOL_VERSION': int,
+    'CLEAN_SESSION': bool,
+    'RETAIN': bool,
+    'QOS': int,
+    'TIME_INTERVAL': NUMBER_TYPES,
+    'MISSED_TICK_POLICY': str,
+    'CONNECTIONS_PER_PROCESS': int,
+    'CONNECTION_ASSIGNMENT': str,
+    'INCLUDE_MESSAGE_ID': bool,
+    'INCLUDE_TIMESTAMP': bool,
+    'METADATA_FIELD_PREFIX': str,
+    'MESSAGE_ID_MODE': str,
+    'PAYLOAD_SERIALIZER': str,
+    'PAYLOAD_FORMAT': str,
+    'GENERATION_MODE': str,
+    'GENERATION_BLOCK_SIZE': int,
+    'LOG_QUEUE_SIZE': int,
+    'LOG_FLUSH_BYTES': int,
+    'LOG_FLUSH_INTERVAL': NUMBER_TYPES,
+    'LOG_ROTATE_BYTES': int,
+    'MAX_INFLIGHT_MESSAGES': int,
+    'MAX_QUEUED_MESSAGES': int,
+    'QUEUE_FULL_POLICY': str,
+    'QUEUE_SAMPLE_INTERVAL': NUMBER_TYPES,
+    'PUBLISH_LOG': bool,
+    'RECEIVE_SINKS': list,
+    'HISTOGRAM_PRECISION': int,
+    'HISTOGRAM_SNAPSHOT_INTERVAL': NUMBER_TYPES,
+    'METRICS_PORT': int,
+    'METRICS_HOST': str,
+    'INSTANCE_ID': str,
+    'CLOCK_SYNC_INTERVAL': NUMBER_TYPES,
+    'CLOCK_SYNC_TOPIC': str,
+    'RECEIVE_QUEUE_SIZE': int,
+    'CONFIG_CACHE': bool,
+    'CONNECT_RATE': NUMBER_TYPES,
+    'CONNECT_CONCURRENCY': int,
+    'CONNECT_JITTER': NUMBER_TYPES,
+    'CONNECT_RETRIES': int,
+    'CONNECT_TIMEOUT': NUMBER_TYPES,
+    'TOPICS': list,
+    'SUBSCRIBERS': list,
+    'SUBSCRIBER_POOL': bool,
+    'RAMP_STRATEGY': str,
+    'RAMP_STEP_FACTOR': NUMBER_TYPES,
+    'RAMP_MAX_STEPS': int,
+    'RAMP_START_TOPICS': int,
+    'RAMP_WARMUP': NUMBER_TYPES,
+    'RAMP_MEASURE': NUMBER_TYPES,
+    'RAMP_SLO_P99_MS': NUMBER_TYPES,
+    'RAMP_SLO_LOSS_PCT': NUMBER_TYPES,
+    'BENCH_TOPICS': list,
+    'BENCH_INTERVALS': list,
+    'BENCH_PAYLOAD_SIZES': list,
+    'BENCH_QOS': list,
+    'BENCH_SUBSCRIBERS': list,
+    'BENCH_WARMUP': NUMBER_TYPES
+}
+# keys of a TOPICS entry overriding the top level ones
+TOPIC_OVERRIDES = {
+    'CLEAN_SESSION': bool,
+    'RETAIN': bool,
+    'QOS': int,
+    'TIME_INTERVAL': NUMBER_TYPES,
+    'MISSED_TICK_POLICY': str,
+    'PAYLOAD_FORMAT': str
+}
+TOPIC_TYPES = ('single', 'multiple', 'list')
+
+
+class TopicEntry:
+    """One TOPICS entry: the URLs of the topics it expands to and the DataSpecs all of them share"""
+    __slots__ = ('settings', 'urls', 'payload_root', 'data_specs')
+
+    def __init__(self, settings, urls, payload_root, data_specs):
+        # the entry as written, for the client settings it overrides
+        self.settings = settings
+        self.urls = urls
+        self.payload_root = payload_root
+        self.data_specs = data_specs
+
+
+class CompiledConfig:
+    """A settings file validated once, with its topics expanded into TopicEntries"""
+    __slots__ = ('config', 'topics', 'digest')
+
+    def __init__(self, config, topics, digest):
+        self.config = config
+        self.topics = topics
+        # sha256 of the settings file the config was compiled from
+        self.digest = digest
+
+
+def compile_config(config, digest=None):
+    """Validate a parsed settings file and expand its TOPICS, raises NameError or ValueError naming the first invalid key"""
+    if not isinstance(config, dict):
+        raise ValueError("The settings file must hold an object")
+    for key, types in SETTINGS_SCHEMA.items():
+        optional(config, key, types, None, 'settings')
+    topics = [compile_topic(topic, f"TOPICS[{index}]") for index, topic in enumerate(config.get('TOPICS', []))]
+    for index, subscriber in enumerate(config.get('SUBSCRIBERS', [])):
+        validate_subscriber(subscriber, f"SUBSCRIBERS[{index}]")
+    return CompiledConfig(config, topics, digest)
+
+def compile_topic(topic, path):
+    if not isinstance(topic, dict):
+        raise ValueError(f"{path}: must be an object")
+    topic_type = require(topic, 'TYPE', str, path)
+    prefix = require(topic, 'PREFIX', str, path)
+    for key, types in TOPIC_OVERRIDES.items():
+        optional(topic, key, types, None, path)
+    if topic_type == 'single':
+        # create single topic with format: /{PREFIX}
+        urls = [prefix]
+    elif topic_type == 'multiple':
+        # create multiple topics with format: /{PREFIX}/{id}
+        start = require(topic, 'RANGE_START', int, path)
+        end = require(topic, 'RANGE_END', int, path)
+        urls = [f"{prefix}/{id}" for id in range(start, end + 1)]
+    elif topic_type == 'list':
+        # create multiple topics with format: /{PREFIX}/{item}
+        urls = [f"{prefix}/{item}" for item in require(topic, 'LIST', list, path)]
+    else:
+        raise NameError(f"{path}: Topic TYPE '{topic_type}' is unknown, it can be {', '.join(TOPIC_TYPES)}")
+    payload_root = optional(topic, 'PAYLOAD_ROOT', dict, {}, path)
+    data = require(topic, 'DATA', list, path)
+    data_specs = [compile_data(spec, f"{path}.DATA[{index}]") for index, spec in enumerate(data)]
+    names = [spec.name for spec in data_specs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"{path}: DATA NAMEs must be unique, not {names}")
+    return TopicEntry(topic, urls, payload_root, data_specs)
+
+def validate_subscriber(subscriber, path):
+    if not isinstance(subscriber, dict):
+        raise ValueError(f"{path}: must be an object")
+    topic_filter = require(subscriber, 'TOPIC', str, path)
+    levels = topic_filter.split('/')
+    if any(('#' in level and (level != '#' or index != len(levels) - 1)) or ('+' in level and level != '+') for index, level in enumerate(levels)):
+        raise ValueError(f"{path}: TOPIC '{topic_filter}' is not a valid filter, '+' must be a whole level and '#' the whole last one")
+    number = optional(subscriber, 'NUMBER', int, 1, path)
+    for key in ('USERS', 'PASSWORDS'):
+        if len(require(subscriber, key, list, path)) < number:
+            raise ValueError(f"{path}: {key} has fewer entries than the NUMBER of subscribers, {number}")
+    for key in ('DESCRIPTION', 'PURPOSE'):
+        optional(subscriber, key, str, None, path)
+
+
+def cache_path(settings_file):
+    """The compiled settings are kept in __pycache__ next to the settings file, as Python keeps the bytecode of a module"""
+    directory, name = os.path.split(os.path.abspath(settings_file))
+    return os.path.join(directory, '__pycache__', f"{name}.compiled")
+
+def load_config(settings_file):
+    """CompiledConfig of a settings file, from the cache when the file did not change since it was compiled"""
+    with open(settings_file, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    path = cache_path(settings_file)
+    compiled = read_cache(path, digest)
+    if compiled is None:
+        compiled = compile_config(json.loads(raw), digest)
+        if compiled.config.get('CONFIG_CACHE', True):
+            write_cache(path, compiled)
+    return compiled
+
+def read_cache(path, digest):
+    try:
+        with open(path, 'rb') as f:
+            # the header is checked before the config itself is unpickled
+            if pickle.load(f) != (COMPILER_VERSION, digest):
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # a cache that can not be read is compiled again and replaced
+        print(f"Ignoring the config cache {path}: {e}")
+        return None
+
+def write_cache(path, compiled):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # other worker processes may read the cache meanwhile, it is replaced in one step
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            pickle.dump((COMPILER_VERSION, compiled.digest), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+    except OSError as e:
+        # a read-only settings directory, e.g. mounted into a container, only costs the compile on the next start
+        print(f"Could not write the config cache {path}: {e}")
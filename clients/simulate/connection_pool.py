@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+import zlib
+import paho.mqtt.client as mqtt
+from data_classes import BrokerSettings
+
+class PooledConnection:
+    """A single paho client that publishes on behalf of many topics"""
+    def __init__(self, broker_settings: BrokerSettings, client_id: str, clean: bool):
+        self.broker_settings = broker_settings
+        self.client_id = client_id
+        self.clean = clean
+        self.client = None
+        self.topics = []
+        self.published = 0
+        self.acks = 0
+        self.inflight = {}
+        # mids paho reported as published before publish() returned to us
+        self.early_acks = set()
+        self.lock = threading.Lock()
+        # SendLedger shared by the topics of this connection, when the publish log is enabled
+        self.ledger = None
+        # PublishWindow shared by the topics of this connection
+        self.window = None
+        # AsyncioClientDriver running the network I/O of the client instead of a loop_start() thread
+        self.driver = None
+        # set by every CONNACK, with its result code and monotonic arrival time for the ConnectionRamp
+        self.acknowledged = threading.Event()
+        self.connack_rc = None
+        self.connack_time = None
+
+    def open(self, driver=None):
+        """Connect once, no matter how many topics share this connection"""
+        with self.lock:
+            if self.client is not None:
+                return
+            clean_session = None if self.broker_settings.protocol == mqtt.MQTTv5 else self.clean
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, self.client_id, protocol=self.broker_settings.protocol, clean_session=clean_session)
+            self.client.on_connect = self.on_connect
+            self.client.on_publish = self.on_publish
+            if self.window is not None:
+                self.window.configure(self.client)
+            self.driver = driver
+        if driver is not None:
+            driver.attach(self.client)
+        if self.ledger is not None:
+            self.ledger.watch(self.client)
+        self.client.connect(self.broker_settings.url, self.broker_settings.port)
+        if driver is None:
+            self.client.loop_start()
+
+    def close(self):
+        with self.lock:
+            client, self.client = self.client, None
+        if client is not None:
+            client.disconnect()
+            if self.driver is None:
+                client.loop_stop()
+            else:
+                self.driver.detach(client)
+
+    # connect, disconnect and retry_in_background let a ConnectionRamp open the connections
+    def connect(self, driver=None):
+        self.open(driver)
+
+    def disconnect(self):
+        self.close()
+
+    def retry_in_background(self):
+        """After the last connect failed, leave further attempts to the paho network thread. Connections driven by an
+        event loop are not reconnected, so they are closed and their topics publish nothing"""
+        if self.driver is None:
+            self.client.loop_start()
+        else:
+            self.close()
+
+    def on_connect(self, client, userdata, flags, rc):
+        self.connack_time = time.monotonic()
+        self.connack_rc = getattr(rc, 'value', rc)
+        self.acknowledged.set()
+
+    def publish(self, topic, payload, qos, retain):
+        """Publish on behalf of topic, returns the mid or None if the connection is closed"""
+        client = self.client
+        if client is None:
+            return None
+        # paho calls on_publish while holding its own mutex, so ours is never held across publish()
+        info = client.publish(topic.topic_url, payload, qos=qos, retain=retain)
+        with self.lock:
+            self.published += 1
+            if info.mid in self.early_acks:
+                self.early_acks.discard(info.mid)
+                self.acks += 1
+                acked = True
+            else:
+                self.inflight[info.mid] = topic
+                acked = False
+        if acked:
+            topic.on_publish(client, None, info.mid)
+        return info.mid
+
+    def on_publish(self, client, userdata, mid):
+        with self.lock:
+            topic = self.inflight.pop(mid, None)
+            if topic is None:
+                self.early_acks.add(mid)
+                return
+            self.acks += 1
+        topic.on_publish(client, userdata, mid)
+
+    @property
+    def inflight_count(self):
+        return len(self.inflight)
+
+
+class ConnectionPool:
+    """Shares a fixed number of MQTT connections between all publisher topics of a process"""
+    ASSIGNMENTS = ('round_robin', 'hash')
+
+    def __init__(self, broker_settings: BrokerSettings, size: int, assignment: str = 'round_robin', clean: bool = True):
+        if assignment not in self.ASSIGNMENTS:
+            raise NameError(f"Connection assignment '{assignment}' is unknown")
+        self.assignment = assignment
+        # the pid keeps client ids unique when several simulator processes share a broker
+        self.connections = [
+            PooledConnection(broker_settings, f"publisher-pool-{os.getpid()}-{index}", clean)
+            for index in range(size)
+        ]
+        self.next_index = 0
+
+    def assign(self, topic):
+        if self.assignment == 'hash':
+            index = zlib.crc32(topic.topic_url.encode('utf-8')) % len(self.connections)
+        else:
+            index = self.next_index
+            self.next_index = (self.next_index + 1) % len(self.connections)
+        connection = self.connections[index]
+        connection.topics.append(topic)
+        topic.connection = connection
+        return connection
+
+    def unopened(self, topics):
+        """Connections of topics that are not open yet, each once"""
+        connections = []
+        for topic in topics:
+            if topic.connection.client is None and topic.connection not in connections:
+                connections.append(topic.connection)
+        return connections
+
+    def close(self):
+        for connection in self.connections:
+            connection.close()
+
+    def print_summary(self):
+        for connection in self.connections:
+            print(f'{connection.client_id:40} {len(connection.topics):6} topics {connection.published:8} published {connection.inflight_count:6} inflight')
@@ -0,0 +1,141 @@
+import concurrent.futures
+import random
+import time
+from latency_histogram import LatencyHistogram
+
+class ConnectRecord:
+    """How one client connected: when it was due and started, the CONNACK round trip and result code, and its retries"""
+    def __init__(self, client_id, kind, scheduled):
+        self.client_id = client_id
+        self.kind = kind
+        # seconds since the first connect of the ramp
+        self.scheduled = scheduled
+        self.started = None
+        # TCP connect, CONNECT and CONNACK of the last attempt in microseconds, None if no CONNACK arrived
+        self.rtt_us = None
+        self.rc = None
+        self.error = ''
+        self.retries = 0
+        self.connected = False
+
+
+class ConnectionRamp:
+    """Connects clients at rate per second, 0 for as fast as the concurrency allows, with at most concurrency CONNECTs
+    waiting for their CONNACK and each client delayed by a random jitter of up to jitter seconds. A client that can not
+    reach the broker, is refused or gets no CONNACK within timeout seconds is tried again up to retries times.
+    Clients have client_id, connect(), disconnect(), retry_in_background(), an acknowledged event and the connack_rc
+    and connack_time of the last CONNACK"""
+    HEADER = "client_id,kind,scheduled_s,started_s,connect_rtt_ms,rc,retries,connected,error\n"
+    # seconds before the first retry, doubled for every further one
+    RETRY_DELAY = 1.0
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(self, rate=0, concurrency=64, jitter=0.0, retries=0, timeout=30.0):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.jitter = jitter
+        self.retries = retries
+        self.timeout = timeout
+        self.records = []
+        self.started = None
+
+    def connect(self, clients, kind, driver=None):
+        """Connect every client, returns their ConnectRecords once each of them connected or ran out of retries"""
+        begin = time.monotonic()
+        if self.started is None:
+            self.started = begin
+        schedule = []
+        for index, client in enumerate(clients):
+            due = index / self.rate if self.rate > 0 else 0.0
+            if self.jitter > 0:
+                due += random.uniform(0, self.jitter)
+            schedule.append((due, index, client))
+        schedule.sort(key=lambda item: item[:2])
+        records = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'{kind}-connect') as executor:
+            futures = []
+            for due, _, client in schedule:
+                delay = begin + due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                record = ConnectRecord(client.client_id, kind, begin + due - self.started)
+                records.append(record)
+                # a client waits in the executor queue while concurrency CONNECTs are in flight
+                futures.append(executor.submit(self.connect_client, client, record, driver))
+            for future in futures:
+                future.result()
+        self.records.extend(records)
+        self.print_summary(kind, records, time.monotonic() - begin)
+        return records
+
+    def connect_client(self, client, record, driver=None):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(min(self.RETRY_DELAY * 2 ** (attempt - 1), self.MAX_RETRY_DELAY))
+                record.retries = attempt
+            client.acknowledged.clear()
+            started = time.monotonic()
+            if record.started is None:
+                record.started = started - self.started
+            try:
+                if driver is not None:
+                    client.connect(driver)
+                else:
+                    client.connect()
+            except OSError as e:
+                record.rc = None
+                record.rtt_us = None
+                record.error = f"{type(e).__name__}: {e}"
+                if attempt < self.retries:
+                    client.disconnect()
+                else:
+                    client.retry_in_background()
+                continue
+            if client.acknowledged.wait(self.timeout):
+                record.rc = client.connack_rc
+                record.rtt_us = (client.connack_time - started) * 1e6
+                record.error = ''
+                if record.rc == 0:
+                    record.connected = True
+                    return
+            else:
+                record.rc = None
+                record.rtt_us = None
+                record.error = 'timeout'
+            if attempt < self.retries:
+                client.disconnect()
+        # a client still waiting for its CONNACK is left as it is, one that could not reach the broker at all got
+        # retry_in_background(): paho keeps retrying clients with a network thread of their own, ones on an event loop are disconnected
+
+    def print_summary(self, kind, records, elapsed):
+        if not records:
+            return
+        rtt = LatencyHistogram()
+        for record in records:
+            if record.rtt_us is not None:
+                rtt.record(record.rtt_us)
+        connected = sum(1 for record in records if record.connected)
+        retries = sum(record.retries for record in records)
+        print(f"{kind.capitalize()} connects: {connected} of {len(records)} connected in {elapsed:.1f}s "
+              f"({len(records) / elapsed if elapsed else 0:,.0f}/s), {retries} retries")
+        if rtt.count:
+            print(f"  connect round trip (TCP connect to CONNACK): p50 {rtt.percentile(50) / 1000:.2f}ms "
+                  f"p99 {rtt.percentile(99) / 1000:.2f}ms max {rtt.max / 1000:.2f}ms")
+        failures = {}
+        for record in records:
+            if not record.connected:
+                reason = f"CONNACK {record.rc}" if record.rc is not None else record.error.split(':')[0]
+                failures[reason] = failures.get(reason, 0) + 1
+        if failures:
+            print("  not connected: " + ", ".join(f"{count} {reason}" for reason, count in sorted(failures.items())))
+
+    def write(self, path):
+        """One row per client and connect phase"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.HEADER)
+            for record in self.records:
+                rtt = f"{record.rtt_us / 1000:.3f}" if record.rtt_us is not None else ''
+                rc = record.rc if record.rc is not None else ''
+                started = f"{record.started:.6f}" if record.started is not None else ''
+                error = record.error.replace(',', ';')
+                f.write(f"{record.client_id},{record.kind},{record.scheduled:.6f},{started},{rtt},{rc},{record.retries},{record.connected},{error}\n")
@@ -6,3 +6,4 @@ class ClientSettings:
     retain: bool
     qos: int
     time_interval: int
+    missed_tick_policy: str = 'catch_up'
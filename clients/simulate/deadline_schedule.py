@@ -0,0 +1,52 @@
+import time
+
+class DeadlineSchedule:
+    """Fires a publisher on absolute monotonic deadlines, so the time spent publishing never stretches the period"""
+    POLICIES = ('catch_up', 'skip', 'coalesce')
+
+    def __init__(self, interval: float, policy: str = 'catch_up'):
+        if policy not in self.POLICIES:
+            raise NameError(f"Missed tick policy '{policy}' is unknown")
+        self.interval = interval
+        self.policy = policy
+        self.deadline = time.monotonic()
+
+        # schedule lag telemetry, how late each send was compared with its deadline
+        self.sends = 0
+        self.missed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.lag_last = 0.0
+
+    def start(self, now: float = None):
+        self.deadline = time.monotonic() if now is None else now
+
+    def fire(self, now: float):
+        """Called once the current deadline has passed. Returns the deadline the send is for, or None when the tick is skipped"""
+        deadline = self.deadline
+        # number of later ticks that are already due as well
+        overdue = int((now - deadline) // self.interval) if self.interval > 0 else 0
+        if overdue == 0 or self.policy == 'catch_up':
+            # catch_up sends every tick, back to back until it is on time again
+            self.deadline += self.interval
+            return deadline
+        self.deadline += (overdue + 1) * self.interval
+        if self.policy == 'coalesce':
+            # one send now stands in for all the ticks that were missed
+            self.missed += overdue
+            return deadline + overdue * self.interval
+        # skip drops every overdue tick and waits for the next deadline
+        self.missed += overdue + 1
+        return None
+
+    def record_send(self, deadline: float, now: float):
+        lag = max(now - deadline, 0.0)
+        self.sends += 1
+        self.lag_total += lag
+        self.lag_last = lag
+        if lag > self.lag_max:
+            self.lag_max = lag
+
+    @property
+    def lag_mean(self):
+        return self.lag_total / self.sends if self.sends else 0.0
@@ -0,0 +1,165 @@
+import math
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LatencyHistogram:
+    """Log-linear buckets in the style of HdrHistogram: every bucket is within 10^-precision of its values.
+    Only the buckets in use are stored, so the memory does not grow with the number of recorded values"""
+    def __init__(self, precision=2):
+        self.precision = precision
+        # values below sub_bucket_count get a bucket each, above that every power of two is split in half_count buckets
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** precision))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        # negative latencies come from clock offsets, they are recorded as 0
+        self.negative = 0
+
+    def index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+    def bucket_range(self, index):
+        """Lowest and highest value of a bucket"""
+        if index < self.sub_bucket_count:
+            return index, index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.half_count + 1
+        lowest = (offset % self.half_count + self.half_count) << shift
+        return lowest, lowest + (1 << shift) - 1
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            self.negative += 1
+            value = 0
+        index = self.index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_array(self, values):
+        """Record a numpy array of values at once, the same as record() on each of them"""
+        import numpy as np
+        values = np.asarray(values)
+        if not len(values):
+            return
+        values = np.floor(values).astype(np.int64)
+        negative = values < 0
+        self.negative += int(negative.sum())
+        values[negative] = 0
+        # frexp gives the bit length of every integer below 2^53
+        shift = np.maximum(np.frexp(values)[1] - self.sub_bucket_bits, 0)
+        indexes = np.where(values < self.sub_bucket_count, values,
+                           self.sub_bucket_count + (shift - 1) * self.half_count + (values >> shift) - self.half_count)
+        for index, count in zip(*np.unique(indexes, return_counts=True)):
+            self.counts[int(index)] = self.counts.get(int(index), 0) + int(count)
+        self.count += len(values)
+        self.total += int(values.sum())
+        low, high = int(values.min()), int(values.max())
+        if self.min is None or low < self.min:
+            self.min = low
+        if self.max is None or high > self.max:
+            self.max = high
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Can not merge a histogram of precision {other.precision} into one of precision {self.precision}")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.negative += other.negative
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percentile):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                lowest, highest = self.bucket_range(index)
+                # the middle of the bucket, but never outside of the recorded values
+                return min(max((lowest + highest) / 2, self.min), self.max)
+        return self.max
+
+    def percentiles(self):
+        values = {f"p{percentile:g}": self.percentile(percentile) for percentile in PERCENTILES}
+        values['max'] = self.max
+        return values
+
+    def cumulative_counts(self, bounds):
+        """Number of values up to each bound, as for the le buckets of a Prometheus histogram"""
+        counts = [0] * len(bounds)
+        for index, count in self.counts.items():
+            highest = self.bucket_range(index)[1]
+            for position, bound in enumerate(bounds):
+                if highest <= bound:
+                    counts[position] += count
+        return counts
+
+    def to_dict(self):
+        return {
+            'precision': self.precision,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'negative': self.negative,
+            # JSON object keys are strings
+            'counts': {str(index): count for index, count in self.counts.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, values):
+        histogram = cls(values['precision'])
+        histogram.counts = {int(index): count for index, count in values['counts'].items()}
+        histogram.count = values['count']
+        histogram.total = values['total']
+        histogram.min = values['min']
+        histogram.max = values['max']
+        histogram.negative = values.get('negative', 0)
+        return histogram
+
+
+def merge_by_topic(histograms_by_topic, merged=None):
+    """Merge {topic: histogram dict} into {topic: LatencyHistogram}"""
+    merged = {} if merged is None else merged
+    for topic, values in histograms_by_topic.items():
+        histogram = LatencyHistogram.from_dict(values)
+        if topic in merged:
+            merged[topic].merge(histogram)
+        else:
+            merged[topic] = histogram
+    return merged
+
+def print_percentiles(histograms):
+    """Table of the latency percentiles in microseconds of {topic: LatencyHistogram}"""
+    if not histograms:
+        return
+    columns = [f"p{percentile:g}" for percentile in PERCENTILES] + ['max']
+    print()
+    print(f'{"Topic":30} {"Count":>10} ' + ' '.join(f'{column + " (us)":>12}' for column in columns))
+    for topic, histogram in sorted(histograms.items()):
+        values = histogram.percentiles()
+        print(f'{topic:30} {histogram.count:>10} ' + ' '.join(f'{values[column]:>12.1f}' for column in columns))
@@ -0,0 +1,113 @@
+import json
+import os
+import struct
+
+# One fixed-width little-endian record per received message with a timestamp
+RECORD_FIELDS = [
+    ('topic_id', '<u4'),
+    # the message id: prefix and sequence number of counter ids, high and low 64 bits of uuid4 ids
+    ('prefix', '<u8'),
+    ('seq', '<u8'),
+    ('send_ns', '<i8'),
+    ('receive_ns', '<i8'),
+    ('payload_bytes', '<u4')
+]
+RECORD = struct.Struct('<IQQqqI')
+# version 1 records had no prefix, the seq of every process was the same
+FORMAT_VERSION = 2
+
+def records_file(latency_log_file):
+    """subscriber-x-0.latency.csv -> subscriber-x-0.latency.bin"""
+    return os.path.splitext(latency_log_file)[0] + '.bin'
+
+def topics_file(records_path):
+    """Topic dictionary written next to a records file, shared by the segments rotated out of it"""
+    base, extension = os.path.splitext(records_path)
+    if extension[1:].isdigit():
+        base = os.path.splitext(base)[0]
+    return base + '.topics.json'
+
+def log_segments(path):
+    """A log file after the segments LOG_ROTATE_BYTES rotated out of it, oldest first: <file>.2, <file>.1, <file>"""
+    path = os.fspath(path)
+    directory, name = os.path.split(path)
+    rotated = []
+    for entry in os.scandir(directory or '.'):
+        index = entry.name[len(name) + 1:]
+        if entry.name.startswith(name + '.') and index.isdigit():
+            rotated.append((int(index), entry.path))
+    segments = [segment for _, segment in sorted(rotated, reverse=True)]
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+def message_key(message_id):
+    """(prefix, seq) of a message id, unique across publisher processes: the process prefix and sequence number of
+    counter ids, the high and low 64 bits of uuid4 ids. (0, 0) for ids of neither form"""
+    prefix, _, sequence = message_id.rpartition('-')
+    if len(prefix) == 12 and sequence.isdigit():
+        try:
+            return int(prefix, 16), int(sequence)
+        except ValueError:
+            pass
+    try:
+        value = int(message_id.replace('-', ''), 16)
+    except ValueError:
+        return 0, 0
+    return (value >> 64) & 0xFFFFFFFFFFFFFFFF, value & 0xFFFFFFFFFFFFFFFF
+
+
+class TopicDictionary:
+    """Ids of the topics of one records file, saved as JSON whenever a new topic shows up"""
+    def __init__(self, path):
+        self.path = path
+        self.ids = {}
+
+    def id(self, topic):
+        topic_id = self.ids.get(topic)
+        if topic_id is None:
+            topic_id = self.ids[topic] = len(self.ids)
+            self.save()
+        return topic_id
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({'version': FORMAT_VERSION, 'fields': RECORD_FIELDS, 'topics': list(self.ids)}, f)
+
+
+def read_topics(records_path):
+    with open(topics_file(records_path), encoding="utf-8") as f:
+        return json.load(f)['topics']
+
+def record_fields(records_path):
+    """Fields of the records of a file as they were written, listed in its topic dictionary"""
+    with open(topics_file(records_path), encoding="utf-8") as f:
+        return [tuple(field) for field in json.load(f)['fields']]
+
+def read_records(records_path):
+    """Memory-mapped structured array of a records file, nothing is parsed or copied"""
+    import numpy as np
+    dtype = np.dtype(record_fields(records_path))
+    count = os.path.getsize(records_path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    # a record being appended while the file is read is left out
+    return np.memmap(records_path, dtype=dtype, mode='r', shape=(count,))
+
+def read_dataframe(records_path):
+    """Records file as a pandas DataFrame with the columns of the .latency.csv files"""
+    import pandas as pd
+    records = read_records(records_path)
+    topics = read_topics(records_path)
+    latency_ns = records['receive_ns'] - records['send_ns']
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(records['receive_ns'], unit='ns'),
+        'topic': pd.Categorical.from_codes(records['topic_id'].astype('int32'), categories=topics),
+        'message_id': records['seq'],
+        # only with version 2 records, together with the seq it tells the messages of different processes apart
+        **({'message_prefix': records['prefix']} if 'prefix' in records.dtype.names else {}),
+        'send_time': records['send_ns'] // 1_000_000,
+        'receive_time': records['receive_ns'] // 1_000_000,
+        'latency_ms': latency_ns / 1_000_000,
+        'payload_bytes': records['payload_bytes']
+    })
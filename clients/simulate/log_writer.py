@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+import time
+
+class LogFile:
+    """An open log file with the records waiting to be written to it"""
+    def __init__(self, path, header=None, binary=False):
+        self.path = path
+        self.header = header
+        self.binary = binary
+        self.handle = None
+        self.size = 0
+        self.pending = []
+        self.pending_bytes = 0
+
+    def open(self):
+        if self.binary:
+            self.handle = open(self.path, "ab")
+        else:
+            self.handle = open(self.path, "a", encoding="utf-8")
+        self.size = self.handle.tell()
+        if self.size == 0 and self.header:
+            self.handle.write(self.header)
+            self.size = len(self.header)
+
+
+class LogWriter(threading.Thread):
+    """Writes the log records of a whole process from one thread, fed by a bounded queue so producers never wait on file I/O"""
+    def __init__(self, queue_size=100000, flush_bytes=64 * 1024, flush_interval=1.0, rotate_bytes=0, rotate_count=5):
+        threading.Thread.__init__(self, name='log-writer', daemon=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_count = rotate_count
+        self.files = {}
+        self.headers = {}
+        self.binary_paths = set()
+        self.written = 0
+        self.dropped = 0
+        self.last_flush = time.monotonic()
+        self.stopping = False
+
+    def write(self, path, record):
+        """Queue a record, either a string or a callable returning one so formatting also happens on the writer thread"""
+        try:
+            self.queue.put_nowait((path, record))
+        except queue.Full:
+            self.dropped += 1
+
+    def set_header(self, path, header):
+        """Header written whenever the file is created, including after a rotation"""
+        self.headers[path] = header
+
+    def set_binary(self, path):
+        """Records of this file are bytes, appended as they are without a newline"""
+        self.binary_paths.add(path)
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'queue_depth': self.queue_depth}
+
+    def run(self):
+        while not (self.stopping and self.queue.empty()):
+            try:
+                path, record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self.flush_all()
+                continue
+            if path is not None:
+                self.append(path, record)
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self.flush_all()
+        self.flush_all()
+        for log_file in self.files.values():
+            log_file.handle.close()
+
+    def append(self, path, record):
+        try:
+            text = record() if callable(record) else record
+        except Exception as e:
+            text = f"<error formatting log record: {e}>"
+        log_file = self.files.get(path)
+        if log_file is None:
+            log_file = self.files[path] = LogFile(path, self.headers.get(path), path in self.binary_paths)
+            log_file.open()
+        if log_file.binary:
+            log_file.pending.append(text)
+            log_file.pending_bytes += len(text)
+        else:
+            log_file.pending.append(f"{text}\n")
+            log_file.pending_bytes += len(text) + 1
+        self.written += 1
+        if log_file.pending_bytes >= self.flush_bytes:
+            self.flush(log_file)
+
+    def flush_all(self):
+        for log_file in self.files.values():
+            if log_file.pending:
+                self.flush(log_file)
+        self.last_flush = time.monotonic()
+
+    def flush(self, log_file):
+        try:
+            log_file.handle.write((b'' if log_file.binary else '').join(log_file.pending))
+            log_file.handle.flush()
+        except OSError as e:
+            print(f"Error writing to {log_file.path}: {str(e)}")
+        log_file.size += log_file.pending_bytes
+        log_file.pending = []
+        log_file.pending_bytes = 0
+        if self.rotate_bytes and log_file.size >= self.rotate_bytes:
+            self.rotate(log_file)
+
+    def rotate(self, log_file):
+        # subscriber.log -> subscriber.log.1 -> subscriber.log.2 ..., the oldest one is overwritten
+        log_file.handle.close()
+        for index in range(self.rotate_count - 1, 0, -1):
+            if os.path.exists(f"{log_file.path}.{index}"):
+                os.replace(f"{log_file.path}.{index}", f"{log_file.path}.{index + 1}")
+        os.replace(log_file.path, f"{log_file.path}.1")
+        log_file.open()
+
+    def close(self):
+        self.stopping = True
+        # wake the thread up in case it waits on an empty queue
+        try:
+            self.queue.put_nowait((None, None))
+        except queue.Full:
+            pass
+        self.join()
+
+
+_log_writer = None
+_log_writer_settings = {}
+_log_writer_lock = threading.Lock()
+
+def configure_log_writer(**settings):
+    """Settings for the writer of this process, used when it is started"""
+    _log_writer_settings.update(settings)
+
+def get_log_writer():
+    """The writer thread of this process, started on first use"""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None or _log_writer.pid != os.getpid():
+            _log_writer = LogWriter(**_log_writer_settings)
+            _log_writer.pid = os.getpid()
+            _log_writer.start()
+        return _log_writer
+
+def current_log_writer():
+    """The writer thread of this process if it was started, without starting one"""
+    log_writer = _log_writer
+    if log_writer is not None and log_writer.pid == os.getpid():
+        return log_writer
+    return None
+
+def close_log_writer():
+    global _log_writer
+    with _log_writer_lock:
+        log_writer, _log_writer = _log_writer, None
+    if log_writer is not None:
+        log_writer.close()
+        stats = log_writer.stats()
+        print(f"Log writer: {stats['written']} records written, {stats['dropped']} dropped")
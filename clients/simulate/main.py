@@ -1,6 +1,7 @@
 import argparse
 from pathlib import Path
 from simulator import Simulator
+from workers import run_workers
 
 def default_settings():
     base_folder = Path(__file__).resolve().parent.parent
@@ -25,9 +26,10 @@ parser.add_argument(
 parser.add_argument(
     '-m', 
     '--mode', 
-    choices=['pub', 'sub', 'both'], 
+    choices=['pub', 'sub', 'both', 'bench', 'ramp'], 
     default='both',
-    help='Run mode: publisher only, subscriber only, or both (default)'
+    help='Run mode: publisher only, subscriber only, both (default), bench to sweep the BENCH_ settings against a local broker, '
+         'or ramp to raise the offered rate until the RAMP_ latency SLO breaks'
 )
 parser.add_argument(
     '-o', 
@@ -37,7 +39,43 @@ parser.add_argument(
     default='./logs',
     help='Directory to store collected subscription data'
 )
+parser.add_argument(
+    '-e',
+    '--engine',
+    choices=['thread', 'asyncio'],
+    default='thread',
+    help='Publisher engine: one thread per topic (default) or a single asyncio event loop for all topics'
+)
+parser.add_argument(
+    '-w',
+    '--workers',
+    type=int,
+    default=1,
+    help='Number of worker processes the topics and subscribers are split across (default 1)'
+)
+parser.add_argument(
+    '-d',
+    '--duration',
+    type=float,
+    default=None,
+    help='Stop the simulation after this many seconds (default: run until interrupted, 10 seconds per run in bench mode)'
+)
+parser.add_argument(
+    '--metrics-port',
+    type=int,
+    default=None,
+    help='Serve live Prometheus metrics on this port, worker processes use the following ports (default: METRICS_PORT of the settings file)'
+)
 args = parser.parse_args()
 
-simulator = Simulator(args.settings_file, args.output_dir)
-simulator.run()
\ No newline at end of file
+if args.mode == 'bench':
+    from bench_sweep import run_bench
+    run_bench(args.settings_file, args.output_dir, args.engine, args.duration or 10)
+elif args.mode == 'ramp':
+    simulator = Simulator(args.settings_file, args.output_dir, args.engine, metrics_port=args.metrics_port, ramp=True)
+    simulator.run(args.duration)
+elif args.workers > 1:
+    run_workers(args.settings_file, args.output_dir, args.engine, args.workers, args.duration, args.metrics_port)
+else:
+    simulator = Simulator(args.settings_file, args.output_dir, args.engine, metrics_port=args.metrics_port)
+    simulator.run(args.duration)
\ No newline at end of file
@@ -0,0 +1,155 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from log_writer import current_log_writer
+
+# le bounds in seconds of the exported latency histograms
+BUCKET_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsWriter:
+    """Builds a response in the Prometheus text exposition format"""
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, metric_type, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {metric_type}")
+
+    def sample(self, name, value, **labels):
+        if labels:
+            name += '{' + ','.join(f'{key}="{label(value)}"' for key, value in labels.items()) + '}'
+        self.lines.append(f"{name} {value}")
+
+    def histogram(self, name, histogram, **labels):
+        """A LatencyHistogram in microseconds as a Prometheus histogram in seconds"""
+        counts = histogram.cumulative_counts([bound * 1_000_000 for bound in BUCKET_BOUNDS])
+        for bound, count in zip(BUCKET_BOUNDS, counts):
+            self.sample(f"{name}_bucket", count, **labels, le=f"{bound:g}")
+        self.sample(f"{name}_bucket", histogram.count, **labels, le="+Inf")
+        self.sample(f"{name}_sum", histogram.total / 1_000_000, **labels)
+        self.sample(f"{name}_count", histogram.count, **labels)
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+
+class MetricsServer:
+    """Serves the live counters of a Simulator on http://host:port/metrics"""
+    def __init__(self, simulator, port, host='127.0.0.1'):
+        self.simulator = simulator
+        self.port = port
+        self.host = host
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # scrapes are not worth a line on the console
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+        self.thread.start()
+        print(f"Metrics served on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def render(self):
+        simulator = self.simulator
+        out = MetricsWriter()
+
+        out.family('mqtt_sim_published_total', 'counter', 'Messages acknowledged by paho per topic')
+        for topic in simulator.topics:
+            out.sample('mqtt_sim_published_total', topic.published_count, topic=topic.topic_url)
+
+        out.family('mqtt_sim_inflight_messages', 'gauge', 'Messages published and not acknowledged yet per topic')
+        for topic in simulator.topics:
+            out.sample('mqtt_sim_inflight_messages', topic.publish_timer.inflight, topic=topic.topic_url)
+
+        out.family('mqtt_sim_publish_ack_seconds', 'histogram', 'Time from publish() to the acknowledgement of the message per topic')
+        for topic in simulator.topics:
+            out.histogram('mqtt_sim_publish_ack_seconds', topic.publish_timer.snapshot(), topic=topic.topic_url)
+
+        out.family('mqtt_sim_schedule_lag_seconds', 'gauge', 'How late the last send was compared with its deadline per topic')
+        for topic in simulator.topics:
+            out.sample('mqtt_sim_schedule_lag_seconds', f"{topic.schedule.lag_last:.6f}", topic=topic.topic_url)
+        out.family('mqtt_sim_schedule_lag_max_seconds', 'gauge', 'Maximum lag of the sends compared with their deadlines per topic')
+        for topic in simulator.topics:
+            out.sample('mqtt_sim_schedule_lag_max_seconds', f"{topic.schedule.lag_max:.6f}", topic=topic.topic_url)
+        out.family('mqtt_sim_missed_ticks_total', 'counter', 'Deadlines skipped or coalesced per topic')
+        for topic in simulator.topics:
+            out.sample('mqtt_sim_missed_ticks_total', topic.schedule.missed, topic=topic.topic_url)
+
+        if simulator.connection_pool is not None:
+            out.family('mqtt_sim_connection_inflight_messages', 'gauge', 'Messages not acknowledged yet per shared connection')
+            for connection in simulator.connection_pool.connections:
+                out.sample('mqtt_sim_connection_inflight_messages', connection.inflight_count, connection=connection.client_id)
+
+        out.family('mqtt_sim_window_inflight_messages', 'gauge', 'Messages handed to paho and not acknowledged yet per publishing client')
+        for window in simulator.windows:
+            out.sample('mqtt_sim_window_inflight_messages', window.inflight, connection=window.name)
+        out.family('mqtt_sim_window_queued_messages', 'gauge', 'Messages waiting in the client queue for room in the inflight window per publishing client')
+        for window in simulator.windows:
+            out.sample('mqtt_sim_window_queued_messages', len(window.queue), connection=window.name)
+        out.family('mqtt_sim_window_dropped_total', 'counter', 'Messages dropped because the client queue was full per publishing client')
+        for window in simulator.windows:
+            out.sample('mqtt_sim_window_dropped_total', window.dropped, connection=window.name)
+        out.family('mqtt_sim_window_blocked_total', 'counter', 'Publishes that waited for room in a full client queue per publishing client')
+        for window in simulator.windows:
+            out.sample('mqtt_sim_window_blocked_total', window.blocked, connection=window.name)
+
+        out.family('mqtt_sim_received_total', 'counter', 'Messages received per subscriber')
+        for subscriber in simulator.subscribers:
+            out.sample('mqtt_sim_received_total', subscriber.received_count, subscriber=subscriber.client_id)
+        expected_deliveries = simulator.expected_deliveries()
+        if expected_deliveries is not None:
+            # a worker process does not know the sends of the topics of the other workers, only the merged summary does
+            out.family('mqtt_sim_expected_total', 'gauge', 'Messages a subscriber should have received given the sends of the topics its filter matches')
+            for subscriber, expected in expected_deliveries.items():
+                out.sample('mqtt_sim_expected_total', expected, subscriber=subscriber)
+        out.family('mqtt_sim_received_bytes_total', 'counter', 'Payload bytes received per subscriber')
+        for subscriber in simulator.subscribers:
+            out.sample('mqtt_sim_received_bytes_total', subscriber.received_bytes, subscriber=subscriber.client_id)
+
+        out.family('mqtt_sim_latency_seconds', 'histogram', 'Publish to receive latency per topic over all subscribers')
+        for topic, histogram in sorted(simulator.latency_histograms().items()):
+            out.histogram('mqtt_sim_latency_seconds', histogram, topic=topic)
+
+        pipeline = simulator.receive_pipeline
+        out.family('mqtt_sim_receive_queue_depth', 'gauge', 'Received messages waiting for the receive pipeline')
+        out.sample('mqtt_sim_receive_queue_depth', pipeline.queue_depth)
+        out.family('mqtt_sim_receive_dropped_total', 'counter', 'Received messages dropped because the receive queue was full')
+        out.sample('mqtt_sim_receive_dropped_total', pipeline.dropped)
+
+        log_writer = current_log_writer()
+        if log_writer is not None:
+            stats = log_writer.stats()
+            out.family('mqtt_sim_log_queue_depth', 'gauge', 'Log records waiting for the log writer thread')
+            out.sample('mqtt_sim_log_queue_depth', stats['queue_depth'])
+            out.family('mqtt_sim_log_records_total', 'counter', 'Log records written')
+            out.sample('mqtt_sim_log_records_total', stats['written'])
+            out.family('mqtt_sim_log_dropped_total', 'counter', 'Log records dropped because the log queue was full')
+            out.sample('mqtt_sim_log_dropped_total', stats['dropped'])
+
+        return out.text()
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import struct
+import threading
+from topic_trie import TopicTrie
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+MQTTv5 = 5
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+def decode_length(data, offset):
+    """Variable byte integer at offset, returns it with the offset after it"""
+    multiplier = 1
+    value = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value += (byte & 0x7f) * multiplier
+        if not byte & 0x80:
+            return value, offset
+        multiplier *= 128
+
+def read_string(data, offset):
+    length = struct.unpack_from('!H', data, offset)[0]
+    return data[offset + 2:offset + 2 + length], offset + 2 + length
+
+def skip_properties(data, offset, protocol):
+    """MQTT 5 properties are parsed past and ignored"""
+    if protocol != MQTTv5:
+        return offset
+    length, offset = decode_length(data, offset)
+    return offset + length
+
+def packet(packet_type, body, flags=0):
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+class Session:
+    """One connected client and the packet ids of its outgoing messages"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.client_id = None
+        self.protocol = 4
+        self.next_packet_id = 0
+        self.filters = set()
+        # packet ids of QoS 2 messages received and not yet released, duplicates are not routed twice
+        self.incoming_qos2 = set()
+
+    def packet_id(self):
+        self.next_packet_id = self.next_packet_id % 65535 + 1
+        return self.next_packet_id
+
+    def send(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+
+class MiniBroker:
+    """Minimal MQTT 3.1.1 and 5 broker for benchmarks without a network: CONNECT, SUBSCRIBE, UNSUBSCRIBE and PUBLISH
+    with QoS 0, 1 and 2 routed over + and # wildcards. No retained messages, wills, persistent sessions, authentication
+    or retransmissions, every client is accepted. Runs its own event loop on a background thread"""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        # topic filter levels -> {session: granted QoS}
+        self.subscriptions = TopicTrie()
+        self.sessions = set()
+        self.received = 0
+        self.delivered = 0
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+        self.error = None
+
+    def start(self):
+        """Listen in a background thread, returns the port, which is picked by the system if port was 0"""
+        self.thread = threading.Thread(target=self.run, name='mini-broker', daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+        return self.port
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+            self.port = self.server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self.error = e
+            self.started.set()
+            return
+        self.started.set()
+        self.loop.run_forever()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            for session in list(self.sessions):
+                self.loop.call_soon_threadsafe(session.writer.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length = 0
+                multiplier = 1
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7f) * multiplier
+                    if not byte & 0x80:
+                        break
+                    multiplier *= 128
+                body = await reader.readexactly(length) if length else b''
+                packet_type = header[0] >> 4
+                if packet_type == DISCONNECT:
+                    break
+                subscribers = self.dispatch(session, packet_type, header[0] & 0x0f, body)
+                if subscribers:
+                    # slow subscribers slow the publisher down, as they would on a real broker
+                    for subscriber in subscribers:
+                        try:
+                            await subscriber.writer.drain()
+                        except ConnectionError:
+                            pass
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.drop(session)
+            writer.close()
+
+    def dispatch(self, session, packet_type, flags, body):
+        """Handle one packet, returns the sessions a message was routed to"""
+        if packet_type == PUBLISH:
+            return self.on_publish(session, flags, body)
+        if packet_type == CONNECT:
+            self.on_connect(session, body)
+        elif packet_type == SUBSCRIBE:
+            self.on_subscribe(session, body)
+        elif packet_type == UNSUBSCRIBE:
+            self.on_unsubscribe(session, body)
+        elif packet_type == PUBREC:
+            session.send(packet(PUBREL, body[:2], flags=0x02))
+        elif packet_type == PUBREL:
+            session.incoming_qos2.discard(body[:2])
+            session.send(packet(PUBCOMP, body[:2]))
+        elif packet_type == PINGREQ:
+            session.send(packet(PINGRESP, b''))
+        # PUBACK and PUBCOMP complete outgoing messages, nothing is kept for them
+        return None
+
+    def on_connect(self, session, body):
+        _, offset = read_string(body, 0)
+        session.protocol = body[offset]
+        offset = skip_properties(body, offset + 4, session.protocol)
+        client_id, offset = read_string(body, offset)
+        session.client_id = client_id.decode('utf-8')
+        # session present 0, return code success, and no properties on MQTT 5
+        session.send(packet(CONNACK, b'\x00\x00\x00' if session.protocol == MQTTv5 else b'\x00\x00'))
+
+    def on_subscribe(self, session, body):
+        packet_id = body[:2]
+        offset = skip_properties(body, 2, session.protocol)
+        granted = bytearray()
+        while offset < len(body):
+            topic_filter, offset = read_string(body, offset)
+            qos = body[offset] & 0x03
+            offset += 1
+            topic_filter = topic_filter.decode('utf-8')
+            self.subscriptions.add(topic_filter, session, qos)
+            session.filters.add(topic_filter)
+            granted.append(qos)
+        properties = b'\x00' if session.protocol == MQTTv5 else b''
+        session.send(packet(SUBACK, packet_id + properties + bytes(granted)))
+
+    def on_unsubscribe(self, session, body):
+        packet_id = body[:2]
+        offset = skip_properties(body, 2, session.protocol)
+        count = 0
+        while offset < len(body):
+            topic_filter, offset = read_string(body, offset)
+            topic_filter = topic_filter.decode('utf-8')
+            self.subscriptions.remove(topic_filter, session)
+            session.filters.discard(topic_filter)
+            count += 1
+        if session.protocol == MQTTv5:
+            session.send(packet(UNSUBACK, packet_id + b'\x00' + bytes(count)))
+        else:
+            session.send(packet(UNSUBACK, packet_id))
+
+    def on_publish(self, session, flags, body):
+        qos = (flags >> 1) & 0x03
+        topic, offset = read_string(body, 0)
+        if qos:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+        offset = skip_properties(body, offset, session.protocol)
+        payload = body[offset:]
+        if qos == 1:
+            session.send(packet(PUBACK, packet_id))
+        elif qos == 2:
+            session.send(packet(PUBREC, packet_id))
+            if packet_id in session.incoming_qos2:
+                # a duplicate of a message routed already
+                return None
+            session.incoming_qos2.add(packet_id)
+        self.received += 1
+        return self.route(topic, qos, payload)
+
+    def route(self, topic_bytes, qos, payload):
+        topic = topic_bytes.decode('utf-8')
+        # a client with overlapping subscriptions gets the message once, at the highest granted QoS
+        targets = {}
+        for subscriber, granted in self.subscriptions.matches(topic):
+            targets[subscriber] = max(targets.get(subscriber, 0), granted)
+        encoded_topic = struct.pack('!H', len(topic_bytes)) + topic_bytes
+        for subscriber, granted in targets.items():
+            delivery_qos = min(qos, granted)
+            body = encoded_topic
+            if delivery_qos:
+                body += struct.pack('!H', subscriber.packet_id())
+            if subscriber.protocol == MQTTv5:
+                body += b'\x00'
+            subscriber.send(packet(PUBLISH, body + payload, flags=delivery_qos << 1))
+            self.delivered += 1
+        return targets
+
+    def drop(self, session):
+        self.sessions.discard(session)
+        for topic_filter in session.filters:
+            self.subscriptions.remove(topic_filter, session)
+        session.filters.clear()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Minimal local MQTT broker for benchmarks')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('-p', '--port', type=int, default=1883)
+    opts = ap.parse_args()
+    broker = MiniBroker(opts.host, opts.port)
+    print(f"Mini broker listening on {opts.host}:{broker.start()}")
+    try:
+        broker.thread.join()
+    except KeyboardInterrupt:
+        broker.stop()
+        print(f"{broker.received} messages received, {broker.delivered} delivered")
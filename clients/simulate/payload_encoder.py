@@ -0,0 +1,161 @@
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from payload_formats import StructSchema, get_packer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+# name -> function serializing a value to compact JSON bytes
+SERIALIZERS = {'json': _json_dumps}
+if orjson is not None:
+    SERIALIZERS['orjson'] = orjson.dumps
+
+def get_serializer(name='auto'):
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in SERIALIZERS else 'json'
+    if name not in SERIALIZERS:
+        raise NameError(f"Payload serializer '{name}' is unknown or not installed")
+    return SERIALIZERS[name]
+
+
+class MessageIdGenerator:
+    """Message ids as uuid4 strings, or as a per-process prefix plus a sequence number"""
+    MODES = ('uuid4', 'counter')
+
+    def __init__(self, mode='uuid4'):
+        if mode not in self.MODES:
+            raise NameError(f"Message id mode '{mode}' is unknown")
+        self.mode = mode
+        self.pid = None
+        self.prefix = None
+        self.sequence = None
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        if self.mode == 'uuid4':
+            return str(uuid.uuid4())
+        if self.pid != os.getpid():
+            # a forked worker process must not repeat the ids of its parent
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.prefix = uuid.uuid4().hex[:12]
+                    self.sequence = itertools.count(1)
+                    self.pid = os.getpid()
+        return f"{self.prefix}-{next(self.sequence)}"
+
+
+# one generator per process, so counter ids are unique across all topics
+message_ids = {mode: MessageIdGenerator(mode) for mode in MessageIdGenerator.MODES}
+
+
+class PayloadEncoder:
+    """Compiled once per topic from PAYLOAD_ROOT and the DATA fields, then only the changing values are serialized per message"""
+    def __init__(self, payload_root: dict, topic_data: list, metadata_config: dict):
+        data_names = [data['NAME'] for data in topic_data]
+        self.payload_format = metadata_config.get('payload_format', 'json')
+        self.dumps = get_serializer(metadata_config.get('serializer', 'auto'))
+        self.message_ids = message_ids[metadata_config.get('message_id_mode', 'uuid4')]
+
+        prefix = metadata_config.get('metadata_field_prefix', '_')
+        self.message_id_name = f"{prefix}message_id" if metadata_config.get('include_message_id', True) else None
+        self.timestamp_name = f"{prefix}timestamp" if metadata_config.get('include_timestamp', True) else None
+        # the millisecond field stays for existing consumers, latency is measured with the nanosecond one
+        self.timestamp_ns_name = f"{prefix}timestamp_ns" if self.timestamp_name else None
+        if metadata_config.get('instance_id') and self.payload_format != 'struct':
+            # lets subscribers of other instances correct the latency by the clock offset to this one
+            payload_root = dict(payload_root)
+            payload_root[f"{prefix}instance"] = metadata_config['instance_id']
+
+        self.payload_root = payload_root
+        self.data_names = data_names
+        generated_names = set(data_names) | {self.message_id_name, self.timestamp_name, self.timestamp_ns_name}
+        # a generated field replacing a PAYLOAD_ROOT key keeps the key's position, only the dict path gets that right
+        self.use_template = not (generated_names & set(payload_root)) and len(set(data_names)) == len(data_names)
+
+        self.pack = None
+        self.struct_schema = None
+        if self.payload_format == 'struct':
+            self.struct_schema = StructSchema.register(topic_data, payload_root, self.message_id_name, self.timestamp_name, self.timestamp_ns_name)
+        elif self.payload_format != 'json':
+            self.pack = get_packer(self.payload_format)
+
+        # template slots: the serialized root without its braces, then '"name":' before every generated value
+        root = self.dumps(payload_root)[1:-1]
+        self.root_part = [root] if root else []
+        self.data_keys = [self.dumps(name) + b':' for name in data_names]
+        self.message_id_key = self.dumps(self.message_id_name) + b':"' if self.message_id_name else None
+        self.timestamp_key = self.dumps(self.timestamp_name) + b':' if self.timestamp_name else None
+        self.timestamp_ns_key = b',' + self.dumps(self.timestamp_ns_name) + b':' if self.timestamp_name else None
+
+        # metadata of the last encoded payload, for the publisher send log
+        self.message_id = None
+        self.timestamp_ns = None
+
+    def copy(self):
+        """Encoder of another topic with the same PAYLOAD_ROOT, DATA and metadata, sharing the compiled template"""
+        encoder = object.__new__(PayloadEncoder)
+        encoder.__dict__.update(self.__dict__)
+        return encoder
+
+    def encode(self, topic_data):
+        """Generate the next value of every active field and return the serialized payload, or None if no field is active"""
+        if self.struct_schema is not None:
+            return self.encode_struct(topic_data)
+        if self.pack is not None:
+            payload = self.build_dict(topic_data)
+            return self.pack(payload) if payload is not None else None
+        if not self.use_template:
+            payload = self.build_dict(topic_data)
+            return self.dumps(payload) if payload is not None else None
+        dumps = self.dumps
+        parts = list(self.root_part)
+        has_data_active = False
+        for data, key in zip(topic_data, self.data_keys):
+            if data.is_active:
+                has_data_active = True
+                parts.append(key + dumps(data.generate_value()))
+        if not has_data_active:
+            return None
+        if self.message_id_key is not None:
+            # uuid4 and counter ids never need JSON escaping
+            self.message_id = self.message_ids.next_id()
+            parts.append(self.message_id_key + self.message_id.encode('ascii') + b'"')
+        if self.timestamp_key is not None:
+            # Add timestamp in milliseconds and nanoseconds, read from the clock once
+            now = self.timestamp_ns = time.time_ns()
+            parts.append(self.timestamp_key + str(now // 1_000_000).encode('ascii') + self.timestamp_ns_key + str(now).encode('ascii'))
+        return b'{' + b','.join(parts) + b'}'
+
+    def encode_struct(self, topic_data):
+        # struct layouts only allow types that never become inactive
+        values = [data.generate_value() for data in topic_data]
+        self.message_id = self.message_ids.next_id() if self.message_id_name is not None else None
+        self.timestamp_ns = time.time_ns()
+        return self.struct_schema.pack(values, self.message_id, self.timestamp_ns)
+
+    def build_dict(self, topic_data):
+        payload = {}
+        payload.update(self.payload_root)
+        has_data_active = False
+        for data in topic_data:
+            if data.is_active:
+                has_data_active = True
+                payload[data.name] = data.generate_value()
+        if not has_data_active:
+            return None
+        if self.message_id_name is not None:
+            payload[self.message_id_name] = self.message_id = self.message_ids.next_id()
+        if self.timestamp_name is not None:
+            now = self.timestamp_ns = time.time_ns()
+            payload[self.timestamp_name] = now // 1_000_000
+            payload[self.timestamp_ns_name] = now
+        return payload
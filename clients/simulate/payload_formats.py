@@ -0,0 +1,111 @@
+import json
+import struct
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+FORMATS = ('json', 'msgpack', 'cbor', 'struct')
+
+# first byte of a struct payload, never the first byte of a JSON object, a MessagePack map or a CBOR map
+STRUCT_MAGIC = 0xC1
+STRUCT_HEADER = struct.Struct('<BI')
+STRUCT_TYPES = {'int': 'q', 'float': 'd', 'bool': '?', 'math_expression': 'd'}
+MESSAGE_ID_SIZE = 36
+
+def get_packer(payload_format):
+    """Function serializing a payload dict to bytes, for the formats that are not built from a template"""
+    if payload_format == 'msgpack':
+        if msgpack is None:
+            raise NameError("Payload format 'msgpack' requires the msgpack package")
+        return msgpack.packb
+    elif payload_format == 'cbor':
+        if cbor2 is None:
+            raise NameError("Payload format 'cbor' requires the cbor2 package")
+        return cbor2.dumps
+    raise NameError(f"Payload format '{payload_format}' is unknown")
+
+
+class StructSchema:
+    """Fixed binary layout derived from the DATA types of a topic, identified on the wire by a hash of the layout"""
+    # schema id -> StructSchema, filled from the settings file by publishers and subscribers alike
+    registry = {}
+
+    def __init__(self, topic_data: list, payload_root: dict, message_id_name: str, timestamp_name: str, timestamp_ns_name: str = None):
+        self.payload_root = payload_root
+        self.names = []
+        layout = ''
+        for data in topic_data:
+            if data['TYPE'] not in STRUCT_TYPES:
+                raise NameError(f"Data TYPE '{data['TYPE']}' can not be sent with payload format 'struct'")
+            self.names.append(data['NAME'])
+            layout += STRUCT_TYPES[data['TYPE']]
+        self.message_id_name = message_id_name
+        self.timestamp_name = timestamp_name
+        self.timestamp_ns_name = timestamp_ns_name
+        if message_id_name is not None:
+            layout += f'{MESSAGE_ID_SIZE}s'
+        if timestamp_name is not None:
+            # nanoseconds on the wire, the millisecond field is derived from it when unpacking
+            layout += 'q'
+        description = json.dumps([layout, self.names, message_id_name, timestamp_name, timestamp_ns_name, payload_root], sort_keys=True)
+        self.schema_id = zlib.crc32(description.encode('utf-8'))
+        self.body = struct.Struct('<' + layout)
+        self.header = STRUCT_HEADER.pack(STRUCT_MAGIC, self.schema_id)
+
+    @classmethod
+    def register(cls, topic_data, payload_root, message_id_name, timestamp_name, timestamp_ns_name=None):
+        schema = cls(topic_data, payload_root, message_id_name, timestamp_name, timestamp_ns_name)
+        return cls.registry.setdefault(schema.schema_id, schema)
+
+    def pack(self, values, message_id=None, timestamp_ns=None):
+        if self.message_id_name is not None:
+            values.append(message_id.encode('ascii'))
+        if self.timestamp_name is not None:
+            values.append(timestamp_ns)
+        return self.header + self.body.pack(*values)
+
+    def unpack(self, payload):
+        values = list(self.body.unpack_from(payload, STRUCT_HEADER.size))
+        decoded = dict(self.payload_root)
+        decoded.update(zip(self.names, values))
+        position = len(self.names)
+        if self.message_id_name is not None:
+            decoded[self.message_id_name] = values[position].rstrip(b'\0').decode('ascii')
+            position += 1
+        if self.timestamp_name is not None:
+            decoded[self.timestamp_name] = values[position] // 1_000_000
+            if self.timestamp_ns_name is not None:
+                decoded[self.timestamp_ns_name] = values[position]
+        return decoded
+
+
+def decode_payload(payload: bytes):
+    """Decode a payload of any of the FORMATS into a dict, recognized by its first byte. Raises ValueError if it is none of them"""
+    if not payload:
+        raise ValueError("Empty payload")
+    first = payload[0]
+    if first == STRUCT_MAGIC:
+        _, schema_id = STRUCT_HEADER.unpack_from(payload)
+        schema = StructSchema.registry.get(schema_id)
+        if schema is None:
+            raise ValueError(f"Unknown struct schema {schema_id}")
+        return schema.unpack(payload)
+    if msgpack is not None and (0x80 <= first <= 0x8f or first in (0xde, 0xdf)):
+        try:
+            return msgpack.unpackb(payload)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack payload: {e}")
+    if cbor2 is not None and 0xa0 <= first <= 0xbf:
+        try:
+            return cbor2.loads(payload)
+        except Exception as e:
+            raise ValueError(f"Invalid CBOR payload: {e}")
+    return json.loads(payload)
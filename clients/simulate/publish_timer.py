@@ -0,0 +1,38 @@
+import threading
+import time
+from latency_histogram import LatencyHistogram
+
+class PublishTimer:
+    """Time from publish() to paho's on_publish per message id, in microseconds.
+    The ack may be reported before publish() returned the mid, both orders are handled"""
+    def __init__(self, precision=2):
+        self.histogram = LatencyHistogram(precision)
+        self.sent = {}
+        self.early_acks = {}
+        self.lock = threading.Lock()
+
+    def published(self, mid, sent):
+        with self.lock:
+            acked = self.early_acks.pop(mid, None)
+            if acked is None:
+                self.sent[mid] = sent
+                return
+            self.histogram.record((acked - sent) * 1_000_000)
+
+    def acknowledged(self, mid):
+        acked = time.monotonic()
+        with self.lock:
+            sent = self.sent.pop(mid, None)
+            if sent is None:
+                self.early_acks[mid] = acked
+                return
+            self.histogram.record((acked - sent) * 1_000_000)
+
+    @property
+    def inflight(self):
+        return len(self.sent)
+
+    def snapshot(self):
+        """Copy of the histogram, safe to read while messages are still being acknowledged"""
+        with self.lock:
+            return LatencyHistogram(self.histogram.precision).merge(self.histogram)
@@ -0,0 +1,119 @@
+import collections
+import threading
+import time
+
+class PublishWindow:
+    """Inflight window and client queue of one paho client.
+    At most max_inflight messages are handed to paho unacknowledged, the rest wait in this queue of at most max_queued
+    messages (0 for no limit). When the queue is full, policy decides: 'block' the publisher, 'drop' the new message
+    or 'drop_oldest' queued message"""
+    POLICIES = ('block', 'drop', 'drop_oldest')
+
+    def __init__(self, name: str, max_inflight: int = 20, max_queued: int = 0, policy: str = 'block'):
+        if policy not in self.POLICIES:
+            raise NameError(f"Queue full policy '{policy}' is unknown")
+        self.name = name
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.policy = policy
+        self.inflight = 0
+        # (topic, message) waiting for room in the inflight window
+        self.queue = collections.deque()
+        self.dropped = 0
+        self.blocked = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def configure(self, client):
+        """The window is enforced here, paho sends whatever it is given"""
+        client.max_inflight_messages_set(0)
+        client.max_queued_messages_set(0)
+
+    @property
+    def full(self):
+        return self.max_queued > 0 and len(self.queue) >= self.max_queued and self.inflight >= self.max_inflight
+
+    def submit(self, topic, message):
+        """Send the message of topic now if the window has room, queue it otherwise"""
+        with self.condition:
+            if self.full:
+                if self.policy == 'drop':
+                    self.dropped += 1
+                    return
+                if self.policy == 'drop_oldest':
+                    self.queue.popleft()
+                    self.dropped += 1
+                else:
+                    self.blocked += 1
+                    while self.full and not self.closed:
+                        self.condition.wait(0.5)
+                    if self.closed:
+                        return
+            if self.queue or self.inflight >= self.max_inflight:
+                self.queue.append((topic, message))
+                return
+            self.inflight += 1
+        # never hold the condition across publish(), paho calls on_publish under its own lock
+        self.send(topic, message)
+
+    def acknowledged(self):
+        """A message left the window, send the next queued one"""
+        with self.condition:
+            self.inflight = max(self.inflight - 1, 0)
+            if not self.queue or self.inflight >= self.max_inflight:
+                self.condition.notify()
+                return
+            topic, message = self.queue.popleft()
+            self.inflight += 1
+            self.condition.notify()
+        self.send(topic, message)
+
+    def send(self, topic, message):
+        if topic.send(message) is None:
+            # the connection is closed, the message never entered the window
+            with self.condition:
+                self.inflight = max(self.inflight - 1, 0)
+                self.dropped += 1
+                self.condition.notify()
+
+    def close(self):
+        """Release blocked publishers, returns the number of messages that were still queued"""
+        with self.condition:
+            self.closed = True
+            queued = len(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+        return queued
+
+    def sample(self):
+        return self.inflight, len(self.queue), self.dropped, self.blocked
+
+
+class WindowSampler(threading.Thread):
+    """Writes the inflight and queued counts of every PublishWindow every interval seconds"""
+    HEADER = "time,connection,inflight,queued,dropped,blocked\n"
+
+    def __init__(self, windows, log_writer, path, interval=1.0):
+        threading.Thread.__init__(self, name='window-sampler', daemon=True)
+        self.windows = windows
+        self.log_writer = log_writer
+        self.path = path
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.write_sample()
+
+    def write_sample(self):
+        now = f"{time.time():.3f}"
+        for window in self.windows:
+            inflight, queued, dropped, blocked = window.sample()
+            self.log_writer.write(self.path, f"{now},{window.name},{inflight},{queued},{dropped},{blocked}")
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+        # the state at the end of the run
+        self.write_sample()
@@ -0,0 +1,187 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import paho.mqtt.client as mqtt
+from connection_ramp import ConnectionRamp
+
+class AsyncioClientDriver:
+    """Drives the network I/O of paho clients from an asyncio event loop instead of one loop_start() thread per client"""
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.clients = set()
+
+    def attach(self, client: mqtt.Client):
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+        self.clients.add(client)
+
+    def detach(self, client: mqtt.Client):
+        self.clients.discard(client)
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        # keepalive pings and timeouts, the part of loop_start() that is not socket driven
+        while True:
+            for client in list(self.clients):
+                client.loop_misc()
+            await asyncio.sleep(1)
+
+
+class ThreadSafeClientDriver(AsyncioClientDriver):
+    """AsyncioClientDriver whose socket callbacks may come from other threads than the one running the loop,
+    as they do while connect() runs in an executor"""
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__(loop)
+        self.loop_thread = None
+
+    def call(self, callback, *args):
+        if threading.get_ident() == self.loop_thread:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def on_socket_open(self, client, userdata, sock):
+        self.call(super().on_socket_open, client, userdata, sock)
+
+    def on_socket_close(self, client, userdata, sock):
+        self.call(super().on_socket_close, client, userdata, sock)
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.call(super().on_socket_register_write, client, userdata, sock)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.call(super().on_socket_unregister_write, client, userdata, sock)
+
+
+class AsyncPublisherEngine:
+    """Publishes every Topic from a single event loop, firing each one from a priority queue of deadlines"""
+    # number of messages published back to back before giving the loop a chance to flush sockets
+    BURST_SIZE = 64
+    # seconds before a topic blocked by a full PublishWindow is tried again
+    BLOCKED_RETRY = 0.001
+    # longest sleep of the loop, so topics added and a stop requested by other threads are noticed
+    MAX_SLEEP = 0.1
+
+    def __init__(self, topics, connection_pool=None, connection_ramp=None):
+        self.topics = list(topics)
+        self.connection_pool = connection_pool
+        # paces the connects of the topics, or of the pooled connections they share
+        self.connection_ramp = connection_ramp if connection_ramp is not None else ConnectionRamp()
+        self.schedule = []
+        self.sequence = itertools.count()
+        self.driver = None
+        self.loop = None
+        self.running = True
+
+    async def run(self):
+        loop = self.loop = asyncio.get_running_loop()
+        # the connects of the ramp run in its executor threads
+        self.driver = ThreadSafeClientDriver(loop)
+        self.driver.loop_thread = threading.get_ident()
+        misc_task = loop.create_task(self.driver.misc_loop())
+        try:
+            await self.connect_topics()
+            await self.publish_loop()
+        finally:
+            misc_task.cancel()
+            self.disconnect_topics()
+            if self.connection_pool is not None:
+                # the pooled clients are attached to this loop, so close them before it goes away
+                self.connection_pool.close()
+
+    def add_topics(self, topics):
+        """Start publishing on more topics, called from other threads while the engine runs"""
+        future = asyncio.run_coroutine_threadsafe(self.connect_topics(list(topics)), self.loop)
+        future.add_done_callback(self.report_connect_error)
+
+    @staticmethod
+    def report_connect_error(future):
+        # nobody waits for the connects of added topics, so their errors are printed
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error connecting topics: {future.exception()}")
+
+    def stop(self):
+        """Leave the publish loop, called from other threads"""
+        self.running = False
+
+    async def connect_topics(self, topics=None):
+        """Connect topics at the pace of the ConnectionRamp, then start publishing on those that connected"""
+        if topics is None:
+            topics = self.topics
+        else:
+            self.topics.extend(topics)
+        if self.connection_pool is not None:
+            clients, kind = self.connection_pool.unopened(topics), 'connection'
+        else:
+            clients, kind = topics, 'publisher'
+        if clients:
+            print(f'Connecting {len(clients)} {kind}s ...')
+            # the ramp blocks until every client connected, so it runs off the loop the CONNACKs arrive on
+            await self.loop.run_in_executor(None, self.connection_ramp.connect, clients, kind, self.driver)
+        # a client of its own that still could not connect after its retries was disconnected, paho does not reconnect it here
+        topics = [topic for topic in topics if topic.connection is not None or topic.loop]
+        start = time.monotonic()
+        # before any of them publishes, so none drops a block the others still have to take
+        for topic in topics:
+            topic.attach_blocks()
+        for topic in topics:
+            print(f'Starting publisher: {topic.topic_url} ...')
+            topic.loop = True
+            topic.schedule.start(start)
+            self.schedule_topic(topic, start)
+
+    def disconnect_topics(self):
+        for topic in self.topics:
+            if topic.loop:
+                topic.disconnect()
+
+    def schedule_topic(self, topic, deadline):
+        # the sequence number keeps the heap from ever comparing two Topic objects
+        heapq.heappush(self.schedule, (deadline, next(self.sequence), topic))
+
+    async def publish_loop(self):
+        burst = 0
+        while self.schedule and self.running:
+            deadline, _, topic = self.schedule[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                burst = 0
+                await asyncio.sleep(min(delay, self.MAX_SLEEP))
+                continue
+
+            if topic.window is not None and topic.window.full and topic.window.policy == 'block':
+                # blocking would stall the loop the acks arrive on, so the topic waits here instead
+                if deadline == topic.schedule.deadline:
+                    topic.window.blocked += 1
+                heapq.heapreplace(self.schedule, (time.monotonic() + self.BLOCKED_RETRY, next(self.sequence), topic))
+                continue
+
+            heapq.heappop(self.schedule)
+            if not topic.loop:
+                continue
+            if not topic.fire(time.monotonic()):
+                # all data within the topic became inactive
+                topic.disconnect()
+                continue
+            self.schedule_topic(topic, topic.schedule.deadline)
+
+            burst += 1
+            if burst >= self.BURST_SIZE:
+                burst = 0
+                await asyncio.sleep(0)
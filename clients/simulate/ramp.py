@@ -0,0 +1,221 @@
+import math
+import threading
+import time
+from receive_sinks import ReceiveSink
+from latency_histogram import LatencyHistogram
+from topic_trie import TopicTrie
+
+class RampWindow:
+    """Messages sent between start_ns and end_ns: their latencies and how many of them were received"""
+    def __init__(self, start_ns, precision=2):
+        self.start_ns = start_ns
+        self.end_ns = None
+        self.histogram = LatencyHistogram(precision)
+
+
+class RampSink(ReceiveSink):
+    """Records the latency of every received message into the measurement window it was sent in"""
+    def __init__(self, precision=2):
+        self.precision = precision
+        self.windows = []
+        self.lock = threading.Lock()
+
+    def open_window(self, start_ns):
+        window = RampWindow(start_ns, self.precision)
+        with self.lock:
+            self.windows.append(window)
+        return window
+
+    def close_window(self, window):
+        """Stop following a window once the stragglers it was waiting for are late enough to count as lost"""
+        with self.lock:
+            self.windows.remove(window)
+
+    def handle(self, record):
+        if record.latency_us is None:
+            return
+        with self.lock:
+            for window in self.windows:
+                if window.start_ns <= record.send_time_ns and (window.end_ns is None or record.send_time_ns < window.end_ns):
+                    window.histogram.record(record.latency_us)
+                    return
+
+
+class RampStep:
+    """One rate of the ramp, with what was measured once it is evaluated"""
+    def __init__(self, index, topics, multiplier, offered):
+        self.index = index
+        # the topics publishing during the step, at their configured interval divided by multiplier
+        self.topics = topics
+        self.multiplier = multiplier
+        self.offered = offered
+        self.sent = 0
+        self.expected = 0
+        self.received = 0
+        self.duration = 0.0
+        self.p50_ms = None
+        self.p99_ms = None
+        self.slo_met = None
+
+    @property
+    def loss_pct(self):
+        return (1 - self.received / self.expected) * 100 if self.expected else 0.0
+
+
+class RampController(threading.Thread):
+    """Raises the offered rate step by step, either by shortening the interval of every topic ('interval') or by starting
+    more of the configured topics ('topics'). Every step is held for a warm-up and a measurement window, and the ramp
+    stops at the first step whose p99 latency or loss breaks the SLO. The last step that met it is the knee"""
+    STRATEGIES = ('interval', 'topics')
+    HEADER = "step,topics,interval_multiplier,offered_per_sec,sent_per_sec,delivered_per_sec,loss_pct,p50_ms,p99_ms,slo_met\n"
+
+    def __init__(self, simulator, strategy='interval', step_factor=1.5, max_steps=10, start_topics=1, warmup=5.0,
+                 measure=10.0, slo_p99_ms=100.0, slo_loss_pct=0.1, precision=2):
+        threading.Thread.__init__(self, name='ramp', daemon=True)
+        if strategy not in self.STRATEGIES:
+            raise NameError(f"Ramp strategy '{strategy}' is unknown")
+        if step_factor <= 1:
+            raise ValueError(f"RAMP_STEP_FACTOR must be greater than 1, not {step_factor}")
+        self.simulator = simulator
+        self.strategy = strategy
+        self.warmup = warmup
+        self.measure = measure
+        self.slo_p99_ms = slo_p99_ms
+        self.slo_loss_pct = slo_loss_pct
+        self.sink = RampSink(precision)
+        self.intervals = {topic: topic.schedule.interval for topic in simulator.topics}
+        # a message on a topic is expected once by every subscriber whose filter matches it
+        trie = TopicTrie()
+        for subscriber in simulator.subscribers:
+            trie.add(subscriber.topic, subscriber)
+        self.fanout = {topic: len(trie.subscribers(topic.topic_url)) for topic in simulator.topics}
+        if not any(self.fanout.values()):
+            raise ValueError("The ramp measures latency with the simulator's own SUBSCRIBERS, none of them subscribes to the TOPICS")
+        self.steps = self.plan(step_factor, max_steps, start_topics)
+        self.started_topics = 0
+        self.stopping = threading.Event()
+
+    def plan(self, step_factor, max_steps, start_topics):
+        steps = []
+        topics = self.simulator.topics
+        for index in range(max_steps):
+            multiplier = step_factor ** index
+            if self.strategy == 'interval':
+                count = len(topics)
+            else:
+                count = min(len(topics), math.ceil(start_topics * multiplier))
+                if steps and count == len(steps[-1].topics):
+                    # every configured topic runs already, the rate can not grow any more
+                    break
+                multiplier = 1
+            running = topics[:count]
+            offered = sum(multiplier / self.intervals[topic] for topic in running)
+            steps.append(RampStep(index, running, multiplier, offered))
+        return steps
+
+    @property
+    def max_duration(self):
+        """Seconds the whole ramp takes if no step breaks the SLO"""
+        return len(self.steps) * (self.warmup + self.measure) + self.warmup + 1
+
+    def initial_topics(self):
+        """Topics the simulator starts with, the ramp starts the others"""
+        self.started_topics = len(self.steps[0].topics)
+        return self.steps[0].topics
+
+    def apply(self, step):
+        for topic in step.topics:
+            topic.schedule.interval = self.intervals[topic] / step.multiplier
+        if len(step.topics) > self.started_topics:
+            self.simulator.start_topics(step.topics[self.started_topics:])
+            self.started_topics = len(step.topics)
+
+    def sample(self, step):
+        """Messages sent so far on the topics of a step, and how many receives they should cause"""
+        sent = sum(topic.schedule.sends for topic in step.topics)
+        expected = sum(topic.schedule.sends * self.fanout[topic] for topic in step.topics)
+        return sent, expected
+
+    def run(self):
+        pending = None
+        for step in self.steps:
+            self.apply(step)
+            if self.stopping.wait(self.warmup):
+                return
+            # the warm-up of this step gave the messages of the previous window time to arrive
+            if pending is not None and not self.evaluate(*pending):
+                break
+            window = self.sink.open_window(time.time_ns())
+            started = time.monotonic()
+            sent, expected = self.sample(step)
+            if self.stopping.wait(self.measure):
+                return
+            window.end_ns = time.time_ns()
+            step.duration = time.monotonic() - started
+            end_sent, end_expected = self.sample(step)
+            step.sent = end_sent - sent
+            step.expected = end_expected - expected
+            pending = (step, window)
+        else:
+            if pending is not None and not self.stopping.wait(self.warmup):
+                self.evaluate(*pending)
+        self.simulator.request_stop()
+
+    def evaluate(self, step, window):
+        """Close the window of a step, print it and tell whether it met the SLO"""
+        self.sink.close_window(window)
+        histogram = window.histogram
+        step.received = histogram.count
+        if histogram.count:
+            step.p50_ms = histogram.percentile(50) / 1000
+            step.p99_ms = histogram.percentile(99) / 1000
+        step.slo_met = step.p99_ms is not None and step.p99_ms <= self.slo_p99_ms and step.loss_pct <= self.slo_loss_pct
+        print(f"Ramp step {step.index}: {len(step.topics)} topics, {step.offered:,.0f} msg/s offered, {step.sent / step.duration:,.0f} sent, "
+              f"{step.received / step.duration:,.0f} delivered/s, loss {step.loss_pct:.2f}%, p50 {format_ms(step.p50_ms)} ms, "
+              f"p99 {format_ms(step.p99_ms)} ms, SLO {'met' if step.slo_met else 'broken'}")
+        return step.slo_met
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+
+    def knee(self):
+        """Last step that met the SLO, None if the first one broke it already"""
+        knee = None
+        for step in self.steps:
+            if step.slo_met is None:
+                break
+            if not step.slo_met:
+                return knee
+            knee = step
+        return knee
+
+    def report(self, path):
+        """Print the rate/latency curve and the knee, and write the curve to path"""
+        evaluated = [step for step in self.steps if step.slo_met is not None]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.HEADER)
+            for step in evaluated:
+                f.write(f"{step.index},{len(step.topics)},{step.multiplier:g},{step.offered:.3f},{step.sent / step.duration:.3f},"
+                        f"{step.received / step.duration:.3f},{step.loss_pct:.3f},{step.p50_ms if step.p50_ms is not None else ''},"
+                        f"{step.p99_ms if step.p99_ms is not None else ''},{step.slo_met}\n")
+        print()
+        print(f'{"Step":>5} {"Topics":>7} {"Offered/s":>10} {"Sent/s":>10} {"Delivered/s":>12} {"Loss %":>7} {"p50 ms":>9} {"p99 ms":>9}  SLO')
+        for step in evaluated:
+            print(f'{step.index:>5} {len(step.topics):>7} {step.offered:>10,.0f} {step.sent / step.duration:>10,.0f} '
+                  f'{step.received / step.duration:>12,.0f} {step.loss_pct:>7.2f} {format_ms(step.p50_ms):>9} {format_ms(step.p99_ms):>9}  '
+                  f'{"met" if step.slo_met else "broken"}')
+        knee = self.knee()
+        slo = f"p99 <= {self.slo_p99_ms:g} ms and loss <= {self.slo_loss_pct:g}%"
+        if knee is None:
+            print(f"No step met the SLO ({slo})")
+        elif knee is evaluated[-1]:
+            print(f"Knee not reached: the highest step measured, {knee.offered:,.0f} msg/s, still met the SLO ({slo})")
+        else:
+            print(f"Knee: {knee.offered:,.0f} msg/s offered, p99 {format_ms(knee.p99_ms)} ms, loss {knee.loss_pct:.2f}% ({slo})")
+        print(f"Ramp curve written to {path}")
+
+
+def format_ms(value):
+    return f"{value:.2f}" if value is not None else "-"
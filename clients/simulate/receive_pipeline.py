@@ -0,0 +1,135 @@
+import datetime
+import queue
+import threading
+import time
+from typing import NamedTuple, Any
+from payload_formats import decode_payload
+
+class ReceivedMessage(NamedTuple):
+    """Everything known about one received message, built once and shared by every sink"""
+    subscriber: Any
+    topic: str
+    payload: bytes
+    receive_time_ns: int
+    receive_timestamp: str
+    data: dict
+    metadata_prefix: str
+    message_id: str
+    send_time_ns: int
+    # corrected by the clock offset to the publishing instance when it is known
+    latency_us: float
+    # bound of the clock offset error, 0 on the same instance, None when the offset is unknown
+    clock_error_us: float
+
+
+def build_record(subscriber, topic, payload, receive_time_ns, clock_sync=None):
+    data = None
+    metadata_prefix = None
+    message_id = None
+    send_time_ns = None
+    latency_us = None
+    clock_error_us = 0
+    try:
+        # Decode JSON, MessagePack, CBOR or struct payloads
+        data = decode_payload(payload)
+
+        # Look for timestamp field (with or without prefix)
+        for prefix in ['_', '']:
+            ts_field = f"{prefix}timestamp"
+            if isinstance(data, dict) and ts_field in data:
+                send_time_ns = data.get(f"{prefix}timestamp_ns")
+                if send_time_ns is None:
+                    # payloads of older publishers only have the millisecond timestamp
+                    timestamp_ms = data[ts_field]
+                    if not isinstance(timestamp_ms, (int, float)):
+                        raise TypeError(f"{ts_field} is not a number")
+                    send_time_ns = timestamp_ms * 1_000_000
+                latency_ns = receive_time_ns - send_time_ns
+                if clock_sync is not None:
+                    offset_ns, error_ns = clock_sync.correction(data.get(f"{prefix}instance"))
+                    latency_ns += offset_ns
+                    clock_error_us = error_ns / 1000 if error_ns is not None else None
+                latency_us = latency_ns / 1000
+                metadata_prefix = prefix
+                message_id = data.get(f"{prefix}message_id", "N/A")
+                break
+    except (ValueError, TypeError):
+        # undecodable payloads, and timestamps that are not numbers such as null, have no latency
+        send_time_ns = latency_us = None
+        clock_error_us = 0
+
+    # Timestamp with millisecond precision, as in the subscriber logs
+    receive_timestamp = datetime.datetime.fromtimestamp(receive_time_ns / 1_000_000_000).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    return ReceivedMessage(subscriber, topic, payload, receive_time_ns, receive_timestamp, data, metadata_prefix, message_id, send_time_ns, latency_us, clock_error_us)
+
+
+class ReceivePipeline(threading.Thread):
+    """Takes received messages off the paho network threads, decodes each one once and hands the record to the registered sinks"""
+    # seconds between the ticks of the sinks
+    TICK_INTERVAL = 0.5
+
+    def __init__(self, queue_size=100000, clock_sync=None):
+        threading.Thread.__init__(self, name='receive-pipeline', daemon=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.clock_sync = clock_sync
+        self.sinks = []
+        self.processed = 0
+        self.dropped = 0
+        self.stopping = False
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def submit(self, subscriber, topic, payload, receive_time_ns):
+        """Called on the network thread, so it only queues the message"""
+        try:
+            self.queue.put_nowait((subscriber, topic, payload, receive_time_ns))
+        except queue.Full:
+            self.dropped += 1
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def run(self):
+        next_tick = time.monotonic() + self.TICK_INTERVAL
+        while not (self.stopping and self.queue.empty()):
+            try:
+                item = self.queue.get(timeout=self.TICK_INTERVAL)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                self.processed += 1
+                try:
+                    record = build_record(*item, self.clock_sync)
+                except Exception as e:
+                    # one message the sinks never see, rather than a dead pipeline thread
+                    print(f"Error decoding message on topic '{item[1]}': {str(e)}")
+                else:
+                    for sink in self.sinks:
+                        try:
+                            sink.handle(record)
+                        except Exception as e:
+                            print(f"Error in {type(sink).__name__}: {str(e)}")
+            now = time.monotonic()
+            if now >= next_tick:
+                next_tick = now + self.TICK_INTERVAL
+                self.tick()
+
+    def tick(self):
+        for sink in self.sinks:
+            try:
+                sink.tick()
+            except Exception as e:
+                print(f"Error in {type(sink).__name__}: {str(e)}")
+
+    def close(self):
+        self.stopping = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.is_alive():
+            self.join()
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from log_writer import get_log_writer
+from latency_records import RECORD, TopicDictionary, message_key, records_file, topics_file
+from latency_histogram import LatencyHistogram
+
+def format_clock_error(record):
+    if record.clock_error_us is None:
+        return " (clock offset unknown)"
+    if record.clock_error_us:
+        return f" (+/- {record.clock_error_us:.1f}us)"
+    return ""
+
+
+class ReceiveSink(ABC):
+    """Consumer of the ReceivedMessage records of a ReceivePipeline"""
+    @abstractmethod
+    def handle(self, record):
+        pass
+
+    def tick(self):
+        """Called by the pipeline about every TICK_INTERVAL seconds, also while no message arrives"""
+        pass
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(ReceiveSink):
+    """Prints every received message and its latency"""
+    def handle(self, record):
+        print(f"[{record.receive_timestamp}] Client {record.subscriber.client_id} received message on topic '{record.topic}': {len(record.payload)} bytes")
+        if record.latency_us is not None:
+            print(f"Message latency: {record.latency_us:.1f}us{format_clock_error(record)}, Message ID: {record.message_id}")
+
+
+class TextLogSink(ReceiveSink):
+    """Appends the pretty-printed message to the subscriber's .log file"""
+    def __init__(self):
+        self.log_writer = get_log_writer()
+
+    def handle(self, record):
+        latency_info = ""
+        if record.data is not None:
+            payload_json = record.data
+            if record.latency_us is not None:
+                # Add receive time and latency to the JSON for logging
+                payload_json = dict(record.data)
+                payload_json[f"{record.metadata_prefix}receive_timestamp_ns"] = record.receive_time_ns
+                payload_json[f"{record.metadata_prefix}latency_us"] = round(record.latency_us, 1)
+                latency_info = f" | Latency: {record.latency_us:.1f}us{format_clock_error(record)} | Message ID: {record.message_id}"
+            payload_formatted = json.dumps(payload_json, indent=2, default=str)
+        else:
+            try:
+                payload_str = record.payload.decode('utf-8')
+                payload_formatted = payload_str if len(payload_str) < 100 else f"{payload_str[:97]}..."
+            except UnicodeDecodeError:
+                # If not text, just log the size
+                payload_formatted = f"<binary data: {len(record.payload)} bytes>"
+        self.log_writer.write(record.subscriber.log_file, f"[{record.receive_timestamp}] Received on '{record.topic}'{latency_info}\n{payload_formatted}\n{'-'*40}")
+
+
+class LatencyCsvSink(ReceiveSink):
+    """Appends one row per message with a timestamp to the subscriber's .latency.csv file"""
+    def __init__(self):
+        self.log_writer = get_log_writer()
+
+    def handle(self, record):
+        if record.latency_us is None:
+            return
+        clock_error = f"{record.clock_error_us:.1f}" if record.clock_error_us is not None else ""
+        self.log_writer.write(record.subscriber.latency_log_file, f"{record.receive_timestamp},{record.topic},{record.message_id},{record.send_time_ns},{record.receive_time_ns},{record.latency_us:.1f},{clock_error}")
+
+
+class LatencyBinarySink(ReceiveSink):
+    """Appends fixed-width latency records to the subscriber's .latency.bin file, handed to the log writer in batches"""
+    BATCH_RECORDS = 256
+    BATCH_AGE = 1.0
+
+    def __init__(self):
+        self.log_writer = get_log_writer()
+        # records file -> [topic dictionary, pending records, time of the first pending record]
+        self.files = {}
+
+    def handle(self, record):
+        if record.latency_us is None:
+            return
+        path = records_file(record.subscriber.latency_log_file)
+        entry = self.files.get(path)
+        if entry is None:
+            self.log_writer.set_binary(path)
+            entry = self.files[path] = [TopicDictionary(topics_file(path)), bytearray(), 0.0]
+        topics, pending, _ = entry
+        if not pending:
+            entry[2] = time.monotonic()
+        # the send time is stored on the subscriber's clock, so receive_ns - send_ns is the corrected latency
+        send_ns = record.receive_time_ns - int(record.latency_us * 1000)
+        pending += RECORD.pack(topics.id(record.topic), *message_key(str(record.message_id)), send_ns, record.receive_time_ns, len(record.payload))
+        if len(pending) >= self.BATCH_RECORDS * RECORD.size or time.monotonic() - entry[2] >= self.BATCH_AGE:
+            self.hand_off(path, entry)
+
+    def hand_off(self, path, entry):
+        self.log_writer.write(path, bytes(entry[1]))
+        entry[1] = bytearray()
+
+    def tick(self):
+        # the batches of quiet subscribers are handed off by age as well, not only when their next message arrives
+        now = time.monotonic()
+        for path, entry in self.files.items():
+            if entry[1] and now - entry[2] >= self.BATCH_AGE:
+                self.hand_off(path, entry)
+
+    def close(self):
+        for path, entry in self.files.items():
+            if entry[1]:
+                self.hand_off(path, entry)
+
+
+class HistogramSink(ReceiveSink):
+    """Latency histogram per subscriber and topic, snapshotted to a JSON file every snapshot_interval seconds"""
+    def __init__(self, precision=2, snapshot_path=None, snapshot_interval=60):
+        self.precision = precision
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        # client id -> topic -> LatencyHistogram
+        self.histograms = {}
+        self.last_snapshot = time.monotonic()
+        # the metrics endpoint reads the histograms while messages are being recorded
+        self.lock = threading.Lock()
+
+    def handle(self, record):
+        if record.latency_us is None:
+            return
+        with self.lock:
+            topics = self.histograms.get(record.subscriber.client_id)
+            if topics is None:
+                topics = self.histograms[record.subscriber.client_id] = {}
+            histogram = topics.get(record.topic)
+            if histogram is None:
+                histogram = topics[record.topic] = LatencyHistogram(self.precision)
+            histogram.record(record.latency_us)
+        if self.snapshot_path and time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def tick(self):
+        if self.snapshot_path and time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def by_topic(self):
+        """Histograms of all subscribers merged per topic"""
+        merged = {}
+        with self.lock:
+            for topics in self.histograms.values():
+                for topic, histogram in topics.items():
+                    if topic not in merged:
+                        merged[topic] = LatencyHistogram(self.precision)
+                    merged[topic].merge(histogram)
+        return merged
+
+    def snapshot(self):
+        self.last_snapshot = time.monotonic()
+        with self.lock:
+            snapshot = {
+                'time': time.time(),
+                'unit': 'us',
+                'histograms': {client_id: {topic: histogram.to_dict() for topic, histogram in topics.items()} for client_id, topics in self.histograms.items()}
+            }
+        # written aside first so a reader never sees a partial file
+        with open(f"{self.snapshot_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(f"{self.snapshot_path}.tmp", self.snapshot_path)
+
+    def close(self):
+        if self.snapshot_path:
+            self.snapshot()
+
+
+# names usable in the RECEIVE_SINKS setting
+SINKS = {
+    'console': ConsoleSink,
+    'text_log': TextLogSink,
+    'latency_csv': LatencyCsvSink,
+    'latency_binary': LatencyBinarySink,
+    'histogram': HistogramSink
+}
+
+def create_sink(name, options=None):
+    """Sink of the given name, created with the keyword arguments in options[name] if any"""
+    if name not in SINKS:
+        raise NameError(f"Receive sink '{name}' is unknown")
+    return SINKS[name](**(options or {}).get(name, {}))
@@ -0,0 +1,104 @@
+import threading
+import time
+from latency_histogram import LatencyHistogram
+
+class SendLedger:
+    """One row per message published on a paho client: message id, mid, publish() time, socket time and ack time in ns.
+    Rows are written through the log writer once the message is acknowledged, or when the ledger is closed"""
+    HEADER = "message_id,topic,mid,qos,payload_bytes,publish_time_ns,socket_time_ns,ack_time_ns\n"
+
+    def __init__(self, log_writer, path):
+        self.log_writer = log_writer
+        self.path = path
+        # mid -> [message id, topic, qos, payload bytes, publish ns, socket ns]
+        self.pending = {}
+        # mids still waiting in paho's out queue
+        self.unsent = []
+        self.last_drain_ns = 0
+        self.early_acks = {}
+        self.lock = threading.Lock()
+        self.queueing = LatencyHistogram()
+        self.broker_ack = LatencyHistogram()
+
+    def watch(self, client):
+        """Learn when the client's out queue drained, keeping any socket callback already set (e.g. by AsyncioClientDriver)"""
+        previous = client.on_socket_unregister_write
+
+        def on_socket_unregister_write(client, userdata, sock):
+            self.on_socket_drained()
+            if previous is not None:
+                previous(client, userdata, sock)
+        client.on_socket_unregister_write = on_socket_unregister_write
+
+    def published(self, topic, message_id, mid, qos, payload_bytes, publish_ns, handoff_ns):
+        """publish_ns: when Topic.publish was called, handoff_ns: when the message was handed to paho after waiting in the window"""
+        with self.lock:
+            acked = self.early_acks.pop(mid, None)
+            entry = [message_id, topic, qos, payload_bytes, publish_ns, None]
+            # a drain before the handoff was of earlier messages, even if it came after publish_ns
+            if self.last_drain_ns >= handoff_ns:
+                # the network thread wrote the message out before publish() returned its mid
+                entry[5] = self.last_drain_ns
+            if acked is None:
+                self.pending[mid] = entry
+                if entry[5] is None:
+                    self.unsent.append(mid)
+                return
+        self.write(mid, entry, acked)
+
+    def on_socket_drained(self):
+        # everything queued so far has been handed to the socket
+        now = time.time_ns()
+        with self.lock:
+            self.last_drain_ns = now
+            for mid in self.unsent:
+                entry = self.pending.get(mid)
+                if entry is not None and entry[5] is None:
+                    entry[5] = now
+            self.unsent = []
+
+    def acknowledged(self, mid):
+        """paho's on_publish: written to the socket for QoS 0, PUBACK for QoS 1, PUBCOMP for QoS 2"""
+        now = time.time_ns()
+        with self.lock:
+            entry = self.pending.pop(mid, None)
+            if entry is None:
+                self.early_acks[mid] = now
+                return
+        self.write(mid, entry, now)
+
+    def write(self, mid, entry, ack_ns):
+        message_id, topic, qos, payload_bytes, publish_ns, socket_ns = entry
+        if ack_ns is not None:
+            # QoS 0 messages are reported when written, the drain callback may not have run yet
+            if socket_ns is None or socket_ns > ack_ns:
+                socket_ns = ack_ns
+            with self.lock:
+                self.queueing.record((socket_ns - publish_ns) / 1000)
+                if qos > 0:
+                    self.broker_ack.record((ack_ns - socket_ns) / 1000)
+        self.log_writer.write(self.path, f"{message_id},{topic},{mid},{qos},{payload_bytes},{publish_ns},{'' if socket_ns is None else socket_ns},{'' if ack_ns is None else ack_ns}")
+
+    def close(self):
+        """Write the messages that were never acknowledged"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for mid, entry in pending.items():
+            self.write(mid, entry, None)
+        return len(pending)
+
+
+def print_ledger_summary(ledgers):
+    queueing = LatencyHistogram()
+    broker_ack = LatencyHistogram()
+    unacknowledged = 0
+    for ledger in ledgers:
+        unacknowledged += ledger.close()
+        queueing.merge(ledger.queueing)
+        broker_ack.merge(ledger.broker_ack)
+    if not queueing.count:
+        return
+    print(f"Send ledger: {queueing.count} messages acknowledged, {unacknowledged} not acknowledged")
+    print(f"  client queueing (publish() to socket): p50 {queueing.percentile(50):.1f}us p99 {queueing.percentile(99):.1f}us max {queueing.max}us")
+    if broker_ack.count:
+        print(f"  broker ack (socket to PUBACK/PUBCOMP): p50 {broker_ack.percentile(50):.1f}us p99 {broker_ack.percentile(99):.1f}us max {broker_ack.max}us")
@@ -1,18 +1,36 @@
-import json
+import asyncio
 import time
 import os
-import uuid
-import datetime
+import socket
+import threading
+import zlib
 from pathlib import Path
 import paho.mqtt.client as mqtt
 from topic import Topic
+from payload_encoder import PayloadEncoder
+from config_compiler import load_config
 from data_classes import BrokerSettings, ClientSettings
 from data_classes.broker_settings import BrokerSettings
 from data_classes.client_settings import ClientSettings
 from SubscriberClient import SubscriberClient
+from publisher_engine import AsyncPublisherEngine
+from connection_pool import ConnectionPool
+from topic_data import create_block_generator
+from receive_pipeline import ReceivePipeline
+from receive_sinks import create_sink, HistogramSink
+from latency_histogram import print_percentiles
+from clock_sync import ClockSync
+from metrics import MetricsServer
+from send_ledger import SendLedger, print_ledger_summary
+from publish_window import PublishWindow, WindowSampler
+from ramp import RampController
+from subscriber_pool import SubscriberPool
+from connection_ramp import ConnectionRamp
+from topic_trie import expected_deliveries, match_subscribers, print_deliveries
+from log_writer import configure_log_writer, get_log_writer, close_log_writer
 
 class Simulator:
-    def __init__(self, settings_file, output_dir=None):
+    def __init__(self, settings_file, output_dir=None, engine='thread', shard=None, metrics_port=None, ramp=False):
         self.default_client_settings = ClientSettings(
             clean=True,
             retain=False,
@@ -20,6 +38,18 @@ class Simulator:
             time_interval=10
         )
         self.settings_file = settings_file
+        self.engine = engine
+        # (index, count) when this simulator only runs its share of the configuration in a worker process
+        self.shard = shard
+        # overrides METRICS_PORT of the settings file when given
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        self.started = None
+        # ramp mode raises the offered rate step by step until the latency SLO breaks
+        self.ramp_mode = ramp
+        self.ramp = None
+        self.publisher_engine = None
+        self.stop_requested = threading.Event()
         
         # Set up log directory - default to /logs for Docker, ~/Downloads/mqtt-logs for local
         if output_dir is None:
@@ -38,92 +68,255 @@ class Simulator:
         os.makedirs(self.output_dir, exist_ok=True)
         
         self.broker_settings = None
+        self.connection_pool = None
+        self.receive_pipeline = None
+        self.clock_sync = None
+        # one SendLedger per publishing paho client
+        self.ledgers = []
+        # one PublishWindow per publishing paho client
+        self.windows = []
+        self.window_sampler = None
         self.topics = []
         self.subscribers = []
+        self.subscriber_pool = None
+        self.connection_ramp = None
+        # {topic URL: subscribers matching it}, None in a worker process that only knows the topics of its shard
+        self.topic_subscribers = None
         self.load_configuration()
 
     def load_configuration(self):
-        with open(self.settings_file) as json_file:
-            config = json.load(json_file)
-            self.broker_settings = BrokerSettings(
-                url=config.get('BROKER_URL', 'localhost'),
-                port=config.get('BROKER_PORT', 1883),
-                protocol=config.get('PROTOCOL_VERSION', 4)  # mqtt.MQTTv311
+        # validated once, and read from the cache next to the settings file as long as the file does not change
+        self.compiled_config = load_config(self.settings_file)
+        config = self.compiled_config.config
+        self.broker_settings = BrokerSettings(
+            url=config.get('BROKER_URL', 'localhost'),
+            port=config.get('BROKER_PORT', 1883),
+            protocol=config.get('PROTOCOL_VERSION', 4)  # mqtt.MQTTv311
+        )
+        broker_client_settings = self.read_client_settings(config, default=self.default_client_settings)
+        
+        # Extract common message metadata configuration
+        self.include_message_id = config.get('INCLUDE_MESSAGE_ID', True)
+        self.include_timestamp = config.get('INCLUDE_TIMESTAMP', True)
+        self.metadata_field_prefix = config.get('METADATA_FIELD_PREFIX', '_')
+        self.message_id_mode = config.get('MESSAGE_ID_MODE', 'uuid4')
+        self.payload_serializer = config.get('PAYLOAD_SERIALIZER', 'auto')
+        self.payload_format = config.get('PAYLOAD_FORMAT', 'json')
+        
+        # Instances running on other hosts estimate their clock offsets to correct the latency
+        self.instance_id = config.get('INSTANCE_ID', socket.gethostname())
+        clock_sync_interval = config.get('CLOCK_SYNC_INTERVAL', 0)
+        if clock_sync_interval > 0:
+            self.clock_sync = ClockSync(
+                self.broker_settings,
+                self.instance_id,
+                topic=config.get('CLOCK_SYNC_TOPIC', 'testbed/clock-sync'),
+                interval=clock_sync_interval
             )
-            broker_client_settings = self.read_client_settings(config, default=self.default_client_settings)
-            
-            # Extract common message metadata configuration
-            self.include_message_id = config.get('INCLUDE_MESSAGE_ID', True)
-            self.include_timestamp = config.get('INCLUDE_TIMESTAMP', True)
-            self.metadata_field_prefix = config.get('METADATA_FIELD_PREFIX', '_')
-            
-            # Load publisher topics
-            if 'TOPICS' in config:
-                self.topics = self.load_topics(config['TOPICS'], broker_client_settings)
-            
-            # Load subscriber configurations
-            if 'SUBSCRIBERS' in config:
-                self.subscribers = self.load_subscribers(config['SUBSCRIBERS'])
+        
+        # Buffered log writer shared by all subscribers of the process
+        configure_log_writer(
+            queue_size=config.get('LOG_QUEUE_SIZE', 100000),
+            flush_bytes=config.get('LOG_FLUSH_BYTES', 64 * 1024),
+            flush_interval=config.get('LOG_FLUSH_INTERVAL', 1.0),
+            rotate_bytes=config.get('LOG_ROTATE_BYTES', 0)
+        )
+        
+        # Live Prometheus metrics, every worker process serves its own on the next port
+        metrics_port = self.metrics_port if self.metrics_port is not None else config.get('METRICS_PORT', 0)
+        if metrics_port > 0:
+            if self.shard is not None:
+                metrics_port += self.shard[0]
+            self.metrics_server = MetricsServer(self, metrics_port, host=config.get('METRICS_HOST', '127.0.0.1'))
+        
+        # Every received message is decoded once and handed to these sinks
+        self.receive_pipeline = ReceivePipeline(queue_size=config.get('RECEIVE_QUEUE_SIZE', 100000), clock_sync=self.clock_sync)
+        histogram_file = "latency_histograms.json" if self.shard is None else f"latency_histograms-worker{self.shard[0]}.json"
+        sink_options = {
+            'histogram': {
+                'precision': config.get('HISTOGRAM_PRECISION', 2),
+                'snapshot_path': os.path.join(self.output_dir, histogram_file),
+                'snapshot_interval': config.get('HISTOGRAM_SNAPSHOT_INTERVAL', 60)
+            }
+        }
+        for sink_name in config.get('RECEIVE_SINKS', ['console', 'text_log', 'latency_csv', 'histogram']):
+            self.receive_pipeline.add_sink(create_sink(sink_name, sink_options))
+        
+        # 'vectorized' precomputes values with numpy for every topic expanded from the same entry at once
+        self.generation_mode = config.get('GENERATION_MODE', 'scalar')
+        self.generation_block_size = config.get('GENERATION_BLOCK_SIZE', 1024)
+        
+        # Subscribers and publishers with connections of their own connect at a controlled pace instead of all at once
+        self.connection_ramp = ConnectionRamp(
+            rate=config.get('CONNECT_RATE', 0),
+            concurrency=config.get('CONNECT_CONCURRENCY', 64),
+            jitter=config.get('CONNECT_JITTER', 0),
+            retries=config.get('CONNECT_RETRIES', 0),
+            timeout=config.get('CONNECT_TIMEOUT', 30)
+        )
+        
+        # Share a fixed number of connections between all publishers, 0 keeps one connection per topic
+        connections_per_process = config.get('CONNECTIONS_PER_PROCESS', 0)
+        if connections_per_process > 0:
+            self.connection_pool = ConnectionPool(
+                self.broker_settings,
+                connections_per_process,
+                assignment=config.get('CONNECTION_ASSIGNMENT', 'round_robin'),
+                clean=broker_client_settings.clean
+            )
+        
+        # Load publisher topics
+        if 'TOPICS' in config:
+            self.topics = self.load_topics(self.compiled_config.topics, broker_client_settings)
+            if self.connection_pool is not None:
+                for topic in self.topics:
+                    self.connection_pool.assign(topic)
+            # Inflight window and client queue of every publishing client, enforced by the simulator instead of paho
+            self.open_windows(
+                config.get('MAX_INFLIGHT_MESSAGES', 20),
+                config.get('MAX_QUEUED_MESSAGES', 0),
+                config.get('QUEUE_FULL_POLICY', 'block'),
+                config.get('QUEUE_SAMPLE_INTERVAL', 1.0)
+            )
+            if config.get('PUBLISH_LOG', True):
+                self.open_send_log()
+        
+        # Load subscriber configurations
+        if 'SUBSCRIBERS' in config:
+            self.subscribers = self.load_subscribers(config['SUBSCRIBERS'])
+            # All subscribers share one event loop instead of a network thread each
+            if self.subscribers and config.get('SUBSCRIBER_POOL', False):
+                self.subscriber_pool = SubscriberPool(self.subscribers)
+        
+        # Topics and subscribers are fixed from here on, so their filters are matched once
+        if self.shard is None:
+            self.topic_subscribers = match_subscribers([topic.topic_url for topic in self.topics], self.subscriptions())
+        
+        if self.ramp_mode:
+            self.ramp = RampController(
+                self,
+                strategy=config.get('RAMP_STRATEGY', 'interval'),
+                step_factor=config.get('RAMP_STEP_FACTOR', 1.5),
+                max_steps=config.get('RAMP_MAX_STEPS', 10),
+                start_topics=config.get('RAMP_START_TOPICS', 1),
+                warmup=config.get('RAMP_WARMUP', 5),
+                measure=config.get('RAMP_MEASURE', 10),
+                slo_p99_ms=config.get('RAMP_SLO_P99_MS', 100),
+                slo_loss_pct=config.get('RAMP_SLO_LOSS_PCT', 0.1),
+                precision=config.get('HISTOGRAM_PRECISION', 2)
+            )
+            self.receive_pipeline.add_sink(self.ramp.sink)
+
+    def open_windows(self, max_inflight, max_queued, policy, sample_interval):
+        """One PublishWindow per publishing paho client, with their inflight and queued counts sampled to publish_queue.csv"""
+        if not self.topics:
+            return
+        if self.connection_pool is not None:
+            for connection in self.connection_pool.connections:
+                connection.window = PublishWindow(connection.client_id, max_inflight, max_queued, policy)
+                self.windows.append(connection.window)
+        for topic in self.topics:
+            if topic.connection is not None:
+                topic.window = topic.connection.window
+            else:
+                topic.window = PublishWindow(topic.topic_url, max_inflight, max_queued, policy)
+                self.windows.append(topic.window)
+        if sample_interval > 0:
+            file_name = "publish_queue.csv" if self.shard is None else f"publish_queue-worker{self.shard[0]}.csv"
+            path = os.path.join(self.output_dir, file_name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(WindowSampler.HEADER)
+            log_writer = get_log_writer()
+            log_writer.set_header(path, WindowSampler.HEADER)
+            self.window_sampler = WindowSampler(self.windows, log_writer, path, sample_interval)
+
+    def open_send_log(self):
+        """One send ledger row per published message, joined with the subscriber latency files by collector.py"""
+        if not self.topics:
+            return
+        file_name = "publisher-sends.csv" if self.shard is None else f"publisher-sends-worker{self.shard[0]}.csv"
+        send_log = os.path.join(self.output_dir, file_name)
+        with open(send_log, "w", encoding="utf-8") as f:
+            f.write(SendLedger.HEADER)
+        log_writer = get_log_writer()
+        log_writer.set_header(send_log, SendLedger.HEADER)
+        # mids are only unique per paho client, so there is one ledger per client
+        if self.connection_pool is not None:
+            for connection in self.connection_pool.connections:
+                connection.ledger = SendLedger(log_writer, send_log)
+                self.ledgers.append(connection.ledger)
+        for topic in self.topics:
+            if topic.connection is not None:
+                topic.ledger = topic.connection.ledger
+            else:
+                topic.ledger = SendLedger(log_writer, send_log)
+                self.ledgers.append(topic.ledger)
+
+    def in_shard(self, key):
+        """Stable assignment of a topic or subscriber to one of the worker processes"""
+        if self.shard is None:
+            return True
+        index, count = self.shard
+        return zlib.crc32(key.encode('utf-8')) % count == index
 
     def read_client_settings(self, settings_dict: dict, default: ClientSettings):
         return ClientSettings(
             clean=settings_dict.get('CLEAN_SESSION', default.clean),
             retain=settings_dict.get('RETAIN', default.retain),
             qos=settings_dict.get('QOS', default.qos),
-            time_interval=settings_dict.get('TIME_INTERVAL', default.time_interval)
+            time_interval=settings_dict.get('TIME_INTERVAL', default.time_interval),
+            missed_tick_policy=settings_dict.get('MISSED_TICK_POLICY', default.missed_tick_policy)
         )
 
-    def load_topics(self, topics_config, broker_client_settings):
+    def load_topics(self, topic_entries, broker_client_settings):
         topics = []
-        for topic in topics_config:
-            topic_data = topic['DATA']
-            topic_payload_root = topic.get('PAYLOAD_ROOT', {})
+        for entry in topic_entries:
+            topic = entry.settings
             
             # Add message metadata configuration to payload root
             metadata_config = {
                 'include_message_id': self.include_message_id,
                 'include_timestamp': self.include_timestamp,
-                'metadata_field_prefix': self.metadata_field_prefix
+                'metadata_field_prefix': self.metadata_field_prefix,
+                'message_id_mode': self.message_id_mode,
+                'serializer': self.payload_serializer,
+                'payload_format': topic.get('PAYLOAD_FORMAT', self.payload_format),
+                'instance_id': self.instance_id if self.clock_sync is not None else None
             }
             
             topic_client_settings = self.read_client_settings(topic, default=broker_client_settings)
-            if topic['TYPE'] == 'single':
-                # create single topic with format: /{PREFIX}
-                topic_url = topic['PREFIX']
-                topics.append(Topic(
-                    self.broker_settings, 
-                    topic_url, 
-                    topic_data, 
-                    topic_payload_root, 
-                    topic_client_settings,
-                    metadata_config
-                ))
-            elif topic['TYPE'] == 'multiple':
-                # create multiple topics with format: /{PREFIX}/{id}
-                for id in range(topic['RANGE_START'], topic['RANGE_END']+1):
-                    topic_url = topic['PREFIX'] + '/' + str(id)
-                    topics.append(Topic(
-                        self.broker_settings, 
-                        topic_url, 
-                        topic_data, 
-                        topic_payload_root, 
-                        topic_client_settings,
-                        metadata_config
-                    ))
-            elif topic['TYPE'] == 'list':
-                # create multiple topics with format: /{PREFIX}/{item}
-                for item in topic['LIST']:
-                    topic_url = topic['PREFIX'] + '/' + str(item)
-                    topics.append(Topic(
-                        self.broker_settings, 
-                        topic_url, 
-                        topic_data, 
-                        topic_payload_root, 
-                        topic_client_settings,
-                        metadata_config
-                    ))
+            # the DATA specs and the payload template are compiled once and shared by all topics of the entry.
+            # Built for the entries of other shards too, it registers their struct schema for the subscribers of this process
+            encoder = PayloadEncoder(entry.payload_root, [spec.data for spec in entry.data_specs], metadata_config)
+            topic_urls = [topic_url for topic_url in entry.urls if self.in_shard(topic_url)]
+            if not topic_urls:
+                continue
+            entry_topics = [Topic(
+                self.broker_settings,
+                topic_url,
+                entry.data_specs,
+                entry.payload_root,
+                topic_client_settings,
+                metadata_config,
+                encoder
+            ) for topic_url in topic_urls]
+            if self.generation_mode == 'vectorized':
+                self.attach_block_generators(entry_topics, entry.data_specs)
+            topics.extend(entry_topics)
         return topics
 
+    def attach_block_generators(self, entry_topics, data_specs):
+        """Share one block generator per DATA spec between all topics created from one TOPICS entry"""
+        if not entry_topics:
+            return
+        for index, spec in enumerate(data_specs):
+            generator = create_block_generator(spec.data, len(entry_topics), self.generation_block_size)
+            if generator is None:
+                # math_expression and raw_values keep generating value by value
+                continue
+            for entry_topic, cursor in zip(entry_topics, generator.cursors):
+                entry_topic.topic_data[index].block = cursor
+
     def load_subscribers(self, subscribers_config):
         subscribers = []
         for sub_config in subscribers_config:
@@ -139,13 +332,15 @@ class Simulator:
             
             for i in range(num_subscribers):
                 client_id = f"subscriber-{safe_topic}-{i}"
+                if not self.in_shard(client_id):
+                    continue
                 log_file = os.path.join(self.output_dir, f"{client_id}.log")
                 
                 subscriber = SubscriberClient(
                     broker_settings=self.broker_settings,
                     client_id=client_id,
                     topic=topic_pattern,
-                    data_callback=self.on_message_received,
+                    pipeline=self.receive_pipeline,
                     log_file=log_file,
                     description=description,
                     user=users[i],
@@ -156,77 +351,214 @@ class Simulator:
         
         return subscribers
 
-    def on_message_received(self, client, topic, payload, timestamp):
-        """Callback for when a subscriber receives a message"""
-        client_id = client._client_id.decode('utf-8')
-        print(f"[{timestamp}] Client {client_id} received message on topic '{topic}': {len(payload)} bytes")
-        
-        # Calculate latency if the message contains a timestamp
-        try:
-            payload_json = json.loads(payload)
-            
-            # Look for timestamp field (with or without prefix)
-            prefixes = ['_', '']  # Try with prefix first, then without
-            for prefix in prefixes:
-                ts_field = f"{prefix}timestamp"
-                if ts_field in payload_json:
-                    send_time = payload_json[ts_field]
-                    
-                    # Parse the timestamp and calculate latency
-                    current_time = datetime.datetime.now().timestamp() * 1000
-                    latency_ms = current_time - send_time
-                    
-                    # Add latency information to the message
-                    payload_json[f"{prefix}latency_ms"] = round(latency_ms, 2)
-                    
-                    # Log the latency information
-                    message_id = payload_json.get(f'{prefix}message_id', 'N/A')
-                    latency_info = f"Message latency: {latency_ms:.2f}ms, Message ID: {message_id}"
-                    print(latency_info)
-                    
-                    # Add a log entry to the subscriber's log file
-                    try:
-                        log_file = os.path.join(self.output_dir, f"{client_id}.latency.log")
-                        with open(log_file, "a", encoding="utf-8") as f:
-                            # Format: timestamp, topic, message_id, send_time, receive_time, latency_ms
-                            log_entry = f"{timestamp},{topic},{message_id},{send_time},{current_time},{latency_ms:.2f}\n"
-                            f.write(log_entry)
-                    except Exception as e:
-                        print(f"Error writing to latency log: {str(e)}")
-                    
-                    break
-        except Exception as e:
-            # Failed to parse JSON or calculate latency
-            print(f"Error calculating latency: {str(e)}")
-
-    def run(self):
+    def run(self, duration=None, barrier=None):
         print(f"Logs will be written to: {self.output_dir}")
+        self.started = time.monotonic()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        
+        if self.clock_sync is not None:
+            self.clock_sync.start()
+        
+        if self.window_sampler is not None:
+            self.window_sampler.start()
         
         # Start all subscribers
-        for subscriber in self.subscribers:
-            print(f'Starting subscriber: {subscriber.client_id} for topic {subscriber.topic} ...')
-            subscriber.connect()
+        if self.subscribers:
+            self.receive_pipeline.start()
+        if self.subscriber_pool is not None:
+            print(f'Starting {len(self.subscribers)} subscribers on one event loop ...')
+            self.subscriber_pool.connect(self.connection_ramp)
+            if self.engine == 'thread' and self.topics and len(self.subscribers) >= 500:
+                # every subscriber holds a socket and a log file, loop_start() threads select() on descriptors below 1024 only
+                print("Warning: with this many subscribers the publishers' sockets may not fit select(), run them with '-e asyncio'")
+        elif self.subscribers:
+            print(f'Starting {len(self.subscribers)} subscribers ...')
+            self.connection_ramp.connect(self.subscribers, 'subscriber')
+        
+        if barrier is not None:
+            # publish only once the subscribers of every worker process are connected
+            barrier.wait()
+        
+        # The ramp starts with the topics of its first step and ends the run itself
+        topics = self.topics
+        if self.ramp is not None:
+            topics = self.ramp.initial_topics()
+            if duration is None:
+                duration = self.ramp.max_duration
+        
+        if self.engine == 'asyncio':
+            self.run_asyncio_publishers(duration, topics)
+            return
+
+        # Publishers, or the pooled connections they share, connect at the pace of the ramp before any of them publishes
+        if self.connection_pool is not None:
+            connections = self.connection_pool.unopened(topics)
+            if connections:
+                print(f'Connecting {len(connections)} connections ...')
+                self.connection_ramp.connect(connections, 'connection')
+        elif topics:
+            print(f'Connecting {len(topics)} publishers ...')
+            self.connection_ramp.connect(topics, 'publisher')
         
         # Start all publishers
-        for topic in self.topics:
-            print(f'Starting publisher: {topic.topic_url} ...')
-            topic.start()
+        self.start_topics(topics, daemon=duration is not None)
+        if self.ramp is not None:
+            self.ramp.start()
         
         try:
+            if duration is not None:
+                self.stop_requested.wait(duration)
+                self.stop()
+                return
             # Keep the main thread running
             for topic in self.topics:
                 topic.join()
         except KeyboardInterrupt:
             self.stop()
 
+    def run_asyncio_publishers(self, duration=None, topics=None):
+        # All publishers share one event loop, so no thread is started per topic
+        engine = AsyncPublisherEngine(self.topics if topics is None else topics, self.connection_pool, self.connection_ramp)
+        self.publisher_engine = engine
+        if self.ramp is not None:
+            self.ramp.start()
+        try:
+            asyncio.run(asyncio.wait_for(engine.run(), duration))
+        except (KeyboardInterrupt, asyncio.TimeoutError):
+            pass
+        self.stop()
+
+    def start_topics(self, topics, daemon=True):
+        """Start publishing on topics, also while the simulation is running"""
+        if self.publisher_engine is not None:
+            self.publisher_engine.add_topics(topics)
+            return
+        # before any of them publishes, so none drops a block the others still have to take
+        for topic in topics:
+            topic.attach_blocks()
+        for topic in topics:
+            print(f'Starting publisher: {topic.topic_url} ...')
+            topic.daemon = daemon
+            topic.start()
+
+    def request_stop(self):
+        """End run() before its duration, from any thread"""
+        self.stop_requested.set()
+        if self.publisher_engine is not None:
+            self.publisher_engine.stop()
+
+    def write_schedule_lag(self):
+        """Export how late each publisher sent compared with its deadlines, to tell client lateness from broker latency"""
+        if not self.topics:
+            return
+        file_name = "schedule_lag.csv" if self.shard is None else f"schedule_lag-worker{self.shard[0]}.csv"
+        with open(os.path.join(self.output_dir, file_name), "w", encoding="utf-8") as f:
+            f.write("topic,time_interval,missed_tick_policy,sends,missed_ticks,mean_lag_ms,max_lag_ms,last_lag_ms\n")
+            for topic in self.topics:
+                schedule = topic.schedule
+                f.write(f"{topic.topic_url},{schedule.interval},{schedule.policy},{schedule.sends},{schedule.missed},"
+                        f"{schedule.lag_mean * 1000:.3f},{schedule.lag_max * 1000:.3f},{schedule.lag_last * 1000:.3f}\n")
+
+    def latency_histograms(self):
+        """{topic: LatencyHistogram} of all subscribers of this simulator, empty without the histogram sink"""
+        for sink in self.receive_pipeline.sinks:
+            if isinstance(sink, HistogramSink):
+                return sink.by_topic()
+        return {}
+
+    def counters(self):
+        """Totals of this simulator, small enough to be sent between processes"""
+        return {
+            'topics': len(self.topics),
+            'subscribers': len(self.subscribers),
+            'published': sum(topic.published_count for topic in self.topics),
+            'received': sum(subscriber.received_count for subscriber in self.subscribers),
+            'received_bytes': sum(subscriber.received_bytes for subscriber in self.subscribers),
+            'histograms': {topic: histogram.to_dict() for topic, histogram in self.latency_histograms().items()},
+            # what a subscriber expects depends on the topics of every worker, so run_workers matches them once merged
+            'sends': {topic.topic_url: topic.schedule.sends for topic in self.topics},
+            'subscriptions': self.subscriptions(),
+            'received_by': {subscriber.client_id: subscriber.received_count for subscriber in self.subscribers}
+        }
+
+    def subscriptions(self):
+        return {subscriber.client_id: subscriber.topic for subscriber in self.subscribers}
+
+    def expected_deliveries(self):
+        """{subscriber client id: messages it should have received} from the sends of the topics and the subscription filters.
+        None in a worker process, its subscribers also receive the topics of the other workers"""
+        if self.topic_subscribers is None:
+            return None
+        return expected_deliveries({topic.topic_url: topic.schedule.sends for topic in self.topics},
+                                   self.subscriptions(), self.topic_subscribers)
+
     def stop(self):
+        if self.ramp is not None:
+            self.ramp.stop()
+        
+        # Release publishers blocked on a full client queue
+        queued = sum(window.close() for window in self.windows)
+        
         # Stop all publishers
         for topic in self.topics:
             print(f'Stopping publisher: {topic.topic_url} ...')
             if topic.is_alive():
                 topic.disconnect()
         
+        self.write_schedule_lag()
+        
+        if self.connection_pool is not None:
+            self.connection_pool.print_summary()
+            self.connection_pool.close()
+        
+        if self.window_sampler is not None:
+            self.window_sampler.stop()
+        dropped = sum(window.dropped for window in self.windows)
+        blocked = sum(window.blocked for window in self.windows)
+        if dropped or blocked or queued:
+            print(f"Publish windows: {dropped} messages dropped, {blocked} publishes blocked on a full queue, {queued} still queued")
+        
+        # messages still unacknowledged are written to the ledger without an ack time
+        print_ledger_summary(self.ledgers)
+        
         # Stop all subscribers
-        for subscriber in self.subscribers:
-            print(f'Stopping subscriber: {subscriber.client_id} ...')
-            subscriber.disconnect()
+        if self.subscriber_pool is not None:
+            print(f'Stopping {len(self.subscribers)} subscribers ...')
+            self.subscriber_pool.close()
+        else:
+            for subscriber in self.subscribers:
+                print(f'Stopping subscriber: {subscriber.client_id} ...')
+                subscriber.disconnect()
+        
+        if self.receive_pipeline.is_alive():
+            self.receive_pipeline.close()
+            if self.receive_pipeline.dropped:
+                print(f"Receive pipeline: {self.receive_pipeline.dropped} messages dropped, queue was full")
+            if self.shard is None:
+                # worker processes leave the table to run_workers, which merges their histograms
+                print_percentiles(self.latency_histograms())
+        
+        if self.shard is None and self.subscribers:
+            print_deliveries({topic.topic_url: topic.schedule.sends for topic in self.topics},
+                             self.subscriptions(),
+                             {subscriber.client_id: subscriber.received_count for subscriber in self.subscribers})
+        
+        if self.ramp is not None:
+            self.ramp.report(os.path.join(self.output_dir, "ramp.csv"))
+        
+        if self.connection_ramp is not None and self.connection_ramp.records:
+            file_name = "connects.csv" if self.shard is None else f"connects-worker{self.shard[0]}.csv"
+            self.connection_ramp.write(os.path.join(self.output_dir, file_name))
+        
+        if self.clock_sync is not None:
+            self.clock_sync.stop()
+            self.clock_sync.print_summary()
+            file_name = "clock_offsets.csv" if self.shard is None else f"clock_offsets-worker{self.shard[0]}.csv"
+            self.clock_sync.write_offsets(os.path.join(self.output_dir, file_name))
+        
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        
+        # Write out everything still queued
+        close_log_writer()
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import time
+from publisher_engine import ThreadSafeClientDriver
+
+class SubscriberPool(threading.Thread):
+    """Runs the network I/O of many SubscriberClients on one asyncio event loop instead of a loop_start() thread each.
+    Their blocking connects run in the executor of a ConnectionRamp, the CONNACKs and everything after them arrive on the loop.
+    Clients driven this way are not reconnected by paho when their connection drops"""
+    def __init__(self, subscribers):
+        threading.Thread.__init__(self, name='subscriber-pool', daemon=True)
+        self.subscribers = subscribers
+        self.loop = asyncio.new_event_loop()
+        self.driver = ThreadSafeClientDriver(self.loop)
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.driver.loop_thread = threading.get_ident()
+        misc_task = self.loop.create_task(self.driver.misc_loop())
+        self.loop.run_forever()
+        misc_task.cancel()
+        self.loop.run_until_complete(asyncio.gather(misc_task, return_exceptions=True))
+        self.loop.close()
+
+    def connect(self, ramp):
+        """Start the loop and connect every subscriber at the pace of ramp, returns once each of them connected or failed"""
+        self.start()
+        ramp.connect(self.subscribers, 'subscriber', self.driver)
+
+    def close(self):
+        """Disconnect every subscriber on the loop, then stop it"""
+        if not self.is_alive():
+            return
+        asyncio.run_coroutine_threadsafe(self.disconnect_all(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join()
+
+    async def disconnect_all(self):
+        for subscriber in self.subscribers:
+            subscriber.disconnect()
+        # the DISCONNECT packets are written by the loop, paho closes each socket once its packet is out
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline and any(subscriber.client is not None and subscriber.client.socket() for subscriber in self.subscribers):
+            await asyncio.sleep(0.01)
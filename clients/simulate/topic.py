@@ -1,13 +1,14 @@
 import threading
-import json
 import time
-import uuid
 import paho.mqtt.client as mqtt
 from data_classes import BrokerSettings, ClientSettings
-from topic_data import TopicDataNumber, TopicDataBool, TopicDataRawValue, TopicDataMathExpression
+from deadline_schedule import DeadlineSchedule
+from payload_encoder import PayloadEncoder
+from publish_timer import PublishTimer
+from topic_data import TopicDataNumber, TopicDataBool, TopicDataRawValue, TopicDataMathExpression, DataSpec, compile_data
 
 class Topic(threading.Thread):
-    def __init__(self, broker_settings: BrokerSettings, topic_url: str, topic_data: list[object], topic_payload_root: object, client_settings: ClientSettings, metadata_config: dict = None):
+    def __init__(self, broker_settings: BrokerSettings, topic_url: str, topic_data: list[object], topic_payload_root: object, client_settings: ClientSettings, metadata_config: dict = None, encoder: PayloadEncoder = None):
         threading.Thread.__init__(self)
 
         self.broker_settings = broker_settings
@@ -17,10 +18,27 @@ class Topic(threading.Thread):
         self.topic_payload_root = topic_payload_root
 
         self.client_settings = client_settings
+        self.schedule = DeadlineSchedule(client_settings.time_interval, client_settings.missed_tick_policy)
 
         self.loop = False
         self.client = None
+        # AsyncioClientDriver running the network I/O of the client instead of a loop_start() thread
+        self.driver = None
+        # set when this topic publishes through a shared ConnectionPool connection
+        self.connection = None
         self.payload = None
+        self.published_count = 0
+        # acknowledgements arrive on the paho network thread and, for early acks, the thread publishing on a shared connection
+        self.lock = threading.Lock()
+        self.publish_timer = PublishTimer()
+        # SendLedger of the client this topic publishes on, when the publish log is enabled
+        self.ledger = None
+        # PublishWindow of the client this topic publishes on
+        self.window = None
+        # set by every CONNACK, with its result code and monotonic arrival time for the ConnectionRamp
+        self.acknowledged = threading.Event()
+        self.connack_rc = None
+        self.connack_time = None
 
         # Message metadata configuration
         self.metadata_config = metadata_config or {
@@ -28,60 +46,161 @@ class Topic(threading.Thread):
             'include_timestamp': True,
             'metadata_field_prefix': '_'
         }
+        if encoder is not None:
+            # compiled once for every topic of a TOPICS entry, the copy keeps the metadata of the last message per topic
+            self.encoder = encoder.copy()
+        else:
+            self.encoder = PayloadEncoder(self.topic_payload_root, [data.spec.data for data in self.topic_data], self.metadata_config)
 
     def load_topic_data(self, topic_data_object):
         topic_data = []
         for data in topic_data_object:
-            data_type = data['TYPE']
+            # DataSpecs compiled by the simulator, or DATA entries compiled here
+            spec = data if isinstance(data, DataSpec) else compile_data(data)
+            data_type = spec.type
             if data_type == 'int' or data_type == 'float':
-                topic_data.append(TopicDataNumber(data))
+                topic_data.append(TopicDataNumber(spec))
             elif data_type == 'bool':
-                topic_data.append(TopicDataBool(data))
+                topic_data.append(TopicDataBool(spec))
             elif data_type == 'raw_values':
-                topic_data.append(TopicDataRawValue(data))
+                topic_data.append(TopicDataRawValue(spec))
             elif data_type == 'math_expression':
-                topic_data.append(TopicDataMathExpression(data))
+                topic_data.append(TopicDataMathExpression(spec))
             else:
                 raise NameError(f"Data TYPE '{data_type}' is unknown")
         return topic_data
 
-    def connect(self):
-        self.loop = True
+    @property
+    def client_id(self):
+        # a topic with a connection of its own uses its URL as client id
+        return self.topic_url
+
+    def create_client(self):
         clean_session = None if self.broker_settings.protocol == mqtt.MQTTv5 else self.client_settings.clean
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, self.topic_url, protocol=self.broker_settings.protocol, clean_session=clean_session)
-        self.client.on_publish = self.on_publish
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, self.topic_url, protocol=self.broker_settings.protocol, clean_session=clean_session)
+        client.on_connect = self.on_connect
+        client.on_publish = self.on_publish
+        return client
+
+    def connect(self, driver=None):
+        """Connect with a network thread of its own, or on the event loop of driver"""
+        self.loop = True
+        if self.connection is not None:
+            self.connection.open(driver)
+            return
+        self.client = self.create_client()
+        if self.window is not None:
+            self.window.configure(self.client)
+        if driver is not None:
+            self.driver = driver
+            driver.attach(self.client)
+        # after the driver, whose socket callbacks the ledger wraps
+        if self.ledger is not None:
+            self.ledger.watch(self.client)
         self.client.connect(self.broker_settings.url, self.broker_settings.port)
-        self.client.loop_start()
+        if driver is None:
+            self.client.loop_start()
+
+    def retry_in_background(self):
+        """After the last connect failed, leave further attempts to the paho network thread. Clients driven by an
+        event loop are not reconnected, so they are disconnected"""
+        if self.connection is not None:
+            return
+        if self.driver is None:
+            self.client.loop_start()
+        else:
+            self.disconnect()
+
+    def attach_blocks(self):
+        """Keep the precomputed values of this topic until it takes them, in vectorized mode"""
+        for data in self.topic_data:
+            if data.block is not None:
+                data.block.attach()
+
+    def release_blocks(self):
+        for data in self.topic_data:
+            if data.block is not None:
+                data.block.release()
 
     def disconnect(self):
         self.loop = False
-        self.client.loop_stop()
+        self.release_blocks()
+        if self.connection is not None:
+            # shared connections are closed by their pool
+            return
         self.client.disconnect()
+        if self.driver is None:
+            self.client.loop_stop()
+        else:
+            self.driver.detach(self.client)
 
     def run(self):
-        self.connect()
+        # the simulator may have connected it already, paced by its ConnectionRamp
+        if not self.loop:
+            self.connect()
+        self.schedule.start()
         while self.loop:
-            # Generate payload
-            payload = self.generate_payload()
-            
-            # Add message metadata
-            prefix = self.metadata_config.get('metadata_field_prefix', '_')
-            
-            if self.metadata_config.get('include_message_id', True):
-                payload[f"{prefix}message_id"] = str(uuid.uuid4())
-            
-            if self.metadata_config.get('include_timestamp', True):
-                # Add timestamp in milliseconds
-                payload[f"{prefix}timestamp"] = int(time.time() * 1000)
-            
-            # Convert to JSON and publish
-            payload_json = json.dumps(payload)
-            self.client.publish(self.topic_url, payload_json, qos=self.client_settings.qos, retain=self.client_settings.retain)
-            
-            # Sleep until next interval
-            time.sleep(self.client_settings.time_interval)
+            # Sleep until next deadline
+            delay = self.schedule.deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            if not self.fire(time.monotonic()):
+                # all data within the topic became inactive
+                self.disconnect()
+                break
+
+    def fire(self, now):
+        """Publish for the deadline that has passed, returns False once the topic has nothing left to publish"""
+        deadline = self.schedule.fire(now)
+        if deadline is None:
+            return True
+        payload = self.next_payload()
+        if payload is None:
+            return False
+        self.publish(payload)
+        self.schedule.record_send(deadline, time.monotonic())
+        return True
+
+    def next_payload(self):
+        """Generate the next message for this topic, serialized and ready to publish"""
+        return self.encoder.encode(self.topic_data)
+
+    def publish(self, payload):
+        # the times publish() was called, before the message may wait in the client queue of the window
+        message = (payload, self.encoder.message_id, time.monotonic(), time.time_ns())
+        if self.window is not None:
+            self.window.submit(self, message)
+        else:
+            self.send(message)
+
+    def send(self, message):
+        """Hand a message to paho, returns its mid or None if the connection is closed"""
+        payload, message_id, sent, publish_ns = message
+        handoff_ns = time.time_ns()
+        if self.connection is not None:
+            mid = self.connection.publish(self, payload, self.client_settings.qos, self.client_settings.retain)
+        else:
+            mid = self.client.publish(self.topic_url, payload, qos=self.client_settings.qos, retain=self.client_settings.retain).mid
+        if mid is not None:
+            self.publish_timer.published(mid, sent)
+            if self.ledger is not None:
+                self.ledger.published(self.topic_url, message_id, mid, self.client_settings.qos, len(payload), publish_ns, handoff_ns)
+        return mid
+
+    def on_connect(self, client, userdata, flags, rc):
+        self.connack_time = time.monotonic()
+        self.connack_rc = getattr(rc, 'value', rc)
+        self.acknowledged.set()
 
     def on_publish(self, client, userdata, result):
+        with self.lock:
+            self.published_count += 1
+        self.publish_timer.acknowledged(result)
+        if self.ledger is not None:
+            self.ledger.acknowledged(result)
+        if self.window is not None:
+            self.window.acknowledged()
         print(f'[{time.strftime("%H:%M:%S")}] Data published on: {self.topic_url}')
 
     def generate_payload(self):
@@ -93,6 +212,5 @@ class Topic(threading.Thread):
                 has_data_active = True
                 payload[data.name] = data.generate_value()
         if not has_data_active:
-            self.disconnect()
-            return
+            return None
         return payload
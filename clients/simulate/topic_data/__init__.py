@@ -2,3 +2,5 @@ from .topic_data_number import TopicDataNumber
 from .topic_data_bool import TopicDataBool
 from .topic_data_raw_value import TopicDataRawValue
 from .topic_data_math_expression import TopicDataMathExpression
+from .topic_data_block import create_block_generator
+from .topic_data_spec import DataSpec, compile_data
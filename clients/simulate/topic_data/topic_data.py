@@ -1,26 +1,34 @@
 from abc import ABC, abstractmethod
 from utils import should_run_with_probability
+from .topic_data_spec import DataSpec, compile_data
 
 class TopicData(ABC):
     def __init__(self, data):
-        self.data = data
-        self.name = data['NAME']
+        # the DataSpec is shared by all topics of a TOPICS entry, a plain DATA dict is compiled for this topic alone
+        self.spec = data if isinstance(data, DataSpec) else compile_data(data)
+        self.name = self.spec.name
         self.is_active = True
         self.old_value = None
+        # BlockCursor into precomputed values when the simulator generates in vectorized mode
+        self.block = None
 
     def generate_value(self):
+        if self.block is not None:
+            self.old_value = self.block.next_value()
+            return self.old_value
+        spec = self.spec
         new_value = None
         if self.old_value is None:
             # generate initial data
-            if 'INITIAL_VALUE' in self.data:
-                new_value = self.data['INITIAL_VALUE']
+            if spec.has_initial_value:
+                new_value = spec.initial_value
             else:
                 new_value = self.generate_initial_value()
         else:
             # generate next data
-            if should_run_with_probability(self.data.get('RETAIN_PROBABILITY', 0)):
+            if spec.retain_probability and should_run_with_probability(spec.retain_probability):
                 new_value = self.old_value
-            elif should_run_with_probability(self.data.get('RESET_PROBABILITY', 0)):
+            elif spec.reset_probability and should_run_with_probability(spec.reset_probability):
                 new_value = self.generate_initial_value()
             else:
                 new_value = self.generate_next_value()
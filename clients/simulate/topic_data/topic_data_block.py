@@ -0,0 +1,182 @@
+import threading
+from abc import ABC, abstractmethod
+
+class BlockCursor:
+    """Position of one topic instance inside the precomputed blocks of a shared generator"""
+    __slots__ = ('generator', 'column', 'generation', 'values', 'row', 'attached')
+
+    def __init__(self, generator, column):
+        self.generator = generator
+        self.column = column
+        # last block taken, -1 before the first one
+        self.generation = -1
+        self.values = []
+        self.row = 0
+        # only attached cursors keep blocks they did not take yet alive
+        self.attached = False
+
+    def next_value(self):
+        if self.row >= len(self.values):
+            self.values = self.generator.block(self)[self.column].tolist()
+            self.row = 0
+        value = self.values[self.row]
+        self.row += 1
+        return value
+
+    def attach(self):
+        """Keep the blocks this cursor still has to take, called when its topic starts publishing"""
+        self.generator.attach(self)
+
+    def release(self):
+        """Stop keeping blocks for this cursor, called when its topic stops publishing"""
+        self.generator.release(self)
+
+
+class TopicDataBlockGenerator(ABC):
+    """Precomputes the next block_size values of a DATA spec for every instance expanded from it at once"""
+    def __init__(self, data, instances, block_size):
+        import numpy as np
+        self.np = np
+        self.rng = np.random.default_rng()
+        self.instances = instances
+        self.block_size = block_size
+        self.initial_value = data.get('INITIAL_VALUE')
+        self.retain_probability = data.get('RETAIN_PROBABILITY', 0)
+        self.reset_probability = data.get('RESET_PROBABILITY', 0)
+
+        self.state = None
+        # generation -> block, from oldest to next_generation - 1
+        self.blocks = {}
+        self.oldest = 0
+        self.next_generation = 0
+        # generation -> number of attached cursors whose last block it is
+        self.positions = {}
+        self.cursors = [BlockCursor(self, column) for column in range(instances)]
+        self.lock = threading.Lock()
+
+    def attach(self, cursor):
+        with self.lock:
+            self._attach(cursor)
+
+    def _attach(self, cursor):
+        if cursor.attached:
+            return
+        # a cursor attached late starts with the oldest block still kept, the ones before it are gone
+        cursor.generation = max(cursor.generation, self.oldest - 1)
+        self.positions[cursor.generation] = self.positions.get(cursor.generation, 0) + 1
+        cursor.attached = True
+
+    def release(self, cursor):
+        with self.lock:
+            if not cursor.attached:
+                return
+            self._leave(cursor.generation)
+            cursor.attached = False
+            self.drop()
+
+    def _leave(self, generation):
+        count = self.positions[generation] - 1
+        if count:
+            self.positions[generation] = count
+        else:
+            del self.positions[generation]
+
+    def block(self, cursor):
+        """Next block of shape (instances, block_size) for cursor, generated on first request and dropped once no
+        attached cursor still has to take it"""
+        with self.lock:
+            self._attach(cursor)
+            self._leave(cursor.generation)
+            generation = cursor.generation = cursor.generation + 1
+            self.positions[generation] = self.positions.get(generation, 0) + 1
+            while generation >= self.next_generation:
+                self.blocks[self.next_generation] = self.generate_block()
+                self.next_generation += 1
+            block = self.blocks[generation]
+            self.drop()
+            return block
+
+    def drop(self):
+        # every attached cursor took the blocks up to the lowest of their generations, each keeps its own column of it
+        lowest = min(self.positions, default=self.next_generation)
+        while self.oldest < self.next_generation and self.oldest <= lowest:
+            del self.blocks[self.oldest]
+            self.oldest += 1
+
+    def generate_block(self):
+        np = self.np
+        block = np.empty((self.instances, self.block_size), dtype=self.dtype)
+        tick = 0
+        if self.state is None:
+            if self.initial_value is not None:
+                self.state = np.full(self.instances, self.initial_value, dtype=self.dtype)
+            else:
+                self.state = self.generate_initial_values()
+            block[:, 0] = self.state
+            tick = 1
+        for tick in range(tick, self.block_size):
+            retain = self.rng.random(self.instances) < self.retain_probability
+            reset = self.rng.random(self.instances) < self.reset_probability
+            self.state = np.where(retain, self.state, np.where(reset, self.generate_initial_values(), self.generate_next_values()))
+            block[:, tick] = self.state
+        return block
+
+    @abstractmethod
+    def generate_initial_values(self):
+        pass
+
+    @abstractmethod
+    def generate_next_values(self):
+        pass
+
+
+class TopicDataNumberBlockGenerator(TopicDataBlockGenerator):
+    def __init__(self, data, instances, block_size):
+        super().__init__(data, instances, block_size)
+        self.is_int = data['TYPE'] == 'int'
+        self.dtype = self.np.int64 if self.is_int else self.np.float64
+        self.min_value = data['MIN_VALUE']
+        self.max_value = data['MAX_VALUE']
+        self.max_step = data['MAX_STEP']
+        self.increase_probability = data.get('INCREASE_PROBABILITY', 0.5)
+        self.restart_on_boundaries = data.get('RESTART_ON_BOUNDARIES', False)
+
+    def generate_initial_values(self):
+        if self.is_int:
+            return self.rng.integers(self.min_value, self.max_value, size=self.instances, endpoint=True)
+        return self.rng.uniform(self.min_value, self.max_value, size=self.instances)
+
+    def generate_next_values(self):
+        np = self.np
+        step = self.rng.uniform(0, self.max_step, size=self.instances)
+        if self.is_int:
+            # same round-half-to-even as the builtin round() of TopicDataNumber
+            step = np.rint(step).astype(self.dtype)
+        decrease = self.rng.random(self.instances) < 1 - self.increase_probability
+        next_values = np.where(decrease, np.maximum(self.state - step, self.min_value), np.minimum(self.state + step, self.max_value))
+        if self.restart_on_boundaries:
+            on_boundary = (self.state == self.min_value) | (self.state == self.max_value)
+            next_values = np.where(on_boundary, self.generate_initial_values(), next_values)
+        return next_values
+
+
+class TopicDataBoolBlockGenerator(TopicDataBlockGenerator):
+    def __init__(self, data, instances, block_size):
+        super().__init__(data, instances, block_size)
+        self.dtype = self.np.bool_
+
+    def generate_initial_values(self):
+        return self.rng.random(self.instances) < 0.5
+
+    def generate_next_values(self):
+        return ~self.state
+
+
+def create_block_generator(data, instances, block_size):
+    """Block generator for a DATA spec, or None if its TYPE can only be generated value by value"""
+    data_type = data['TYPE']
+    if data_type == 'int' or data_type == 'float':
+        return TopicDataNumberBlockGenerator(data, instances, block_size)
+    elif data_type == 'bool':
+        return TopicDataBoolBlockGenerator(data, instances, block_size)
+    return None
@@ -8,7 +8,8 @@ class TopicDataMathExpression(TopicData):
         self.expression_evaluator = None
 
     def generate_initial_value(self):
-        self.expression_evaluator = ExpressionEvaluator(self.data['MATH_EXPRESSION'], self.data['INTERVAL_START'], self.data['INTERVAL_END'], self.data['MIN_DELTA'], self.data['MAX_DELTA'])
+        spec = self.spec
+        self.expression_evaluator = ExpressionEvaluator(spec.math_expression, spec.interval_start, spec.interval_end, spec.min_delta, spec.max_delta)
         return self.expression_evaluator.get_current_expression_value()
 
     def generate_next_value(self):
@@ -0,0 +1,148 @@
+import math
+
+NUMBER_TYPES = (int, float)
+ALLOWED_FUNCTIONS = frozenset(name for name in math.__dict__ if not name.startswith("__"))
+
+
+class DataSpec:
+    """A DATA entry validated once with its defaults resolved. Every topic expanded from one TOPICS entry shares the
+    same spec, only the state of the generated values lives in its TopicData"""
+    __slots__ = ('data', 'name', 'type', 'has_initial_value', 'initial_value', 'retain_probability', 'reset_probability')
+
+    def __init__(self, data, path):
+        self.name = require(data, 'NAME', str, path)
+        self.type = data['TYPE']
+        self.has_initial_value = 'INITIAL_VALUE' in data
+        self.initial_value = data.get('INITIAL_VALUE')
+        self.retain_probability = probability(data, 'RETAIN_PROBABILITY', 0, path)
+        self.reset_probability = probability(data, 'RESET_PROBABILITY', 0, path)
+        # the DATA entry with its defaults filled in, for the payload encoder and the block generators
+        self.data = data
+
+    def resolve(self, **defaults):
+        """Fill the defaults in a copy of the DATA entry, the settings file itself is left as it was"""
+        data = dict(self.data)
+        data.setdefault('RETAIN_PROBABILITY', self.retain_probability)
+        data.setdefault('RESET_PROBABILITY', self.reset_probability)
+        for key, value in defaults.items():
+            data.setdefault(key, value)
+        self.data = data
+
+
+class NumberSpec(DataSpec):
+    __slots__ = ('is_int', 'min_value', 'max_value', 'max_step', 'increase_probability', 'restart_on_boundaries')
+
+    def __init__(self, data, path):
+        super().__init__(data, path)
+        self.is_int = self.type == 'int'
+        self.min_value = require(data, 'MIN_VALUE', NUMBER_TYPES, path)
+        self.max_value = require(data, 'MAX_VALUE', NUMBER_TYPES, path)
+        self.max_step = require(data, 'MAX_STEP', NUMBER_TYPES, path)
+        self.increase_probability = probability(data, 'INCREASE_PROBABILITY', 0.5, path)
+        self.restart_on_boundaries = optional(data, 'RESTART_ON_BOUNDARIES', bool, False, path)
+        if self.min_value > self.max_value:
+            raise ValueError(f"{path}: MIN_VALUE {self.min_value} is greater than MAX_VALUE {self.max_value}")
+        if self.is_int and not (isinstance(self.min_value, int) and isinstance(self.max_value, int)):
+            raise ValueError(f"{path}: MIN_VALUE and MAX_VALUE of TYPE 'int' must be integers")
+        self.resolve(INCREASE_PROBABILITY=self.increase_probability, RESTART_ON_BOUNDARIES=self.restart_on_boundaries)
+
+
+class BoolSpec(DataSpec):
+    __slots__ = ()
+
+    def __init__(self, data, path):
+        super().__init__(data, path)
+        self.resolve()
+
+
+class RawValuesSpec(DataSpec):
+    __slots__ = ('values', 'index_start', 'index_end', 'restart_on_end', 'value_default')
+
+    def __init__(self, data, path):
+        super().__init__(data, path)
+        self.values = require(data, 'VALUES', list, path)
+        if not self.values:
+            raise ValueError(f"{path}: VALUES is empty")
+        self.index_start = optional(data, 'INDEX_START', int, 0, path)
+        self.index_end = optional(data, 'INDEX_END', int, len(self.values) - 1, path)
+        if not 0 <= self.index_start <= self.index_end < len(self.values):
+            raise ValueError(f"{path}: INDEX_START {self.index_start} and INDEX_END {self.index_end} must be indexes of VALUES in this order")
+        self.restart_on_end = optional(data, 'RESTART_ON_END', bool, False, path)
+        self.value_default = optional(data, 'VALUE_DEFAULT', dict, None, path)
+        if self.value_default is not None and not all(isinstance(value, dict) for value in self.values):
+            raise ValueError(f"{path}: VALUES must be objects when VALUE_DEFAULT is set")
+        self.resolve(INDEX_START=self.index_start, INDEX_END=self.index_end, RESTART_ON_END=self.restart_on_end)
+
+
+class MathExpressionSpec(DataSpec):
+    __slots__ = ('math_expression', 'interval_start', 'interval_end', 'min_delta', 'max_delta')
+
+    def __init__(self, data, path):
+        super().__init__(data, path)
+        self.math_expression = require(data, 'MATH_EXPRESSION', str, path)
+        self.interval_start = require(data, 'INTERVAL_START', NUMBER_TYPES, path)
+        self.interval_end = require(data, 'INTERVAL_END', NUMBER_TYPES, path)
+        self.min_delta = require(data, 'MIN_DELTA', NUMBER_TYPES, path)
+        self.max_delta = require(data, 'MAX_DELTA', NUMBER_TYPES, path)
+        # the expression is compiled by every topic, but a name it is not allowed to use fails here already
+        try:
+            code = compile("lambda x: " + self.math_expression, "<string>", "eval")
+        except SyntaxError as e:
+            raise ValueError(f"{path}: MATH_EXPRESSION '{self.math_expression}' is invalid: {e.msg}")
+        # the names used by the expression are those of the lambda, a constant of the compiled code
+        for name in code.co_consts[0].co_names:
+            if name != 'math' and name not in ALLOWED_FUNCTIONS:
+                raise NameError(f"{path}: the use of '{name}' is not allowed in MATH_EXPRESSION")
+        self.resolve()
+
+
+# DATA TYPE -> spec class
+DATA_SPECS = {
+    'int': NumberSpec,
+    'float': NumberSpec,
+    'bool': BoolSpec,
+    'raw_values': RawValuesSpec,
+    'math_expression': MathExpressionSpec
+}
+
+def compile_data(data, path='DATA'):
+    """DataSpec of a DATA entry of the settings file, raises NameError or ValueError naming path if it is invalid"""
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: must be an object")
+    data_type = data.get('TYPE')
+    if data_type not in DATA_SPECS:
+        raise NameError(f"{path}: Data TYPE '{data_type}' is unknown")
+    return DATA_SPECS[data_type](data, path)
+
+
+def is_type(value, types):
+    # bool is an int to Python but never a number in a settings file
+    if isinstance(value, bool):
+        return types is bool
+    return isinstance(value, types)
+
+def type_name(types):
+    if types is NUMBER_TYPES or types is float:
+        return 'a number'
+    return {int: 'an integer', str: 'a string', bool: 'a bool', list: 'an array', dict: 'an object'}[types]
+
+def require(data, key, types, path):
+    if key not in data:
+        raise ValueError(f"{path}: {key} is required")
+    return check(data[key], key, types, path)
+
+def optional(data, key, types, default, path):
+    if key not in data:
+        return default
+    return check(data[key], key, types, path)
+
+def probability(data, key, default, path):
+    value = optional(data, key, NUMBER_TYPES, default, path)
+    if not 0 <= value <= 1:
+        raise ValueError(f"{path}: {key} must be between 0 and 1, not {value}")
+    return value
+
+def check(value, key, types, path):
+    if not is_type(value, types):
+        raise ValueError(f"{path}: {key} must be {type_name(types)}, not {value!r}")
+    return value
@@ -0,0 +1,133 @@
+class TrieNode:
+    __slots__ = ('children', 'subscribers')
+
+    def __init__(self):
+        # topic level, '+' or '#' -> TrieNode
+        self.children = {}
+        # subscriber -> value of the subscriptions ending at this node
+        self.subscribers = {}
+
+
+class TopicTrie:
+    """Topic filters of many subscribers, split in levels, so a published topic is matched in time proportional to its depth
+    instead of the number of subscriptions. Follows MQTT: '+' matches one level, also an empty one, '#' matches the rest of
+    the topic including its parent level ('a/#' matches 'a'), and wildcards at the first level do not match topics
+    starting with '$'. Otherwise it agrees with IsSubset in server/topic/topic.go"""
+    def __init__(self):
+        self.root = TrieNode()
+        self.count = 0
+        # published topic -> frozenset of subscribers, the same few topics are matched over and over
+        self.cache = {}
+
+    def __len__(self):
+        return self.count
+
+    def add(self, topic_filter, subscriber, value=True):
+        """Subscribe subscriber to topic_filter, value is returned by matches(), e.g. the granted QoS"""
+        node = self.root
+        for level in topic_filter.split('/'):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = TrieNode()
+            node = child
+        if subscriber not in node.subscribers:
+            self.count += 1
+        node.subscribers[subscriber] = value
+        self.cache.clear()
+
+    def remove(self, topic_filter, subscriber):
+        """Unsubscribe, returns False if subscriber was not subscribed to topic_filter"""
+        path = [self.root]
+        for level in topic_filter.split('/'):
+            node = path[-1].children.get(level)
+            if node is None:
+                return False
+            path.append(node)
+        if path[-1].subscribers.pop(subscriber, None) is None:
+            return False
+        self.count -= 1
+        self.cache.clear()
+        # drop the nodes nobody subscribes through any more
+        levels = topic_filter.split('/')
+        for index in range(len(levels), 0, -1):
+            node = path[index]
+            if node.children or node.subscribers:
+                break
+            del path[index - 1].children[levels[index - 1]]
+        return True
+
+    def matches(self, topic):
+        """(subscriber, value) of every subscription matching a published topic, a subscriber with overlapping filters comes once per filter"""
+        levels = topic.split('/')
+        nodes = [self.root]
+        for depth, level in enumerate(levels):
+            following = []
+            for node in nodes:
+                if depth == 0 and topic.startswith('$'):
+                    child = node.children.get(level)
+                    if child is not None:
+                        following.append(child)
+                    continue
+                rest = node.children.get('#')
+                if rest is not None:
+                    yield from rest.subscribers.items()
+                child = node.children.get(level)
+                if child is not None:
+                    following.append(child)
+                child = node.children.get('+')
+                if child is not None:
+                    following.append(child)
+            nodes = following
+            if not nodes:
+                return
+        for node in nodes:
+            yield from node.subscribers.items()
+            # 'a/#' also matches 'a'
+            rest = node.children.get('#')
+            if rest is not None:
+                yield from rest.subscribers.items()
+
+    def subscribers(self, topic):
+        """Set of the subscribers that should receive a message published on topic"""
+        subscribers = self.cache.get(topic)
+        if subscribers is None:
+            subscribers = self.cache[topic] = frozenset(subscriber for subscriber, _ in self.matches(topic))
+        return subscribers
+
+
+def match_subscribers(topics, subscriptions):
+    """{topic: frozenset of the subscribers whose filter matches it} from topic names and {subscriber: topic filter}"""
+    trie = TopicTrie()
+    for subscriber, topic_filter in subscriptions.items():
+        if topic_filter is not None:
+            trie.add(topic_filter, subscriber)
+    return {topic: trie.subscribers(topic) for topic in topics}
+
+
+def expected_deliveries(sends, subscriptions, matched=None):
+    """Messages every subscriber should have received, from {topic: messages sent} and {subscriber: topic filter}.
+    matched is the match_subscribers() of the same topics and subscriptions, when they were matched before"""
+    if matched is None:
+        matched = match_subscribers(sends, subscriptions)
+    expected = dict.fromkeys(subscriptions, 0)
+    for topic, count in sends.items():
+        for subscriber in matched[topic]:
+            expected[subscriber] += count
+    return expected
+
+
+def print_deliveries(sends, subscriptions, received):
+    """Expected against received messages, {subscriber: received} is compared with expected_deliveries()"""
+    expected = expected_deliveries(sends, subscriptions)
+    if not any(expected.values()):
+        return
+    total = sum(expected.values())
+    total_received = sum(min(received.get(subscriber, 0), count) for subscriber, count in expected.items())
+    print()
+    print(f"Deliveries: {total_received} of {total} expected messages received ({total_received / total * 100:.2f}%)")
+    # only the subscribers missing messages, there may be thousands of them
+    missing = {subscriber: count - received.get(subscriber, 0) for subscriber, count in expected.items() if received.get(subscriber, 0) < count}
+    if missing:
+        print(f'{"Subscriber":40} {"Expected":>10} {"Received":>10} {"Missing":>10}')
+        for subscriber in sorted(missing):
+            print(f'{subscriber:40} {expected[subscriber]:>10} {received.get(subscriber, 0):>10} {missing[subscriber]:>10}')
@@ -0,0 +1,85 @@
+import multiprocessing
+import queue
+import threading
+from simulator import Simulator
+from latency_histogram import merge_by_topic, print_percentiles
+from topic_trie import print_deliveries
+
+def run_worker(index, workers, settings_file, output_dir, engine, duration, barrier, results, metrics_port=None):
+    """Entry point of a worker process, running only its shard of topics and subscribers"""
+    simulator = None
+    try:
+        simulator = Simulator(settings_file, output_dir, engine, shard=(index, workers), metrics_port=metrics_port)
+        print(f'Worker {index}: {len(simulator.topics)} publishers, {len(simulator.subscribers)} subscribers')
+        simulator.run(duration, barrier)
+    except threading.BrokenBarrierError:
+        print(f'Worker {index}: another worker failed to start')
+    except BaseException:
+        # release the workers already waiting for us at the barrier
+        barrier.abort()
+        raise
+    finally:
+        counters = simulator.counters() if simulator is not None else {}
+        counters['worker'] = index
+        results.put(counters)
+
+
+def run_workers(settings_file, output_dir, engine, workers, duration=None, metrics_port=None):
+    barrier = multiprocessing.Barrier(workers)
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(index, workers, settings_file, output_dir, engine, duration, barrier, results, metrics_port),
+            name=f'simulator-worker-{index}'
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # drain the results before joining, a worker cannot exit while its counters sit in the pipe
+    summaries = []
+    while len(summaries) < workers:
+        try:
+            summaries.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                break
+        except KeyboardInterrupt:
+            # the workers received the same interrupt and are sending their counters
+            continue
+    for process in processes:
+        process.join()
+
+    print_summary(summaries, workers)
+
+
+def print_summary(summaries, workers):
+    keys = ['topics', 'subscribers', 'published', 'received', 'received_bytes']
+    print()
+    print(f'{"Worker":>8} ' + ' '.join(f'{key:>15}' for key in keys))
+    totals = dict.fromkeys(keys, 0)
+    for summary in sorted(summaries, key=lambda summary: summary['worker']):
+        print(f'{summary["worker"]:>8} ' + ' '.join(f'{summary.get(key, 0):>15}' for key in keys))
+        for key in keys:
+            totals[key] += summary.get(key, 0)
+    print(f'{"Total":>8} ' + ' '.join(f'{totals[key]:>15}' for key in keys))
+    if len(summaries) < workers:
+        print(f'{workers - len(summaries)} worker(s) did not report their counters')
+
+    # latency percentiles over all subscribers of all workers
+    histograms = {}
+    for summary in summaries:
+        merge_by_topic(summary.get('histograms', {}), histograms)
+    print_percentiles(histograms)
+
+    # subscribers of one worker receive the topics of every other worker
+    sends, subscriptions, received = {}, {}, {}
+    for summary in summaries:
+        for topic, count in summary.get('sends', {}).items():
+            sends[topic] = sends.get(topic, 0) + count
+        subscriptions.update(summary.get('subscriptions', {}))
+        received.update(summary.get('received_by', {}))
+    if subscriptions:
+        print_deliveries(sends, subscriptions, received)
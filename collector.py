@@ -1,94 +1,367 @@
 #!/usr/bin/env python3
 # collector script, Steve Willoughby, June 2025
 #
-# This is just a start, a lot more to be added here.
 # Collect stats on publishers and subscribers to track what messages were sent and received, what data was sent (and not sent),
 # (later) what data was transformed or mis-delivered, altered by policy rules, etc.
 # and the throughput time stats for messages going through the system based on timestamps for pub/sub time per message.
+#
+# The publisher send logs (publisher-sends*.csv) and the subscriber latency files (.latency.csv or .latency.bin) are read
+# in one streaming pass per file, in parallel. Their records are spilled to partition files by a hash of topic and message id,
+# and each partition is then joined on its own, so memory stays bounded by the size of one partition whatever the size of the logs.
+# The send logs are the publishers' send ledgers, whose publish, socket and ack times split the latency into
+# client queueing, broker ack and delivery.
 
-from datetime import datetime
 import argparse
+import csv
+import multiprocessing
 import os, os.path
-import re
-
-ap = argparse.ArgumentParser(prog='collector', description='collect experiment simulator output and summarize')
-ap.add_argument('-l', '--logdir', default='~/Downloads/mqtt-logs', help='directory containing subscriber client logs')
-ap.add_argument('-p', '--publog', default='typescript', help='main simulator (publisher) log file')
-opts = ap.parse_args()
-
-class MessagePayload:
-    def __init__(self, timestamp, topic):
-        self.timestamp=timestamp
-        self.topic=topic
-        self.data=''
-
-class ClientData:
-    def __init__(self, logfilename):
-        self.logfilename=logfilename
-        self.id = None
-        self.topic = None
-        self.connected = None
-        self.data = []
-
-logdir = os.path.expanduser(opts.logdir)
-publog = os.path.expanduser(opts.publog)
-collect_to = None
-clients = []
-publish_events = {}
-
-with open(publog) as f:
-    for line in f:
-        if m := re.match(r'^\s*\[(\d+:\d+:\d+)\]\s+Data published on: (\S+).*', line):
-            if m.group(2) not in publish_events:
-                publish_events[m.group(2)] = []
-            publish_events[m.group(2)].append(datetime.strptime(m.group(1), '%H:%M:%S'))
-
-for client in os.scandir(logdir):
-    if client.name.startswith('subscriber-') and client.name.endswith('.log'):
-        c = ClientData(client.path)
-        clients.append(c)
-        with open(client.path) as f:
+import shutil
+import sys
+import tempfile
+import zlib
+
+# the latency file formats and histograms are the simulator's own modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clients', 'simulate'))
+import latency_records
+from latency_histogram import LatencyHistogram
+from topic_trie import TopicTrie
+
+
+# message_key() of an id that is missing or of neither form: such a message can not be matched
+NO_KEY = (0, 0)
+
+def join_key(prefix, seq, legacy=False):
+    """Key a send and its receives are matched on, from the message_key() of the message id"""
+    # version 1 records files kept the seq alone, so a run with one of them is joined on the seq only
+    return str(seq) if legacy else f"{prefix:x}-{seq}"
+
+def partition(topic, key, partitions):
+    return zlib.crc32(f"{topic}\0{key}".encode('utf-8')) % partitions
+
+
+class Spill:
+    """Tab separated records of one input file, split over one file per partition"""
+    def __init__(self, spill_dir, prefix, partitions):
+        self.files = [open(os.path.join(spill_dir, f"{prefix}-{index}.tsv"), "w", encoding="utf-8") for index in range(partitions)]
+
+    def write(self, topic, key, *values):
+        self.files[partition(topic, key, len(self.files))].write('\t'.join([topic, key, *map(str, values)]) + '\n')
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+
+def subscriber_info(latency_path):
+    """Client id and topic filter of a subscriber, from the header of its .log file"""
+    name = os.path.basename(latency_path).split('.latency.')[0]
+    topic_filter = None
+    # the header is at the start of the oldest segment once the log was rotated
+    log_segments = latency_records.log_segments(os.path.join(os.path.dirname(latency_path), f"{name}.log"))
+    if log_segments:
+        with open(log_segments[0], encoding="utf-8", errors="replace") as f:
             for line in f:
-                if collect_to is not None:
-                    collect_to.data += line
-                    if line.strip() == '}':
-                        collect_to = None
+                if line.startswith('Topic:'):
+                    topic_filter = line.split(':', 1)[1].strip()
+                    break
+                if not line.strip():
+                    # end of the header
+                    break
+    return name, topic_filter
+
+
+def scan_sends(path, spill_dir, index, partitions, legacy):
+    """Spill the sends of a publisher send log, returns the number of sends per topic"""
+    spill = Spill(spill_dir, f"send-{index}", partitions)
+    sent = {}
+    with open(path, newline='', encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            message_key = latency_records.message_key(row['message_id'])
+            if message_key == NO_KEY:
+                # published without a message id, it can not be matched
+                continue
+            topic = row['topic']
+            sent[topic] = sent.get(topic, 0) + 1
+            # publish() to socket and socket to ack in the send ledger, empty for older send logs and unacknowledged messages
+            queue_us = ack_us = ''
+            if row.get('socket_time_ns'):
+                queue_us = (int(row['socket_time_ns']) - int(row['publish_time_ns'])) / 1000
+                if row['ack_time_ns'] and row['qos'] != '0':
+                    ack_us = (int(row['ack_time_ns']) - int(row['socket_time_ns'])) / 1000
+            spill.write(topic, join_key(*message_key, legacy), queue_us, ack_us)
+    spill.close()
+    return {'kind': 'sends', 'path': path, 'sent': sent}
+
+
+def receive_rows(path, legacy=False):
+    """(topic, join key, send_ns, latency_us) of a subscriber latency file and its rotated segments, in the order they were received.
+    Messages without a message id are left out, as they are from the send logs"""
+    for segment in latency_records.log_segments(path):
+        yield from segment_rows(segment, path.endswith('.bin'), legacy)
+
+
+def segment_rows(path, binary, legacy):
+    if binary:
+        records = latency_records.read_records(path)
+        topics = latency_records.read_topics(path)
+        for start in range(0, len(records), 65536):
+            chunk = records[start:start + 65536]
+            prefixes = chunk['prefix'].tolist() if 'prefix' in chunk.dtype.names else [0] * len(chunk)
+            for topic_id, prefix, seq, send_ns, receive_ns in zip(chunk['topic_id'].tolist(), prefixes, chunk['seq'].tolist(), chunk['send_ns'].tolist(), chunk['receive_ns'].tolist()):
+                if (prefix, seq) == NO_KEY:
                     continue
+                yield topics[topic_id], join_key(prefix, seq, legacy), send_ns, (receive_ns - send_ns) / 1000
+        return
+    with open(path, newline='', encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            message_key = latency_records.message_key(row['message_id'])
+            if message_key == NO_KEY:
+                continue
+            key = join_key(*message_key, legacy)
+            if 'latency_us' in row:
+                yield row['topic'], key, int(row['send_time_ns']), float(row['latency_us'])
+            else:
+                # files written before the nanosecond timestamps
+                yield row['topic'], key, int(float(row['send_time_ms'])) * 1_000_000, float(row['latency_ms']) * 1000
+
+
+def scan_receives(path, spill_dir, index, partitions, legacy):
+    """Spill the receives of a subscriber latency file, counting reordered messages on the way"""
+    subscriber, topic_filter = subscriber_info(path)
+    spill = Spill(spill_dir, f"recv-{index}", partitions)
+    latest_send = {}
+    reordered = {}
+    for topic, key, send_ns, latency_us in receive_rows(path, legacy):
+        # a message sent before one already received on the same topic arrived out of order
+        if send_ns < latest_send.get(topic, send_ns):
+            reordered[topic] = reordered.get(topic, 0) + 1
+        else:
+            latest_send[topic] = send_ns
+        spill.write(topic, key, subscriber, latency_us)
+    spill.close()
+    return {'kind': 'receives', 'path': path, 'subscriber': subscriber, 'filter': topic_filter, 'reordered': reordered}
+
 
-                if m := re.match(r'^Client ID:\s*(\S+)', line):
-                    c.id = m.group(1)
+def scan(task):
+    kind, path, spill_dir, index, partitions, legacy = task
+    if kind == 'sends':
+        return scan_sends(path, spill_dir, index, partitions, legacy)
+    return scan_receives(path, spill_dir, index, partitions, legacy)
+
+
+# end-to-end latency, and its split into client queueing, broker ack and delivery from the send ledger
+HISTOGRAMS = ('histogram', 'queueing', 'broker_ack', 'delivery')
+
+def new_stats():
+    stats = {'received': 0, 'duplicates': 0, 'unmatched': 0}
+    stats.update((name, LatencyHistogram()) for name in HISTOGRAMS)
+    return stats
+
+
+def join_partition(task):
+    """Match the receives of one partition with its sends, returns stats per (subscriber, topic)"""
+    spill_dir, index = task
+    # topic\tjoin key -> (queue_us, ack_us) as spilled by scan_sends
+    sends = {}
+    receive_spills = []
+    for entry in os.scandir(spill_dir):
+        if not entry.name.endswith(f"-{index}.tsv"):
+            continue
+        if entry.name.startswith('send-'):
+            with open(entry.path, encoding="utf-8") as f:
+                for line in f:
+                    topic, key, queue_us, ack_us = line.rstrip('\n').split('\t')
+                    sends[f"{topic}\t{key}"] = (queue_us, ack_us)
+        else:
+            receive_spills.append(entry.path)
+
+    stats = {}
+    seen = set()
+    for path in receive_spills:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                topic, message_key, subscriber, latency_us = line.rstrip('\n').split('\t')
+                entry = stats.get((subscriber, topic))
+                if entry is None:
+                    entry = stats[(subscriber, topic)] = new_stats()
+                key = (subscriber, topic, message_key)
+                if key in seen:
+                    entry['duplicates'] += 1
                     continue
-                
-                if m := re.match(r'^Topic:\s+(\S+)', line):
-                    c.topic = m.group(1)
+                seen.add(key)
+                send = sends.get(f"{topic}\t{message_key}")
+                if send is None:
+                    # received but in no send log, e.g. published by another tool
+                    entry['unmatched'] += 1
                     continue
+                entry['received'] += 1
+                entry['histogram'].record(float(latency_us))
+                queue_us, ack_us = send
+                if queue_us:
+                    # the payload timestamp is taken right before publish(), so what is left after client queueing is delivery
+                    entry['queueing'].record(float(queue_us))
+                    entry['delivery'].record(float(latency_us) - float(queue_us))
+                if ack_us:
+                    entry['broker_ack'].record(float(ack_us))
+    return {key: {name: value.to_dict() if name in HISTOGRAMS else value for name, value in row.items()} for key, row in stats.items()}
+
+
+def collect(logdir, jobs, partitions):
+    # the segments rotated out of a log by LOG_ROTATE_BYTES are read with it, oldest first
+    send_logs = [segment for path in sorted(f.path for f in os.scandir(logdir) if f.name.startswith('publisher-sends') and f.name.endswith('.csv'))
+                 for segment in latency_records.log_segments(path)]
+    # one latency file per subscriber, the binary one if both sinks were enabled
+    latency_files = {}
+    for f in sorted(os.scandir(logdir), key=lambda f: f.name):
+        if f.name.startswith('subscriber-') and (f.name.endswith('.latency.csv') or f.name.endswith('.latency.bin')):
+            subscriber = f.name.split('.latency.')[0]
+            if subscriber not in latency_files or f.name.endswith('.bin'):
+                latency_files[subscriber] = f.path
+    latency_files = sorted(latency_files.values())
+    legacy = any(path.endswith('.bin') and 'prefix' not in dict(latency_records.record_fields(path)) for path in latency_files)
+    if legacy:
+        print("Warning: version 1 .latency.bin files only hold the sequence number of the message ids, messages of different publisher processes may be matched with each other")
+    spill_dir = tempfile.mkdtemp(prefix='collector-')
+    try:
+        tasks = [('sends', path, spill_dir, index, partitions, legacy) for index, path in enumerate(send_logs)]
+        tasks += [('receives', path, spill_dir, len(send_logs) + index, partitions, legacy) for index, path in enumerate(latency_files)]
+        with multiprocessing.Pool(jobs) as pool:
+            scans = pool.map(scan, tasks)
+            joins = pool.imap_unordered(join_partition, [(spill_dir, index) for index in range(partitions)])
+            rows = merge_joins(joins)
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    sent = {}
+    subscribers = {}
+    for result in scans:
+        if result['kind'] == 'sends':
+            for topic, count in result['sent'].items():
+                sent[topic] = sent.get(topic, 0) + count
+        else:
+            subscribers[result['subscriber']] = result
+
+    # every topic a subscriber's filter matches is expected, even if none of its messages arrived
+    trie = TopicTrie()
+    for subscriber, result in subscribers.items():
+        if result['filter'] is not None:
+            trie.add(result['filter'], subscriber)
+    for topic in sent:
+        for subscriber in trie.subscribers(topic):
+            if (subscriber, topic) not in rows:
+                rows[(subscriber, topic)] = new_stats()
+    # topics that reached at least one of the subscribers expecting them
+    delivered = {topic for (subscriber, topic), row in rows.items() if row['received'] and subscriber in trie.subscribers(topic)}
+
+    report = []
+    for (subscriber, topic), row in sorted(rows.items()):
+        histogram = row['histogram']
+        # without a known filter every message received is taken as expected
+        matched = subscribers.get(subscriber, {}).get('filter') is None or subscriber in trie.subscribers(topic)
+        expected = sent.get(topic, 0) if matched else 0
+        report.append({
+            'subscriber': subscriber,
+            'topic': topic,
+            'sent': sent.get(topic, 0),
+            'expected': expected,
+            'received': row['received'],
+            'lost': max(expected - row['received'], 0),
+            'delivery_ratio': row['received'] / expected if expected else None,
+            # none of the messages arrived while other subscribers got the topic, which looks like a policy drop rather than loss
+            'filtered': matched and expected > 0 and not row['received'] and topic in delivered,
+            'duplicates': row['duplicates'],
+            'reordered': subscribers.get(subscriber, {}).get('reordered', {}).get(topic, 0),
+            'unmatched': row['unmatched'],
+            'latency_p50_us': histogram.percentile(50),
+            'latency_p99_us': histogram.percentile(99),
+            'latency_max_us': histogram.max,
+            'queueing_p50_us': row['queueing'].percentile(50),
+            'queueing_p99_us': row['queueing'].percentile(99),
+            'broker_ack_p50_us': row['broker_ack'].percentile(50),
+            'broker_ack_p99_us': row['broker_ack'].percentile(99),
+            'delivery_p50_us': row['delivery'].percentile(50),
+            'delivery_p99_us': row['delivery'].percentile(99)
+        })
+    return sent, report
+
+
+def merge_joins(joins):
+    """Add up the stats of all partitions per (subscriber, topic)"""
+    rows = {}
+    for stats in joins:
+        for key, value in stats.items():
+            value = {name: LatencyHistogram.from_dict(item) if name in HISTOGRAMS else item for name, item in value.items()}
+            row = rows.get(key)
+            if row is None:
+                rows[key] = value
+                continue
+            for name in ('received', 'duplicates', 'unmatched'):
+                row[name] += value[name]
+            for name in HISTOGRAMS:
+                row[name].merge(value[name])
+    return rows
+
+
+def print_completeness(report):
+    """Share of the expected deliveries that arrived, with the subscriber/topic pairs that look filtered rather than lost"""
+    expected = sum(row['expected'] for row in report)
+    if not expected:
+        return
+    received = sum(min(row['received'], row['expected']) for row in report)
+    filtered = [row for row in report if row['filtered']]
+    filtered_messages = sum(row['expected'] for row in filtered)
+    print()
+    print(f"Delivery completeness: {received} of {expected} expected messages received ({received / expected * 100:.2f}%), "
+          f"{expected - received - filtered_messages} lost")
+    if filtered:
+        print(f"{filtered_messages} messages of {len(filtered)} subscriber/topic pairs never arrived while other subscribers got them, "
+              f"filtered by a policy rather than lost:")
+        for row in filtered:
+            print(f"  {row['subscriber']:40} {row['topic']}")
+    unexpected = [row for row in report if row['received'] and not row['expected']]
+    if unexpected:
+        print(f"{sum(row['received'] for row in unexpected)} messages were received on topics outside the subscriber's filter:")
+        for row in unexpected:
+            print(f"  {row['subscriber']:40} {row['topic']}")
+
+
+def number(value, digits=1):
+    return '-' if value is None else f'{value:.{digits}f}'
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(prog='collector', description='collect experiment simulator output and summarize')
+    ap.add_argument('-l', '--logdir', default='~/Downloads/mqtt-logs', help='directory containing the publisher send logs and subscriber latency files')
+    ap.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of files or partitions processed in parallel')
+    ap.add_argument('-P', '--partitions', type=int, default=64, help='number of partitions the records are joined in, more partitions use less memory')
+    ap.add_argument('-o', '--output', default=None, help='also write the report to this CSV file')
+    opts = ap.parse_args()
+
+    sent, report = collect(os.path.expanduser(opts.logdir), opts.jobs, opts.partitions)
 
-                if m := re.match(r'^\[(\d+-\d+-\d+\s+\d+:\d+:\d+)\]\s+(.*)$', line):
-                    timestamp = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
-                    event = m.group(2)
-                    if event.startswith('Connected'):
-                        c.connected = timestamp
-                        continue
-
-                    if m := re.match(r"Received on '(.*?)' for", event):
-                        collect_to = MessagePayload(timestamp, m.group(1))
-                        c.data.append(collect_to)
-                        continue
-
-print(f'Published Topics: {len(publish_events)}')
-for pub in sorted(publish_events.keys()):
-    print(f'{pub:25} {len(publish_events[pub]):5}')
-print()
-
-print(f'Subscribers Reporting: {len(clients)}')
-for client in clients:
-    count={}
-    blen={}
-    print(f'{client.id:40} {client.topic:25} {len(client.data):5} {client.connected}') 
-    for d in client.data:
-        count[d.topic] = count.get(d.topic,0) + 1
-        blen[d.topic] = blen.get(d.topic, 0) + len(d.data)
-    for t in sorted(count.keys()):
-        print(f'                                         {t:25} {count[t]:5}, {blen[t]} bytes')
+    print(f'Published Topics: {len(sent)}')
+    for topic in sorted(sent):
+        print(f'{topic:25} {sent[topic]:8}')
+    print()
 
+    print(f'{"Subscriber":40} {"Topic":25} {"Sent":>8} {"Received":>8} {"Lost":>6} {"Delivery":>9} {"Dup":>5} {"Reorder":>7} {"p50 (us)":>10} {"p99 (us)":>10} {"max (us)":>10}')
+    for row in report:
+        ratio = '-' if row['delivery_ratio'] is None else f"{row['delivery_ratio'] * 100:.1f}%"
+        print(f"{row['subscriber']:40} {row['topic']:25} {row['sent']:8} {row['received']:8} {row['lost']:6} {ratio:>9} {row['duplicates']:5} {row['reordered']:7} "
+              f"{number(row['latency_p50_us']):>10} {number(row['latency_p99_us']):>10} {number(row['latency_max_us'], 0):>10}")
+    if any(row['queueing_p50_us'] is not None for row in report):
+        print()
+        print(f'{"Subscriber":40} {"Topic":25} {"Queue p50":>10} {"Queue p99":>10} {"Ack p50":>10} {"Ack p99":>10} {"Deliv p50":>10} {"Deliv p99":>10}  (us)')
+        for row in report:
+            print(f"{row['subscriber']:40} {row['topic']:25} {number(row['queueing_p50_us']):>10} {number(row['queueing_p99_us']):>10} "
+                  f"{number(row['broker_ack_p50_us']):>10} {number(row['broker_ack_p99_us']):>10} {number(row['delivery_p50_us']):>10} {number(row['delivery_p99_us']):>10}")
+    print_completeness(report)
+    unmatched = sum(row['unmatched'] for row in report)
+    if unmatched:
+        print(f'{unmatched} received messages are missing from the publisher send logs')
 
+    if opts.output:
+        with open(opts.output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(report[0].keys()) if report else ['subscriber', 'topic'])
+            writer.writeheader()
+            writer.writerows(report)
@@ -0,0 +1,20 @@
+# The simulator modules import each other as flat modules, as when main.py runs from clients/simulate.
+
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'clients' / 'simulate'))
+sys.path.insert(0, str(ROOT / 'tools'))
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def broker_port():
+    """Port of a MiniBroker running for one test, for the clients that need a real connection"""
+    from mini_broker import MiniBroker
+    broker = MiniBroker()
+    port = broker.start()
+    yield port
+    broker.stop()
@@ -0,0 +1,83 @@
+import pytest
+from collector import collect
+from latency_records import RECORD, TopicDictionary, message_key, topics_file
+from send_ledger import SendLedger
+
+PREFIX = '0123456789ab'
+TOPIC = 'site/1'
+LATENCY_HEADER = "timestamp,topic,message_id,send_time_ns,receive_time_ns,latency_us,clock_error_us\n"
+
+
+def send_ns(seq):
+    return seq * 1_000_000_000
+
+
+def message_id(seq):
+    return f"{PREFIX}-{seq}"
+
+
+def write_sends(path, seqs, without_id=0):
+    rows = [f"{message_id(seq)},{TOPIC},{seq},1,10,{send_ns(seq)},{send_ns(seq) + 1000},{send_ns(seq) + 3000}" for seq in seqs]
+    rows += [f"None,{TOPIC},0,1,10,1,,"] * without_id
+    path.write_text(SendLedger.HEADER + ''.join(row + '\n' for row in rows))
+
+
+def write_subscriber_log(logdir, name, topic_filter):
+    (logdir / f"{name}.log").write_text(f"=== MQTT Subscriber Log: {name} ===\nTopic: {topic_filter}\n\n")
+
+
+def write_latency_csv(path, ids):
+    rows = [f"2026-01-01 00:00:00.000,{TOPIC},{id},{send_ns(seq)},{send_ns(seq) + 5000},5.0,0" for id, seq in ids]
+    path.write_text(LATENCY_HEADER + ''.join(row + '\n' for row in rows))
+
+
+def write_latency_bin(path, topics, ids):
+    path.write_bytes(b''.join(RECORD.pack(topics.id(TOPIC), *message_key(id), send_ns(seq), send_ns(seq) + 7000, 10) for id, seq in ids))
+
+
+@pytest.fixture
+def logdir(tmp_path):
+    # sends 1 to 3 were rotated out of the send log, one more message was published without an id
+    write_sends(tmp_path / 'publisher-sends.csv.1', [1, 2, 3])
+    write_sends(tmp_path / 'publisher-sends.csv', [4, 5], without_id=1)
+
+    # 4 arrives before 3, 2 twice, 5 never, and two messages carry no id
+    write_subscriber_log(tmp_path, 'subscriber-csv-0', 'site/#')
+    write_latency_csv(tmp_path / 'subscriber-csv-0.latency.csv.1', [(message_id(1), 1), (message_id(2), 2)])
+    write_latency_csv(tmp_path / 'subscriber-csv-0.latency.csv', [(message_id(2), 2), (message_id(4), 4), (message_id(3), 3), ('N/A', 0), ('N/A', 0)])
+
+    # 4 never arrives, 5 twice, and two messages carry no id
+    write_subscriber_log(tmp_path, 'subscriber-bin-0', 'site/+')
+    topics = TopicDictionary(topics_file(str(tmp_path / 'subscriber-bin-0.latency.bin')))
+    write_latency_bin(tmp_path / 'subscriber-bin-0.latency.bin.1', topics, [(message_id(1), 1), (message_id(2), 2), ('N/A', 0)])
+    write_latency_bin(tmp_path / 'subscriber-bin-0.latency.bin', topics, [(message_id(3), 3), (message_id(5), 5), (message_id(5), 5), ('', 0)])
+    return tmp_path
+
+
+def test_collect(logdir):
+    sent, report = collect(str(logdir), 1, 4)
+    assert sent == {TOPIC: 5}
+    rows = {row['subscriber']: row for row in report}
+    assert set(rows) == {'subscriber-csv-0', 'subscriber-bin-0'}
+
+    csv_row = rows['subscriber-csv-0']
+    assert (csv_row['sent'], csv_row['received'], csv_row['lost']) == (5, 4, 1)
+    assert (csv_row['duplicates'], csv_row['reordered'], csv_row['unmatched']) == (1, 1, 0)
+    assert csv_row['latency_p50_us'] == pytest.approx(5.0)
+    # 1us of client queueing in the send ledger, the rest of the latency is delivery
+    assert csv_row['queueing_p50_us'] == pytest.approx(1.0)
+    assert csv_row['broker_ack_p50_us'] == pytest.approx(2.0)
+    assert csv_row['delivery_p50_us'] == pytest.approx(4.0)
+
+    bin_row = rows['subscriber-bin-0']
+    assert (bin_row['sent'], bin_row['received'], bin_row['lost']) == (5, 4, 1)
+    assert (bin_row['duplicates'], bin_row['reordered'], bin_row['unmatched']) == (1, 0, 0)
+    assert bin_row['latency_p50_us'] == pytest.approx(7.0)
+
+
+def test_receives_missing_from_the_send_logs(logdir):
+    (logdir / 'publisher-sends.csv.1').unlink()
+    _, report = collect(str(logdir), 1, 4)
+    rows = {row['subscriber']: row for row in report}
+    assert (rows['subscriber-csv-0']['received'], rows['subscriber-csv-0']['unmatched']) == (1, 3)
+    assert (rows['subscriber-bin-0']['received'], rows['subscriber-bin-0']['unmatched']) == (1, 3)
@@ -0,0 +1,118 @@
+import json
+import os
+import pytest
+import config_compiler
+from config_compiler import cache_path, compile_config, load_config
+
+TOPIC = {'TYPE': 'multiple', 'PREFIX': 'site', 'RANGE_START': 1, 'RANGE_END': 3,
+         'DATA': [{'NAME': 'level', 'TYPE': 'float', 'MIN_VALUE': 0, 'MAX_VALUE': 1, 'MAX_STEP': 0.1}]}
+SUBSCRIBER = {'TOPIC': 'site/+', 'NUMBER': 2, 'USERS': [None, None], 'PASSWORDS': [None, None]}
+
+
+def settings(**changes):
+    config = {'BROKER_URL': 'localhost', 'BROKER_PORT': 1883, 'TOPICS': [dict(TOPIC)], 'SUBSCRIBERS': [dict(SUBSCRIBER)]}
+    config.update(changes)
+    return config
+
+
+def test_topics_are_expanded():
+    compiled = compile_config(settings(TOPICS=[TOPIC, {'TYPE': 'list', 'PREFIX': 'room', 'LIST': ['a', 'b'], 'DATA': []},
+                                               {'TYPE': 'single', 'PREFIX': 'one', 'DATA': []}]))
+    assert [entry.urls for entry in compiled.topics] == [['site/1', 'site/2', 'site/3'], ['room/a', 'room/b'], ['one']]
+    assert [spec.name for spec in compiled.topics[0].data_specs] == ['level']
+
+
+@pytest.mark.parametrize('config, error, message', [
+    ([], ValueError, 'must hold an object'),
+    (settings(BROKER_PORT='1883'), ValueError, 'BROKER_PORT'),
+    (settings(TIME_INTERVAL=True), ValueError, 'TIME_INTERVAL'),
+    (settings(TOPICS=[dict(TOPIC, TYPE='range')]), NameError, "TOPICS[0]: Topic TYPE 'range'"),
+    (settings(TOPICS=[TOPIC, dict(TOPIC, RANGE_END=None)]), ValueError, 'TOPICS[1]: RANGE_END'),
+    (settings(TOPICS=[{k: v for k, v in TOPIC.items() if k != 'DATA'}]), ValueError, 'TOPICS[0]: DATA is required'),
+    (settings(TOPICS=[dict(TOPIC, QOS='1')]), ValueError, 'TOPICS[0]: QOS'),
+    (settings(TOPICS=[dict(TOPIC, DATA=TOPIC['DATA'] * 2)]), ValueError, 'DATA NAMEs must be unique'),
+    (settings(TOPICS=[dict(TOPIC, DATA=[{'NAME': 'x', 'TYPE': 'complex'}])]), NameError, "TOPICS[0].DATA[0]: Data TYPE 'complex'"),
+    (settings(TOPICS=[dict(TOPIC, DATA=[{'NAME': 'x', 'TYPE': 'int', 'MIN_VALUE': 2, 'MAX_VALUE': 1, 'MAX_STEP': 1}])]), ValueError, 'TOPICS[0].DATA[0]: MIN_VALUE'),
+    (settings(SUBSCRIBERS=[dict(SUBSCRIBER, TOPIC='site/#/x')]), ValueError, 'not a valid filter'),
+    (settings(SUBSCRIBERS=[dict(SUBSCRIBER, TOPIC='site/a+')]), ValueError, 'not a valid filter'),
+    (settings(SUBSCRIBERS=[dict(SUBSCRIBER, NUMBER=3)]), ValueError, 'SUBSCRIBERS[0]: USERS has fewer entries'),
+    (settings(SUBSCRIBERS=[{k: v for k, v in SUBSCRIBER.items() if k != 'PASSWORDS'}]), ValueError, 'SUBSCRIBERS[0]: PASSWORDS is required')
+])
+def test_invalid_settings(config, error, message):
+    with pytest.raises(error) as raised:
+        compile_config(config)
+    assert message in str(raised.value)
+
+
+@pytest.fixture
+def compiles(monkeypatch):
+    """Count the compiles of load_config, the ones not answered from the cache"""
+    calls = []
+
+    def counting(config, digest=None):
+        calls.append(digest)
+        return compile_config(config, digest)
+    monkeypatch.setattr(config_compiler, 'compile_config', counting)
+    return calls
+
+
+def write_settings(path, config):
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_cache_is_used_while_the_file_is_unchanged(tmp_path, compiles):
+    settings_file = write_settings(tmp_path / 'settings.json', settings())
+    first = load_config(settings_file)
+    assert os.path.exists(cache_path(settings_file))
+    second = load_config(settings_file)
+    assert len(compiles) == 1
+    assert second.digest == first.digest
+    assert [entry.urls for entry in second.topics] == [entry.urls for entry in first.topics]
+
+
+def test_changed_file_is_compiled_again(tmp_path, compiles):
+    settings_file = write_settings(tmp_path / 'settings.json', settings())
+    load_config(settings_file)
+    write_settings(tmp_path / 'settings.json', settings(TOPICS=[dict(TOPIC, RANGE_END=5)]))
+    compiled = load_config(settings_file)
+    assert len(compiles) == 2 and compiles[0] != compiles[1]
+    assert compiled.topics[0].urls[-1] == 'site/5'
+    # the cache now holds the new version
+    load_config(settings_file)
+    assert len(compiles) == 2
+
+
+def test_invalid_change_is_not_hidden_by_the_cache(tmp_path):
+    settings_file = write_settings(tmp_path / 'settings.json', settings())
+    load_config(settings_file)
+    write_settings(tmp_path / 'settings.json', settings(BROKER_PORT='x'))
+    with pytest.raises(ValueError):
+        load_config(settings_file)
+
+
+def test_compiler_version_invalidates_the_cache(tmp_path, compiles, monkeypatch):
+    settings_file = write_settings(tmp_path / 'settings.json', settings())
+    load_config(settings_file)
+    monkeypatch.setattr(config_compiler, 'COMPILER_VERSION', config_compiler.COMPILER_VERSION + 1)
+    load_config(settings_file)
+    assert len(compiles) == 2
+
+
+def test_unreadable_cache_is_replaced(tmp_path, compiles, capsys):
+    settings_file = write_settings(tmp_path / 'settings.json', settings())
+    load_config(settings_file)
+    with open(cache_path(settings_file), 'wb') as f:
+        f.write(b'not a pickle')
+    assert load_config(settings_file).topics[0].urls == ['site/1', 'site/2', 'site/3']
+    assert 'Ignoring the config cache' in capsys.readouterr().out
+    load_config(settings_file)
+    assert len(compiles) == 2
+
+
+def test_cache_can_be_disabled(tmp_path, compiles):
+    settings_file = write_settings(tmp_path / 'settings.json', settings(CONFIG_CACHE=False))
+    load_config(settings_file)
+    load_config(settings_file)
+    assert not os.path.exists(cache_path(settings_file))
+    assert len(compiles) == 2
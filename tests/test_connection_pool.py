@@ -0,0 +1,115 @@
+import zlib
+import pytest
+from connection_pool import ConnectionPool
+from data_classes import BrokerSettings
+
+
+class FakeTopic:
+    def __init__(self, topic_url):
+        self.topic_url = topic_url
+        self.connection = None
+        self.acks = []
+
+    def on_publish(self, client, userdata, mid):
+        self.acks.append(mid)
+
+
+class FakeInfo:
+    def __init__(self, mid):
+        self.mid = mid
+
+
+class FakeClient:
+    """Hands out mids like paho, and can acknowledge a message before publish() returns as paho's network thread may"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.mid = 0
+        self.ack_during_publish = False
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.mid += 1
+        if self.ack_during_publish:
+            self.connection.on_publish(self, None, self.mid)
+        return FakeInfo(self.mid)
+
+
+def pool(size, assignment='round_robin'):
+    return ConnectionPool(BrokerSettings('localhost', 1883, 4), size, assignment)
+
+
+def open_with_fake_client(connection):
+    connection.client = FakeClient(connection)
+    return connection.client
+
+
+def test_unknown_assignment():
+    with pytest.raises(NameError):
+        pool(2, 'random')
+
+
+def test_round_robin():
+    connection_pool = pool(3)
+    topics = [FakeTopic(f"t/{index}") for index in range(7)]
+    for topic in topics:
+        connection_pool.assign(topic)
+    assert [connection_pool.connections.index(topic.connection) for topic in topics] == [0, 1, 2, 0, 1, 2, 0]
+    assert [len(connection.topics) for connection in connection_pool.connections] == [3, 2, 2]
+
+
+def test_hash_assignment_is_stable():
+    topics = [FakeTopic(f"t/{index}") for index in range(20)]
+    first, second = pool(4, 'hash'), pool(4, 'hash')
+    expected = [zlib.crc32(topic.topic_url.encode('utf-8')) % 4 for topic in topics]
+    assert [first.connections.index(first.assign(topic)) for topic in topics] == expected
+    # the same topic goes to the same connection whatever the order of the assignments
+    assert [second.connections.index(second.assign(topic)) for topic in reversed(topics)] == expected[::-1]
+
+
+def test_client_ids_are_unique():
+    assert len({connection.client_id for connection in pool(5).connections}) == 5
+
+
+def test_acks_are_routed_to_the_topic_of_their_mid():
+    connection_pool = pool(1)
+    first, second = FakeTopic('t/1'), FakeTopic('t/2')
+    connection = connection_pool.assign(first)
+    connection_pool.assign(second)
+    client = open_with_fake_client(connection)
+    assert connection.publish(first, b'a', 1, False) == 1
+    assert connection.publish(second, b'b', 1, False) == 2
+    assert connection.publish(first, b'c', 1, False) == 3
+    assert connection.inflight_count == 3
+    for mid in (2, 3, 1):
+        connection.on_publish(client, None, mid)
+    assert (first.acks, second.acks) == ([3, 1], [2])
+    assert (connection.published, connection.acks, connection.inflight_count) == (3, 3, 0)
+
+
+def test_ack_before_publish_returned():
+    connection_pool = pool(1)
+    topic = FakeTopic('t/1')
+    connection = connection_pool.assign(topic)
+    client = open_with_fake_client(connection)
+    client.ack_during_publish = True
+    assert connection.publish(topic, b'a', 0, False) == 1
+    assert topic.acks == [1]
+    assert (connection.acks, connection.inflight_count, connection.early_acks) == (1, 0, set())
+
+
+def test_publish_on_a_closed_connection():
+    connection_pool = pool(1)
+    topic = FakeTopic('t/1')
+    connection = connection_pool.assign(topic)
+    assert connection.publish(topic, b'a', 1, False) is None
+    assert connection.published == 0
+
+
+def test_unopened():
+    connection_pool = pool(2)
+    topics = [FakeTopic(f"t/{index}") for index in range(4)]
+    for topic in topics:
+        connection_pool.assign(topic)
+    assert connection_pool.unopened(topics) == connection_pool.connections
+    open_with_fake_client(connection_pool.connections[0])
+    assert connection_pool.unopened(topics) == connection_pool.connections[1:]
+    assert connection_pool.unopened(topics[:1]) == []
@@ -0,0 +1,74 @@
+import pytest
+from deadline_schedule import DeadlineSchedule
+
+
+def test_unknown_policy():
+    with pytest.raises(NameError):
+        DeadlineSchedule(1.0, 'later')
+
+
+def test_on_time_ticks_do_not_drift():
+    schedule = DeadlineSchedule(1.0)
+    schedule.start(100.0)
+    # every send is a little late, the deadlines stay on the grid anyway
+    for tick in range(5):
+        now = 100.0 + tick + 0.3
+        assert schedule.fire(now) == 100.0 + tick
+        schedule.record_send(100.0 + tick, now)
+    assert schedule.deadline == 105.0
+    assert schedule.missed == 0
+    assert schedule.sends == 5
+    assert schedule.lag_mean == pytest.approx(0.3)
+
+
+def test_catch_up_sends_every_missed_tick():
+    schedule = DeadlineSchedule(1.0, 'catch_up')
+    schedule.start(0.0)
+    # 3.5s late: the tick at 0 and the three after it are all sent back to back
+    assert [schedule.fire(3.5) for _ in range(4)] == [0.0, 1.0, 2.0, 3.0]
+    assert schedule.deadline == 4.0
+    assert schedule.missed == 0
+
+
+def test_skip_drops_overdue_ticks():
+    schedule = DeadlineSchedule(1.0, 'skip')
+    schedule.start(0.0)
+    assert schedule.fire(3.5) is None
+    assert schedule.deadline == 4.0
+    assert schedule.missed == 4
+    assert schedule.fire(4.0) == 4.0
+
+
+def test_coalesce_sends_once_for_missed_ticks():
+    schedule = DeadlineSchedule(1.0, 'coalesce')
+    schedule.start(0.0)
+    assert schedule.fire(3.5) == 3.0
+    assert schedule.deadline == 4.0
+    assert schedule.missed == 3
+
+
+@pytest.mark.parametrize('policy', DeadlineSchedule.POLICIES)
+def test_late_within_one_interval_is_not_missed(policy):
+    schedule = DeadlineSchedule(1.0, policy)
+    schedule.start(0.0)
+    assert schedule.fire(0.99) == 0.0
+    assert schedule.deadline == 1.0
+    assert schedule.missed == 0
+
+
+def test_zero_interval_never_misses():
+    schedule = DeadlineSchedule(0, 'skip')
+    schedule.start(0.0)
+    assert schedule.fire(10.0) == 0.0
+    assert schedule.missed == 0
+
+
+def test_lag():
+    schedule = DeadlineSchedule(1.0)
+    schedule.record_send(1.0, 1.5)
+    schedule.record_send(2.0, 2.1)
+    # sent before the deadline counts as no lag
+    schedule.record_send(3.0, 2.9)
+    assert schedule.lag_max == pytest.approx(0.5)
+    assert schedule.lag_last == 0.0
+    assert schedule.lag_mean == pytest.approx(0.2)
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from latency_histogram import LatencyHistogram, merge_by_topic
+
+
+def histogram_of(values, precision=2):
+    histogram = LatencyHistogram(precision)
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_zero():
+    histogram = LatencyHistogram()
+    assert histogram.index(0) == 0
+    assert histogram.bucket_range(0) == (0, 0)
+    histogram.record(0)
+    assert histogram.percentile(50) == 0
+    assert histogram.min == histogram.max == 0
+
+
+def test_empty():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) is None
+    assert histogram.mean is None
+
+
+def test_small_values_have_a_bucket_each():
+    histogram = LatencyHistogram()
+    for value in range(histogram.sub_bucket_count):
+        assert histogram.index(value) == value
+        assert histogram.bucket_range(value) == (value, value)
+
+
+@pytest.mark.parametrize('precision', [1, 2, 3])
+def test_sub_bucket_edges(precision):
+    histogram = LatencyHistogram(precision)
+    count = histogram.sub_bucket_count
+    edges = [count - 1, count, count + 1, 2 * count - 1, 2 * count, 2 * count + 1, 4 * count - 1, 4 * count]
+    for value in edges:
+        lowest, highest = histogram.bucket_range(histogram.index(value))
+        assert lowest <= value <= highest
+    # the first bucket above the linear ones starts right after them
+    assert histogram.bucket_range(histogram.index(count)) == (count, count + 1)
+
+
+@pytest.mark.parametrize('precision', [1, 2, 3])
+def test_buckets_are_contiguous_and_within_precision(precision):
+    histogram = LatencyHistogram(precision)
+    index = 0
+    previous_highest = -1
+    while previous_highest < 1 << 24:
+        lowest, highest = histogram.bucket_range(index)
+        assert lowest == previous_highest + 1
+        assert histogram.index(lowest) == histogram.index(highest) == index
+        assert (highest - lowest) / max(lowest, 1) < 10 ** -precision
+        previous_highest = highest
+        index += 1
+
+
+def test_max_value():
+    histogram = LatencyHistogram()
+    for value in (2 ** 40, 2 ** 53 - 1, 2 ** 62):
+        lowest, highest = histogram.bucket_range(histogram.index(value))
+        assert lowest <= value <= highest
+    histogram.record(2 ** 53 - 1)
+    assert histogram.max == 2 ** 53 - 1
+    assert histogram.percentile(100) == 2 ** 53 - 1
+
+
+def test_negative_values_count_as_zero():
+    histogram = histogram_of([-5, -1, 3])
+    assert histogram.negative == 2
+    assert histogram.min == 0
+    assert histogram.count == 3
+
+
+def test_record_array_agrees_with_record():
+    values = np.concatenate([np.arange(0, 1000), np.random.default_rng(1).lognormal(8, 2, 10000), [-3.5, 2 ** 40]])
+    one_by_one = histogram_of(values)
+    at_once = LatencyHistogram()
+    at_once.record_array(values)
+    assert at_once.to_dict() == one_by_one.to_dict()
+
+
+def test_merge():
+    rng = np.random.default_rng(2)
+    first, second = rng.lognormal(6, 1, 5000), rng.lognormal(9, 1, 3000)
+    merged = histogram_of(first).merge(histogram_of(second))
+    assert merged.to_dict() == histogram_of(np.concatenate([first, second])).to_dict()
+    assert merged.count == 8000
+
+
+def test_merge_into_empty():
+    merged = LatencyHistogram().merge(histogram_of([5, 500, 50000]))
+    assert (merged.min, merged.max, merged.count) == (5, 50000, 3)
+
+
+def test_merge_different_precision():
+    with pytest.raises(ValueError):
+        LatencyHistogram(2).merge(LatencyHistogram(3))
+
+
+def test_dict_round_trip():
+    histogram = histogram_of([-1, 0, 17, 300, 123456])
+    assert LatencyHistogram.from_dict(histogram.to_dict()).to_dict() == histogram.to_dict()
+    merged = merge_by_topic({'a': histogram.to_dict()}, merge_by_topic({'a': histogram.to_dict()}))
+    assert merged['a'].count == 2 * histogram.count
+
+
+@pytest.mark.parametrize('precision', [1, 2, 3])
+@pytest.mark.parametrize('percentile', [50, 90, 99, 99.9])
+def test_percentiles_against_numpy(precision, percentile):
+    values = np.floor(np.random.default_rng(3).lognormal(7, 1.5, 20000))
+    histogram = LatencyHistogram(precision)
+    histogram.record_array(values)
+    # the histogram ranks like numpy's inverted_cdf, its value is the middle of the bucket holding that rank
+    expected = np.percentile(values, percentile, method='inverted_cdf')
+    assert histogram.percentile(percentile) == pytest.approx(expected, rel=10 ** -precision)
+
+
+def test_cumulative_counts():
+    histogram = histogram_of([10, 100, 1000, 10000])
+    # a bucket counts for a bound once all of its values are below it
+    top_of_1000 = histogram.bucket_range(histogram.index(1000))[1]
+    assert histogram.cumulative_counts([10, 1000, top_of_1000, 100000]) == [1, 2, 3, 4]
@@ -0,0 +1,54 @@
+import json
+import struct
+import uuid
+import latency_records
+from collector import join_key
+from latency_records import RECORD, TopicDictionary, message_key, read_dataframe, read_records, topics_file
+from payload_encoder import MessageIdGenerator
+
+# the records written before the message id prefix was added
+RECORD_V1 = struct.Struct('<IQqqI')
+
+
+def test_counter_ids_of_different_processes_differ():
+    first, second = MessageIdGenerator('counter'), MessageIdGenerator('counter')
+    first_key, second_key = message_key(first.next_id()), message_key(second.next_id())
+    # both processes start counting at the same number, only their prefixes tell them apart
+    assert first_key[1] == second_key[1]
+    assert first_key != second_key
+    assert join_key(*first_key) != join_key(*second_key)
+    assert join_key(*first_key, legacy=True) == join_key(*second_key, legacy=True)
+
+
+def test_uuid4_key_keeps_all_bits():
+    message_id = uuid.uuid4()
+    prefix, seq = message_key(str(message_id))
+    assert (prefix << 64) | seq == message_id.int
+
+
+def test_other_ids():
+    assert message_key('') == (0, 0)
+    assert message_key('not-an-id') == (0, 0)
+
+
+def test_records_round_trip(tmp_path):
+    path = tmp_path / 'subscriber-x-0.latency.bin'
+    topics = TopicDictionary(topics_file(str(path)))
+    key = message_key('0123456789ab-42')
+    path.write_bytes(RECORD.pack(topics.id('a/b'), *key, 1_000_000, 3_000_000, 10))
+    records = read_records(str(path))
+    assert (records['prefix'][0], records['seq'][0]) == key
+    frame = read_dataframe(str(path))
+    assert frame['message_prefix'][0] == 0x0123456789ab
+    assert frame['latency_ms'][0] == 2
+
+
+def test_version_1_records_are_read(tmp_path):
+    path = tmp_path / 'subscriber-x-0.latency.bin'
+    fields = [field for field in latency_records.RECORD_FIELDS if field[0] != 'prefix']
+    with open(topics_file(str(path)), 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'fields': fields, 'topics': ['a/b']}, f)
+    path.write_bytes(b''.join(RECORD_V1.pack(0, seq, 0, 1000, 5) for seq in range(3)))
+    assert list(read_records(str(path))['seq']) == [0, 1, 2]
+    assert 'message_prefix' not in read_dataframe(str(path))
+
@@ -0,0 +1,110 @@
+import json
+import pytest
+from payload_encoder import SERIALIZERS, MessageIdGenerator, PayloadEncoder
+from topic_data import TopicDataBool, TopicDataNumber, TopicDataRawValue
+
+DATA = [
+    {'NAME': 'temperature', 'TYPE': 'float', 'MIN_VALUE': 20.5, 'MAX_VALUE': 20.5, 'MAX_STEP': 0},
+    {'NAME': 'count', 'TYPE': 'int', 'MIN_VALUE': 7, 'MAX_VALUE': 7, 'MAX_STEP': 0},
+    {'NAME': 'on', 'TYPE': 'bool', 'INITIAL_VALUE': True}
+]
+
+
+def topic_data(data=DATA):
+    classes = {'float': TopicDataNumber, 'int': TopicDataNumber, 'bool': TopicDataBool, 'raw_values': TopicDataRawValue}
+    return [classes[item['TYPE']](item) for item in data]
+
+
+def encoder(payload_root=None, data=DATA, **metadata):
+    metadata.setdefault('message_id_mode', 'counter')
+    return PayloadEncoder(payload_root or {}, data, metadata)
+
+
+def test_template_payload():
+    payload_encoder = encoder({'site': 'a', 'nested': {'x': [1, 2]}})
+    assert payload_encoder.use_template
+    payload = json.loads(payload_encoder.encode(topic_data()))
+    assert list(payload) == ['site', 'nested', 'temperature', 'count', 'on', '_message_id', '_timestamp', '_timestamp_ns']
+    assert payload['nested'] == {'x': [1, 2]}
+    assert (payload['temperature'], payload['count'], payload['on']) == (20.5, 7, True)
+    assert payload['_message_id'] == payload_encoder.message_id
+    assert payload['_timestamp_ns'] == payload_encoder.timestamp_ns
+    assert payload['_timestamp'] == payload['_timestamp_ns'] // 1_000_000
+
+
+def test_template_matches_dict_path():
+    root = {'site': 'a"b', 'unicode': 'é'}
+    payload_encoder = encoder(root)
+    data = topic_data()
+    from_template = json.loads(payload_encoder.encode(data))
+    from_dict = payload_encoder.build_dict(topic_data())
+    # only the generated metadata differs between two payloads
+    for key in ('_message_id', '_timestamp', '_timestamp_ns'):
+        del from_template[key], from_dict[key]
+    assert list(from_template.items()) == list(from_dict.items())
+
+
+def test_generated_field_replacing_a_root_key_keeps_its_position():
+    payload_encoder = encoder({'count': 0, 'site': 'a'})
+    assert not payload_encoder.use_template
+    payload = json.loads(payload_encoder.encode(topic_data()))
+    assert list(payload)[:3] == ['count', 'site', 'temperature']
+    assert payload['count'] == 7
+
+
+def test_metadata_can_be_left_out():
+    payload_encoder = encoder(include_message_id=False, include_timestamp=False)
+    assert json.loads(payload_encoder.encode(topic_data())) == {'temperature': 20.5, 'count': 7, 'on': True}
+
+
+def test_metadata_field_prefix_and_instance():
+    payload_encoder = encoder(metadata_field_prefix='meta_', instance_id='sim-1')
+    payload = json.loads(payload_encoder.encode(topic_data()))
+    assert payload['meta_instance'] == 'sim-1'
+    assert 'meta_message_id' in payload and 'meta_timestamp_ns' in payload
+
+
+def test_inactive_data_ends_the_payloads():
+    data = [{'NAME': 'step', 'TYPE': 'raw_values', 'VALUES': ['a', 'b']}]
+    payload_encoder = encoder(data=data, include_message_id=False, include_timestamp=False)
+    values = topic_data(data)
+    assert json.loads(payload_encoder.encode(values)) == {'step': 'a'}
+    assert json.loads(payload_encoder.encode(values)) == {'step': 'b'}
+    # the value after the last one is None and deactivates the field
+    assert json.loads(payload_encoder.encode(values)) == {'step': None}
+    assert payload_encoder.encode(values) is None
+
+
+def test_copy_shares_the_template():
+    payload_encoder = encoder({'site': 'a'})
+    copy = payload_encoder.copy()
+    assert copy.root_part is payload_encoder.root_part
+    copy.encode(topic_data())
+    assert copy.message_id is not None and payload_encoder.message_id is None
+
+
+@pytest.mark.parametrize('serializer', sorted(SERIALIZERS))
+def test_serializers_agree(serializer):
+    payload_encoder = encoder({'site': 'a', 'level': 1.5}, serializer=serializer, include_message_id=False, include_timestamp=False)
+    assert payload_encoder.encode(topic_data()) == b'{"site":"a","level":1.5,"temperature":20.5,"count":7,"on":true}'
+
+
+def test_counter_message_ids():
+    generator = MessageIdGenerator('counter')
+    first, second = generator.next_id(), generator.next_id()
+    prefix, _, sequence = first.rpartition('-')
+    assert len(prefix) == 12
+    assert second == f"{prefix}-{int(sequence) + 1}"
+
+
+def test_uuid4_message_ids():
+    generator = MessageIdGenerator('uuid4')
+    assert len(generator.next_id()) == 36
+    assert generator.next_id() != generator.next_id()
+
+
+def test_unknown_modes():
+    with pytest.raises(NameError):
+        MessageIdGenerator('random')
+    with pytest.raises(NameError):
+        encoder(serializer='pickle')
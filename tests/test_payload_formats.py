@@ -0,0 +1,67 @@
+import pytest
+from payload_encoder import PayloadEncoder
+from payload_formats import STRUCT_HEADER, STRUCT_MAGIC, StructSchema, decode_payload
+from topic_data import TopicDataBool, TopicDataMathExpression, TopicDataNumber
+
+DATA = [
+    {'NAME': 'temperature', 'TYPE': 'float', 'MIN_VALUE': -3.25, 'MAX_VALUE': -3.25, 'MAX_STEP': 0},
+    {'NAME': 'count', 'TYPE': 'int', 'MIN_VALUE': -(2 ** 40), 'MAX_VALUE': -(2 ** 40), 'MAX_STEP': 0},
+    {'NAME': 'on', 'TYPE': 'bool', 'INITIAL_VALUE': False},
+    {'NAME': 'wave', 'TYPE': 'math_expression', 'MATH_EXPRESSION': '2*x', 'INTERVAL_START': 1, 'INTERVAL_END': 1, 'MIN_DELTA': 0, 'MAX_DELTA': 0}
+]
+EXPECTED = {'temperature': -3.25, 'count': -(2 ** 40), 'on': False, 'wave': 2.0}
+
+
+def topic_data():
+    classes = {'float': TopicDataNumber, 'int': TopicDataNumber, 'bool': TopicDataBool, 'math_expression': TopicDataMathExpression}
+    return [classes[item['TYPE']](item) for item in DATA]
+
+
+@pytest.mark.parametrize('payload_format', ['json', 'msgpack', 'cbor', 'struct'])
+@pytest.mark.parametrize('message_id_mode', ['uuid4', 'counter'])
+def test_round_trip(payload_format, message_id_mode):
+    if payload_format in ('msgpack', 'cbor'):
+        pytest.importorskip('msgpack' if payload_format == 'msgpack' else 'cbor2')
+    metadata = {'payload_format': payload_format, 'message_id_mode': message_id_mode}
+    encoder = PayloadEncoder({'site': 'a'}, DATA, metadata)
+    payload = encoder.encode(topic_data())
+    decoded = decode_payload(payload)
+    assert decoded == dict({'site': 'a'}, **EXPECTED, _message_id=encoder.message_id,
+                           _timestamp=encoder.timestamp_ns // 1_000_000, _timestamp_ns=encoder.timestamp_ns)
+
+
+def test_struct_without_metadata():
+    encoder = PayloadEncoder({}, DATA, {'payload_format': 'struct', 'include_message_id': False, 'include_timestamp': False})
+    payload = encoder.encode(topic_data())
+    assert payload[0] == STRUCT_MAGIC
+    assert len(payload) == STRUCT_HEADER.size + 8 + 8 + 1 + 8
+    assert decode_payload(payload) == EXPECTED
+
+
+def test_struct_schema_id_follows_the_layout():
+    first = StructSchema(DATA, {}, '_message_id', '_timestamp', '_timestamp_ns')
+    assert StructSchema(DATA, {}, '_message_id', '_timestamp', '_timestamp_ns').schema_id == first.schema_id
+    assert StructSchema(DATA[:2], {}, '_message_id', '_timestamp', '_timestamp_ns').schema_id != first.schema_id
+    assert StructSchema(DATA, {'site': 'a'}, '_message_id', '_timestamp', '_timestamp_ns').schema_id != first.schema_id
+
+
+def test_struct_rejects_raw_values():
+    with pytest.raises(NameError):
+        StructSchema([{'NAME': 'v', 'TYPE': 'raw_values', 'VALUES': [1]}], {}, None, None)
+
+
+def test_unknown_struct_schema():
+    with pytest.raises(ValueError):
+        decode_payload(STRUCT_HEADER.pack(STRUCT_MAGIC, 12345) + b'\0' * 8)
+
+
+def test_invalid_payloads():
+    with pytest.raises(ValueError):
+        decode_payload(b'')
+    with pytest.raises(ValueError):
+        decode_payload(b'not a payload')
+
+
+def test_unknown_format():
+    with pytest.raises(NameError):
+        PayloadEncoder({}, DATA, {'payload_format': 'xml'})
@@ -0,0 +1,114 @@
+import threading
+import time
+import pytest
+from publish_window import PublishWindow
+
+
+class FakeTopic:
+    """Records what the window hands to paho, None from send() stands for a closed connection"""
+    def __init__(self, connected=True):
+        self.sent = []
+        self.connected = connected
+
+    def send(self, message):
+        if not self.connected:
+            return None
+        self.sent.append(message)
+        return len(self.sent)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+def filled(policy, max_inflight=2, max_queued=2):
+    """A window with max_inflight messages inflight and max_queued queued, it is full from here on"""
+    window = PublishWindow('c', max_inflight, max_queued, policy)
+    topic = FakeTopic()
+    for message in range(max_inflight + max_queued):
+        window.submit(topic, message)
+    assert window.full
+    return window, topic
+
+
+def test_unknown_policy():
+    with pytest.raises(NameError):
+        PublishWindow('c', policy='wait')
+
+
+def test_messages_wait_for_room_in_the_window():
+    window, topic = filled('block')
+    assert topic.sent == [0, 1]
+    assert [message for _, message in window.queue] == [2, 3]
+    window.acknowledged()
+    assert topic.sent == [0, 1, 2]
+    assert window.sample() == (2, 1, 0, 0)
+
+
+def test_unlimited_queue_is_never_full():
+    window = PublishWindow('c', 1, 0, 'drop')
+    topic = FakeTopic()
+    for message in range(100):
+        window.submit(topic, message)
+    assert not window.full
+    assert (len(topic.sent), len(window.queue), window.dropped) == (1, 99, 0)
+
+
+def test_drop_drops_the_new_message():
+    window, topic = filled('drop')
+    window.submit(topic, 4)
+    assert [message for _, message in window.queue] == [2, 3]
+    assert window.dropped == 1
+    window.acknowledged()
+    window.acknowledged()
+    assert topic.sent == [0, 1, 2, 3]
+
+
+def test_drop_oldest_drops_the_oldest_queued_message():
+    window, topic = filled('drop_oldest')
+    window.submit(topic, 4)
+    assert [message for _, message in window.queue] == [3, 4]
+    assert window.dropped == 1
+    window.acknowledged()
+    window.acknowledged()
+    assert topic.sent == [0, 1, 3, 4]
+
+
+def test_block_waits_for_an_ack():
+    window, topic = filled('block')
+    publisher = threading.Thread(target=window.submit, args=(topic, 4))
+    publisher.start()
+    # the publisher is blocked until the window has room again
+    assert wait_until(lambda: window.blocked == 1)
+    assert publisher.is_alive()
+    window.acknowledged()
+    publisher.join(1)
+    assert not publisher.is_alive()
+    assert [message for _, message in window.queue] == [3, 4]
+    assert topic.sent == [0, 1, 2]
+    assert window.dropped == 0
+
+
+def test_close_releases_blocked_publishers():
+    window, topic = filled('block')
+    publisher = threading.Thread(target=window.submit, args=(topic, 4))
+    publisher.start()
+    assert wait_until(lambda: window.blocked == 1)
+    assert window.close() == 2
+    publisher.join(1)
+    assert not publisher.is_alive()
+    assert topic.sent == [0, 1]
+
+
+def test_closed_connection_frees_the_window():
+    window = PublishWindow('c', 1, 0)
+    topic = FakeTopic(connected=False)
+    window.submit(topic, 0)
+    assert (window.inflight, window.dropped) == (0, 1)
+    # the next message takes the slot the failed one left
+    topic.connected = True
+    window.submit(topic, 1)
+    assert (window.inflight, topic.sent) == (1, [1])
@@ -0,0 +1,66 @@
+import asyncio
+import socket
+import paho.mqtt.client as mqtt
+from connection_pool import ConnectionPool
+from connection_ramp import ConnectionRamp
+from data_classes import BrokerSettings, ClientSettings
+from publisher_engine import AsyncPublisherEngine
+from topic import Topic
+
+DATA = [{'NAME': 'value', 'TYPE': 'int', 'MIN_VALUE': 0, 'MAX_VALUE': 10, 'MAX_STEP': 1}]
+
+
+def topics(port, count=3, interval=0.05):
+    broker_settings = BrokerSettings('127.0.0.1', port, mqtt.MQTTv311)
+    client_settings = ClientSettings(clean=True, retain=False, qos=1, time_interval=interval)
+    return [Topic(broker_settings, f"engine/{index}", DATA, {}, client_settings) for index in range(count)]
+
+
+def run(engine, duration):
+    try:
+        asyncio.run(asyncio.wait_for(engine.run(), duration))
+    except asyncio.TimeoutError:
+        pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_topics_connect_through_the_ramp_and_publish(broker_port):
+    engine_topics = topics(broker_port)
+    ramp = ConnectionRamp()
+    engine = AsyncPublisherEngine(engine_topics, connection_ramp=ramp)
+    run(engine, 1.0)
+    assert [(record.client_id, record.kind, record.connected) for record in ramp.records] == [
+        (topic.topic_url, 'publisher', True) for topic in engine_topics]
+    # acknowledged at QoS 1 by the broker, about one message every 50ms for each topic
+    for topic in engine_topics:
+        assert topic.published_count >= 5
+    assert not any(topic.loop for topic in engine_topics)
+
+
+def test_pooled_connections_are_ramped(broker_port):
+    engine_topics = topics(broker_port, count=4)
+    pool = ConnectionPool(BrokerSettings('127.0.0.1', broker_port, mqtt.MQTTv311), 2)
+    for topic in engine_topics:
+        pool.assign(topic)
+    ramp = ConnectionRamp()
+    run(AsyncPublisherEngine(engine_topics, pool, ramp), 1.0)
+    assert [(record.kind, record.connected) for record in ramp.records] == [('connection', True)] * 2
+    assert all(topic.published_count >= 5 for topic in engine_topics)
+    assert sum(connection.acks for connection in pool.connections) == sum(topic.published_count for topic in engine_topics)
+
+
+def test_topics_that_can_not_connect_do_not_publish():
+    engine_topics = topics(free_port(), count=2)
+    ramp = ConnectionRamp(retries=1)
+    ramp.RETRY_DELAY = 0.01
+    engine = AsyncPublisherEngine(engine_topics, connection_ramp=ramp)
+    # nothing is scheduled, so the engine returns on its own
+    run(engine, 5.0)
+    assert [(record.retries, record.connected) for record in ramp.records] == [(1, False)] * 2
+    assert all(record.error.startswith('ConnectionRefusedError') for record in ramp.records)
+    assert all(topic.schedule.sends == 0 and not topic.loop for topic in engine_topics)
@@ -0,0 +1,58 @@
+import json
+import pytest
+from receive_pipeline import ReceivePipeline, build_record
+from receive_sinks import ReceiveSink
+
+RECEIVE_NS = 2_000_000_000_000_000_000
+
+
+class CollectingSink(ReceiveSink):
+    def __init__(self):
+        self.records = []
+
+    def handle(self, record):
+        self.records.append(record)
+
+
+def test_latency_from_timestamp_ns():
+    payload = json.dumps({'_timestamp': 0, '_timestamp_ns': RECEIVE_NS - 1500, '_message_id': 'm'}).encode()
+    record = build_record(None, 't', payload, RECEIVE_NS)
+    assert (record.metadata_prefix, record.message_id, record.latency_us) == ('_', 'm', 1.5)
+
+
+def test_latency_from_millisecond_timestamp():
+    payload = json.dumps({'timestamp': RECEIVE_NS // 1_000_000 - 3}).encode()
+    record = build_record(None, 't', payload, RECEIVE_NS)
+    assert record.metadata_prefix == ''
+    assert record.latency_us == 3000
+
+
+@pytest.mark.parametrize('data', [
+    {'timestamp': None},
+    {'timestamp': 'x'},
+    {'_timestamp': [1]},
+    {'_timestamp': 1, '_timestamp_ns': 'y'}
+])
+def test_malformed_timestamps_have_no_latency(data):
+    record = build_record(None, 't', json.dumps(data).encode(), RECEIVE_NS)
+    assert record.data == data
+    assert (record.send_time_ns, record.latency_us, record.metadata_prefix, record.message_id) == (None, None, None, None)
+
+
+def test_undecodable_payload():
+    record = build_record(None, 't', b'\xff not a payload', RECEIVE_NS)
+    assert record.data is None and record.latency_us is None
+
+
+def test_bad_messages_do_not_stop_the_pipeline():
+    pipeline = ReceivePipeline()
+    sink = CollectingSink()
+    pipeline.add_sink(sink)
+    pipeline.start()
+    for payload in (b'{"timestamp": null}', b'{"timestamp": "x"}', b'', b'{"timestamp": 1}'):
+        pipeline.submit(None, 't', payload, RECEIVE_NS)
+    pipeline.close()
+    assert not pipeline.is_alive()
+    assert pipeline.processed == 4
+    assert [record.payload for record in sink.records][-1] == b'{"timestamp": 1}'
+    assert sink.records[-1].latency_us is not None
@@ -0,0 +1,60 @@
+import time
+from send_ledger import SendLedger
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, path, line):
+        self.lines.append(line)
+
+
+def rows(writer):
+    return [dict(zip(SendLedger.HEADER.strip().split(','), line.split(','))) for line in writer.lines]
+
+
+def test_drain_while_waiting_in_the_window_is_not_the_socket_time():
+    writer = ListWriter()
+    ledger = SendLedger(writer, 'sends.csv')
+    # an earlier message drained after publish() but before this one was handed to paho
+    ledger.last_drain_ns = 200
+    ledger.published('t', 'm1', 1, 1, 10, 100, 300)
+    assert ledger.unsent == [1]
+    ledger.on_socket_drained()
+    ledger.acknowledged(1)
+    row = rows(writer)[0]
+    assert int(row['socket_time_ns']) == ledger.last_drain_ns > 300
+
+
+def test_drain_before_publish_returned():
+    writer = ListWriter()
+    ledger = SendLedger(writer, 'sends.csv')
+    publish_ns = handoff_ns = time.time_ns()
+    # the network thread wrote the message out before publish() returned its mid
+    ledger.on_socket_drained()
+    ledger.published('t', 'm1', 1, 1, 10, publish_ns, handoff_ns)
+    assert ledger.unsent == []
+    ledger.acknowledged(1)
+    assert int(rows(writer)[0]['socket_time_ns']) == ledger.last_drain_ns
+
+
+def test_ack_before_published():
+    writer = ListWriter()
+    ledger = SendLedger(writer, 'sends.csv')
+    publish_ns = time.time_ns()
+    ledger.acknowledged(7)
+    ledger.published('t', 'm1', 7, 0, 10, publish_ns, publish_ns)
+    row = rows(writer)[0]
+    # QoS 0 messages are reported when written, so the ack time is the socket time
+    assert row['mid'] == '7'
+    assert row['socket_time_ns'] == row['ack_time_ns']
+    assert ledger.queueing.count == 1 and ledger.broker_ack.count == 0
+
+
+def test_close_writes_unacknowledged():
+    writer = ListWriter()
+    ledger = SendLedger(writer, 'sends.csv')
+    ledger.published('t', 'm1', 1, 1, 10, 1, 1)
+    assert ledger.close() == 1
+    assert rows(writer)[0]['ack_time_ns'] == ''
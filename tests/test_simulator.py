@@ -0,0 +1,63 @@
+import json
+import multiprocessing
+import zlib
+import pytest
+from payload_formats import decode_payload
+from simulator import Simulator
+
+TOPIC = 'st/two'
+STRUCT_SETTINGS = {
+    'BROKER_URL': '127.0.0.1', 'BROKER_PORT': 1, 'CLOCK_SYNC_INTERVAL': 0, 'PAYLOAD_FORMAT': 'struct', 'RECEIVE_SINKS': [],
+    'TOPICS': [{'TYPE': 'single', 'PREFIX': TOPIC, 'DATA': [{'NAME': 'value', 'TYPE': 'int', 'MIN_VALUE': 5, 'MAX_VALUE': 5, 'MAX_STEP': 0}]}]
+}
+
+
+SHARDED_SETTINGS = {
+    'BROKER_URL': '127.0.0.1', 'BROKER_PORT': 1, 'CLOCK_SYNC_INTERVAL': 0, 'RECEIVE_SINKS': [],
+    'TOPICS': [{'TYPE': 'multiple', 'PREFIX': 'site', 'RANGE_START': 1, 'RANGE_END': 40, 'DATA': [{'NAME': 'on', 'TYPE': 'bool'}]}],
+    'SUBSCRIBERS': [{'TOPIC': 'site/#', 'NUMBER': 8, 'USERS': [None] * 8, 'PASSWORDS': [None] * 8}]
+}
+
+
+@pytest.fixture
+def settings_file(tmp_path):
+    path = tmp_path / 'settings.json'
+    path.write_text(json.dumps(STRUCT_SETTINGS))
+    return str(path)
+
+
+def decode_in_shard(settings_file, output_dir, shard, payload):
+    """Runs in a fresh process, whose struct schemas come from its own Simulator only"""
+    simulator = Simulator(settings_file, output_dir, shard=shard)
+    assert simulator.topics == []
+    return decode_payload(payload)
+
+
+def test_struct_payloads_of_other_shards_decode(settings_file, tmp_path):
+    owner = zlib.crc32(TOPIC.encode('utf-8')) % 2
+    publisher = Simulator(settings_file, str(tmp_path), shard=(owner, 2))
+    payload = publisher.topics[0].next_payload()
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        decoded = pool.apply(decode_in_shard, (settings_file, str(tmp_path), (1 - owner, 2), payload))
+    assert decoded['value'] == 5
+    assert decoded['_message_id'] == publisher.topics[0].encoder.message_id
+
+
+def shard_names(settings_file, output_dir, shard):
+    simulator = Simulator(settings_file, output_dir, shard=shard)
+    return [topic.topic_url for topic in simulator.topics], [subscriber.client_id for subscriber in simulator.subscribers]
+
+
+def test_shards_split_topics_and_subscribers_once(tmp_path):
+    path = tmp_path / 'sharded.json'
+    path.write_text(json.dumps(SHARDED_SETTINGS))
+    everything = shard_names(str(path), str(tmp_path), None)
+    shards = [shard_names(str(path), str(tmp_path), (index, 3)) for index in range(3)]
+    for kind in (0, 1):
+        names = [name for shard in shards for name in shard[kind]]
+        assert sorted(names) == sorted(everything[kind])
+    # with 40 topics every worker gets some of them
+    assert all(shard[0] for shard in shards)
+    # workers are separate processes, each of them must come to the same split
+    with multiprocessing.get_context('spawn').Pool(3) as pool:
+        assert pool.starmap(shard_names, [(str(path), str(tmp_path), (index, 3)) for index in range(3)]) == shards
@@ -0,0 +1,79 @@
+import time
+import paho.mqtt.client as mqtt
+from connection_ramp import ConnectionRamp
+from data_classes import BrokerSettings
+from receive_pipeline import ReceivePipeline
+from receive_sinks import ReceiveSink
+from subscriber_pool import SubscriberPool
+from SubscriberClient import SubscriberClient
+
+
+class CollectingSink(ReceiveSink):
+    def __init__(self):
+        self.records = []
+
+    def handle(self, record):
+        self.records.append(record)
+
+
+def subscribers(port, pipeline, tmp_path, count):
+    broker_settings = BrokerSettings('127.0.0.1', port, mqtt.MQTTv311)
+    return [SubscriberClient(broker_settings, f"subscriber-pool-{index}", f"pool/{index % 2}/#", pipeline, str(tmp_path / f"subscriber-pool-{index}.log"))
+            for index in range(count)]
+
+
+def publish(port, messages):
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, 'pool-test-publisher')
+    client.connect('127.0.0.1', port)
+    client.loop_start()
+    for topic, payload in messages:
+        client.publish(topic, payload, qos=1).wait_for_publish(2)
+    client.disconnect()
+    client.loop_stop()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_subscribers_share_one_loop(broker_port, tmp_path):
+    pipeline = ReceivePipeline()
+    sink = CollectingSink()
+    pipeline.add_sink(sink)
+    pipeline.start()
+    pool_subscribers = subscribers(broker_port, pipeline, tmp_path, 6)
+    pool = SubscriberPool(pool_subscribers)
+    ramp = ConnectionRamp(concurrency=2)
+    pool.connect(ramp)
+    try:
+        assert [record.connected for record in ramp.records] == [True] * 6
+        # the network I/O of every client runs on the loop of the pool
+        assert pool.driver.clients == {subscriber.client for subscriber in pool_subscribers}
+        assert wait_until(lambda: all(subscriber.connected.is_set() for subscriber in pool_subscribers))
+        # the SUBACKs arrive on the loop after the CONNACKs
+        time.sleep(0.2)
+        publish(broker_port, [('pool/0/a', b'{"n": 0}'), ('pool/1/a', b'{"n": 1}'), ('pool/0/b', b'{"n": 2}')])
+        # every subscriber of pool/0/# gets two messages, every one of pool/1/# one
+        assert wait_until(lambda: len(sink.records) == 3 * 2 + 3 * 1)
+        assert [subscriber.received_count for subscriber in pool_subscribers] == [2, 1] * 3
+    finally:
+        pool.close()
+        pipeline.close()
+    assert not pool.is_alive()
+
+
+def test_refused_subscribers_are_left_disconnected(tmp_path):
+    pipeline = ReceivePipeline()
+    pool_subscribers = subscribers(1, pipeline, tmp_path, 2)
+    pool = SubscriberPool(pool_subscribers)
+    ramp = ConnectionRamp()
+    pool.connect(ramp)
+    try:
+        assert [record.connected for record in ramp.records] == [False] * 2
+        assert all(record.error.startswith('ConnectionRefusedError') for record in ramp.records)
+        assert not pool.driver.clients
+    finally:
+        pool.close()
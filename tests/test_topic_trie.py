@@ -0,0 +1,113 @@
+from topic_trie import TopicTrie, expected_deliveries, match_subscribers
+
+
+def matched(trie, topic):
+    return sorted(trie.subscribers(topic))
+
+
+def test_exact_filter():
+    trie = TopicTrie()
+    trie.add('a/b', 's')
+    assert matched(trie, 'a/b') == ['s']
+    assert matched(trie, 'a') == []
+    assert matched(trie, 'a/b/c') == []
+    assert matched(trie, 'a/c') == []
+
+
+def test_plus_matches_one_level():
+    trie = TopicTrie()
+    trie.add('a/+/c', 's')
+    assert matched(trie, 'a/b/c') == ['s']
+    assert matched(trie, 'a/x/c') == ['s']
+    # '+' also matches an empty level
+    assert matched(trie, 'a//c') == ['s']
+    assert matched(trie, 'a/c') == []
+    assert matched(trie, 'a/b/x/c') == []
+
+
+def test_plus_as_last_level():
+    trie = TopicTrie()
+    trie.add('a/+', 's')
+    assert matched(trie, 'a/b') == ['s']
+    assert matched(trie, 'a') == []
+    assert matched(trie, 'a/b/c') == []
+
+
+def test_hash_matches_rest_and_parent():
+    trie = TopicTrie()
+    trie.add('a/#', 's')
+    assert matched(trie, 'a') == ['s']
+    assert matched(trie, 'a/b') == ['s']
+    assert matched(trie, 'a/b/c/d') == ['s']
+    assert matched(trie, 'b') == []
+
+
+def test_hash_alone_matches_everything_but_dollar_topics():
+    trie = TopicTrie()
+    trie.add('#', 's')
+    assert matched(trie, 'a') == ['s']
+    assert matched(trie, 'a/b/c') == ['s']
+    assert matched(trie, '$SYS/broker') == []
+
+
+def test_dollar_topics():
+    trie = TopicTrie()
+    trie.add('+/broker', 'plus')
+    trie.add('$SYS/#', 'sys')
+    trie.add('$SYS/+', 'sys-plus')
+    assert matched(trie, '$SYS/broker') == ['sys', 'sys-plus']
+    assert matched(trie, 'x/broker') == ['plus']
+
+
+def test_overlapping_filters():
+    trie = TopicTrie()
+    trie.add('a/#', 's1')
+    trie.add('a/+', 's1')
+    trie.add('a/b', 's2')
+    trie.add('+/b', 's3')
+    # a subscriber with overlapping filters comes once per filter from matches(), once from subscribers()
+    assert sorted(subscriber for subscriber, _ in trie.matches('a/b')) == ['s1', 's1', 's2', 's3']
+    assert matched(trie, 'a/b') == ['s1', 's2', 's3']
+    assert len(trie) == 4
+
+
+def test_values_are_kept_per_filter():
+    trie = TopicTrie()
+    trie.add('a/b', 's', 1)
+    trie.add('a/b', 's', 2)
+    assert len(trie) == 1
+    assert list(trie.matches('a/b')) == [('s', 2)]
+
+
+def test_remove():
+    trie = TopicTrie()
+    trie.add('a/b/c', 's1')
+    trie.add('a/#', 's2')
+    assert matched(trie, 'a/b/c') == ['s1', 's2']
+    assert trie.remove('a/b/c', 's1')
+    assert not trie.remove('a/b/c', 's1')
+    assert not trie.remove('x/y', 's1')
+    assert matched(trie, 'a/b/c') == ['s2']
+    # the nodes nobody subscribes through are gone
+    assert 'b' not in trie.root.children['a'].children
+    assert trie.remove('a/#', 's2')
+    assert trie.root.children == {}
+    assert len(trie) == 0
+
+
+def test_cache_is_cleared_on_changes():
+    trie = TopicTrie()
+    trie.add('a/+', 's1')
+    assert matched(trie, 'a/b') == ['s1']
+    trie.add('a/b', 's2')
+    assert matched(trie, 'a/b') == ['s1', 's2']
+    trie.remove('a/+', 's1')
+    assert matched(trie, 'a/b') == ['s2']
+
+
+def test_expected_deliveries():
+    sends = {'a/1': 10, 'a/2': 5, 'b/1': 3}
+    subscriptions = {'all': '#', 'a': 'a/+', 'one': '+/1', 'both': 'a/#', 'none': None}
+    expected = expected_deliveries(sends, subscriptions)
+    assert expected == {'all': 18, 'a': 15, 'one': 13, 'both': 15, 'none': 0}
+    assert expected_deliveries(sends, subscriptions, match_subscribers(sends, subscriptions)) == expected
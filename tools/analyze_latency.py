@@ -5,72 +5,246 @@ import numpy as np
 import seaborn as sns
 from pathlib import Path
 import argparse
+import json
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+
+# binary latency records are read with the simulator's own module
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'clients' / 'simulate'))
+import latency_records
+from latency_histogram import LatencyHistogram
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# rows parsed at a time, so no latency file has to fit in memory as a whole
+CHUNK_ROWS = 1_000_000
+
+# the combined data of a folder, reloaded instead of the latency files as long as none of them changed
+CACHE_FILE = '.latency_cache.parquet'
+CACHE_INFO_FILE = '.latency_cache.json'
+CACHE_VERSION = 1
+
+# the fast charts reduce every series to about one point per pixel of a 14 inch wide figure at 100 dpi
+FIGURE_DPI = 100
+CHART_PIXELS = 14 * FIGURE_DPI
+# points of the density curves
+DENSITY_GRID = 1024
+
+class LatencyStats:
+    """Count, mean, standard deviation, min and max of the latencies of one topic, updated chunk by chunk.
+    The median comes from a LatencyHistogram in microseconds"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # sum of the squared differences from the mean
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = LatencyHistogram()
+
+    def update(self, latency_ms):
+        """Add a numpy array of latencies in milliseconds"""
+        if not len(latency_ms):
+            return
+        other = LatencyStats()
+        other.count = len(latency_ms)
+        other.mean = float(latency_ms.mean())
+        other.m2 = float(((latency_ms - other.mean) ** 2).sum())
+        other.min = float(latency_ms.min())
+        other.max = float(latency_ms.max())
+        other.histogram.record_array(latency_ms * 1000)
+        self.merge(other)
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        # Chan et al., the variance of two parts without going over their values again
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.histogram.merge(other.histogram)
+        return self
+
+    @property
+    def std(self):
+        # sample standard deviation, as pandas computes it
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else float('nan')
+
+    @property
+    def median(self):
+        return self.quantile(50)
+
+    def quantile(self, percentile):
+        """Latency in milliseconds below which percentile % of the values are"""
+        return self.histogram.percentile(percentile) / 1000 if self.count else float('nan')
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max, 'histogram': self.histogram.to_dict()}
+
+    @classmethod
+    def from_dict(cls, values):
+        stats = cls()
+        stats.count = values['count']
+        stats.mean = values['mean']
+        stats.m2 = values['m2']
+        stats.min = values['min']
+        stats.max = values['max']
+        stats.histogram = LatencyHistogram.from_dict(values['histogram'])
+        return stats
 
 def extract_topic_from_filename(filename):
     """Extract topic name from latency log filename."""
-    # Expected format: subscriber-{topic}-{instance}.latency.log or .csv
-    match = re.search(r'subscriber-(.*?)-\d+\.latency\.(log|csv)', filename)
+    # Expected format: subscriber-{topic}-{instance}.latency.log, .csv or .bin
+    match = re.search(r'subscriber-(.*?)-\d+\.latency\.(log|csv|bin)', filename)
     if match:
         return match.group(1)
     return "unknown"
 
-def load_latency_data(folder_path):
-    """Load all latency data from CSV files in the given folder."""
+def iter_latency_chunks(file_path):
+    """Frames of at most CHUNK_ROWS rows of a latency file with the columns topic (categorical), send_time (ms) and latency_ms"""
+    if '.latency.bin' in file_path.name:
+        # Fixed-width records, memory-mapped without any parsing
+        records = latency_records.read_records(file_path)
+        topics = latency_records.read_topics(file_path)
+        for start in range(0, len(records), CHUNK_ROWS):
+            chunk = records[start:start + CHUNK_ROWS]
+            yield pd.DataFrame({
+                'topic': pd.Categorical.from_codes(chunk['topic_id'].astype('int32'), categories=topics),
+                'send_time': chunk['send_ns'] // 1_000_000,
+                'latency_ms': (chunk['receive_ns'] - chunk['send_ns']) / 1_000_000
+            })
+        return
+
+    # The first line tells the layout, so the file is only parsed once
+    with open(file_path, encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+    if header[0] != 'timestamp':
+        # no header: timestamp,topic,message_id,send_time,receive_time,latency_ms
+        reader = pd.read_csv(file_path, header=None, names=['timestamp', 'topic', 'message_id', 'send_time', 'receive_time', 'latency_ms'],
+                             usecols=['topic', 'send_time', 'latency_ms'], chunksize=CHUNK_ROWS,
+                             dtype={'topic': 'category', 'send_time': 'float64', 'latency_ms': 'float64'})
+        columns = ('send_time', 1, 'latency_ms', 1)
+    elif 'latency_us' in header:
+        # nanosecond timestamps and microsecond latencies, corrected by the clock offset
+        reader = pd.read_csv(file_path, usecols=['topic', 'send_time_ns', 'latency_us'], chunksize=CHUNK_ROWS,
+                             dtype={'topic': 'category', 'send_time_ns': 'int64', 'latency_us': 'float64'})
+        columns = ('send_time_ns', 1_000_000, 'latency_us', 1000)
+    else:
+        reader = pd.read_csv(file_path, usecols=['topic', 'send_time_ms', 'latency_ms'], chunksize=CHUNK_ROWS,
+                             dtype={'topic': 'category', 'send_time_ms': 'float64', 'latency_ms': 'float64'})
+        columns = ('send_time_ms', 1, 'latency_ms', 1)
+    send_column, send_divisor, latency_column, latency_divisor = columns
+    for chunk in reader:
+        yield pd.DataFrame({
+            'topic': chunk['topic'],
+            'send_time': (chunk[send_column] // send_divisor).astype('int64'),
+            'latency_ms': chunk[latency_column] / latency_divisor
+        })
+
+def read_latency_file(file_path):
+    """Compact frame of one latency file and the LatencyStats of its topics, None if it can not be read"""
+    try:
+        # Extract topic name from filename
+        topic = extract_topic_from_filename(file_path.name)
+        frames = []
+        stats = {}
+        for chunk in iter_latency_chunks(file_path):
+            chunk = chunk.dropna(subset=['latency_ms'])
+            # Group by the actual message topic, renaming the categories instead of every row
+            chunk['topic'] = chunk['topic'].cat.rename_categories(lambda msg_topic: f"{topic}-{msg_topic}")
+            for topic_key, group in chunk.groupby('topic', observed=True):
+                stats.setdefault(topic_key, LatencyStats()).update(group['latency_ms'].to_numpy())
+            frames.append(chunk.astype({'latency_ms': 'float32'}))
+        df = concat_frames(frames)
+        print(f"Loaded {len(df)} records from {file_path}")
+        return df, stats
+    except Exception as e:
+        print(f"Error loading {file_path}: {str(e)}")
+        return None
+
+def concat_frames(frames):
+    """Concatenate compact frames, keeping the topic categorical when their categories differ"""
+    # an empty file, e.g. one just rotated, has categories of another dtype
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame({'topic': pd.Categorical([]), 'send_time': np.array([], dtype='int64'), 'latency_ms': np.array([], dtype='float32')})
+    return pd.DataFrame({
+        'topic': union_categoricals([frame['topic'] for frame in frames]),
+        'send_time': np.concatenate([frame['send_time'].to_numpy() for frame in frames]),
+        'latency_ms': np.concatenate([frame['latency_ms'].to_numpy() for frame in frames])
+    })
+
+def file_signature(latency_files):
+    """Name, size and modification time of the latency files a cache was built from"""
+    return [[path.name, path.stat().st_size, path.stat().st_mtime_ns] for path in sorted(latency_files)]
+
+def load_latency_data(folder_path, jobs=None, use_cache=True):
+    """Load all latency data from the CSV and binary latency files in the given folder.
+    Returns {topic: DataFrame of send_time and latency_ms} and {topic: LatencyStats}"""
     folder_path = Path(folder_path)
-    data_by_topic = {}
     
     # Find all latency log files
-    latency_files = list(folder_path.glob('*.latency.csv')) + list(folder_path.glob('*.latency.log'))
+    latency_files = list(folder_path.glob('*.latency.csv')) + list(folder_path.glob('*.latency.log')) + list(folder_path.glob('*.latency.bin'))
+    # a subscriber with both latency sinks enabled is read from its binary file only
+    binary = {path.name.split('.latency.')[0] for path in latency_files if path.suffix == '.bin'}
+    latency_files = [path for path in latency_files if path.suffix == '.bin' or path.name.split('.latency.')[0] not in binary]
+    # the segments rotated out of a latency file by LOG_ROTATE_BYTES are read with it
+    latency_files = [Path(segment) for path in latency_files for segment in latency_records.log_segments(path)]
     
     if not latency_files:
         print(f"No latency files found in {folder_path}")
-        return data_by_topic
+        return {}, {}
     
-    for file_path in latency_files:
-        try:
-            # Extract topic name from filename
-            topic = extract_topic_from_filename(file_path.name)
-            
-            # Load data - expected format: timestamp,topic,message_id,send_time,receive_time,latency_ms
-            df = pd.read_csv(file_path, header=None)
-            
-            # If the file has a header row, parse accordingly
-            if isinstance(df.iloc[0, 0], str) and ',' in df.iloc[0, 0]:
-                df = pd.read_csv(file_path)
-            else:
-                # Otherwise assign column names
-                df.columns = ['timestamp', 'topic', 'message_id', 'send_time', 'receive_time', 'latency_ms']
-            
-            # Extract actual topic from the data if available
-            if 'topic' in df.columns:
-                # Group by the actual message topic
-                for msg_topic, group in df.groupby('topic'):
-                    topic_key = f"{topic}-{msg_topic}"
-                    if topic_key not in data_by_topic:
-                        data_by_topic[topic_key] = []
-                    data_by_topic[topic_key].append(group)
+    cache_file = folder_path / CACHE_FILE
+    cache_info_file = folder_path / CACHE_INFO_FILE
+    signature = file_signature(latency_files)
+    if use_cache and pyarrow is not None and cache_file.exists() and cache_info_file.exists():
+        with open(cache_info_file, encoding='utf-8') as f:
+            cache_info = json.load(f)
+        if cache_info.get('version') == CACHE_VERSION and cache_info.get('files') == signature:
+            data = pd.read_parquet(cache_file)
+            print(f"Loaded {len(data)} records from cache {cache_file}")
+            return split_by_topic(data), {topic: LatencyStats.from_dict(values) for topic, values in cache_info['stats'].items()}
+    
+    # Files are parsed in parallel, each one chunk by chunk
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = [result for result in pool.map(read_latency_file, sorted(latency_files)) if result is not None]
+    data = concat_frames([df for df, _ in results])
+    stats = {}
+    for _, file_stats in results:
+        for topic, topic_stats in file_stats.items():
+            if topic in stats:
+                stats[topic].merge(topic_stats)
             else:
-                # Use the filename-derived topic
-                if topic not in data_by_topic:
-                    data_by_topic[topic] = []
-                data_by_topic[topic].append(df)
-                
-            print(f"Loaded {len(df)} records from {file_path}")
-            
-        except Exception as e:
-            print(f"Error loading {file_path}: {str(e)}")
+                stats[topic] = topic_stats
     
-    # Combine all dataframes for each topic
-    for topic in data_by_topic:
-        data_by_topic[topic] = pd.concat(data_by_topic[topic], ignore_index=True)
-        # Ensure latency is numeric
-        data_by_topic[topic]['latency_ms'] = pd.to_numeric(data_by_topic[topic]['latency_ms'], errors='coerce')
+    if use_cache:
+        if pyarrow is None:
+            print("pyarrow is not installed, the loaded data is not cached")
+        else:
+            data.to_parquet(cache_file, index=False)
+            with open(cache_info_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': CACHE_VERSION, 'files': signature, 'stats': {topic: value.to_dict() for topic, value in stats.items()}}, f)
+            print(f"Cached {len(data)} records in {cache_file}")
     
-    return data_by_topic
+    return split_by_topic(data), stats
+
+def split_by_topic(data):
+    return {topic: group[['send_time', 'latency_ms']].reset_index(drop=True) for topic, group in data.groupby('topic', observed=True)}
 
-def create_comparison_charts(folder1_data, folder2_data, output_folder, folder1_name="Run 1", folder2_name="Run 2"):
-    """Create comparison charts between two sets of latency data."""
+def create_comparison_charts(folder1_data, folder2_data, output_folder, folder1_name="Run 1", folder2_name="Run 2", folder1_stats=None, folder2_stats=None):
+    """Create comparison charts between two sets of latency data, with the statistics from load_latency_data."""
+    folder1_stats = folder1_stats or {}
+    folder2_stats = folder2_stats or {}
     output_folder = Path(output_folder)
     output_folder.mkdir(exist_ok=True, parents=True)
     
@@ -87,31 +261,37 @@ def create_comparison_charts(folder1_data, folder2_data, output_folder, folder1_
         # Plot data from folder 1 if available
         if topic in folder1_data:
             latency1 = folder1_data[topic]['latency_ms']
-            sns.kdeplot(latency1, ax=ax, label=f"{folder1_name} (mean: {latency1.mean():.2f}ms)", shade=True)
+            stats1 = folder1_stats.get(topic) or LatencyStats()
+            if stats1.count == 0:
+                stats1.update(latency1.to_numpy())
+            sns.kdeplot(latency1, ax=ax, label=f"{folder1_name} (mean: {stats1.mean:.2f}ms)", shade=True)
             stats_data.append({
                 'Topic': topic,
                 'Run': folder1_name,
-                'Count': len(latency1),
-                'Mean (ms)': latency1.mean(),
-                'Median (ms)': latency1.median(),
-                'Min (ms)': latency1.min(),
-                'Max (ms)': latency1.max(),
-                'Std Dev (ms)': latency1.std()
+                'Count': stats1.count,
+                'Mean (ms)': stats1.mean,
+                'Median (ms)': stats1.median,
+                'Min (ms)': stats1.min,
+                'Max (ms)': stats1.max,
+                'Std Dev (ms)': stats1.std
             })
         
         # Plot data from folder 2 if available
         if topic in folder2_data:
             latency2 = folder2_data[topic]['latency_ms']
-            sns.kdeplot(latency2, ax=ax, label=f"{folder2_name} (mean: {latency2.mean():.2f}ms)", shade=True)
+            stats2 = folder2_stats.get(topic) or LatencyStats()
+            if stats2.count == 0:
+                stats2.update(latency2.to_numpy())
+            sns.kdeplot(latency2, ax=ax, label=f"{folder2_name} (mean: {stats2.mean:.2f}ms)", shade=True)
             stats_data.append({
                 'Topic': topic,
                 'Run': folder2_name,
-                'Count': len(latency2),
-                'Mean (ms)': latency2.mean(),
-                'Median (ms)': latency2.median(),
-                'Min (ms)': latency2.min(),
-                'Max (ms)': latency2.max(),
-                'Std Dev (ms)': latency2.std()
+                'Count': stats2.count,
+                'Mean (ms)': stats2.mean,
+                'Median (ms)': stats2.median,
+                'Min (ms)': stats2.min,
+                'Max (ms)': stats2.max,
+                'Std Dev (ms)': stats2.std
             })
         
         plt.title(f"Latency Distribution for Topic: {topic}")
@@ -128,8 +308,8 @@ def create_comparison_charts(folder1_data, folder2_data, output_folder, folder1_
     
     # 2. Create summary chart comparing mean latencies across topics
     topic_list = list(all_topics)
-    means1 = [folder1_data[t]['latency_ms'].mean() if t in folder1_data else 0 for t in topic_list]
-    means2 = [folder2_data[t]['latency_ms'].mean() if t in folder2_data else 0 for t in topic_list]
+    means1 = [folder1_stats[t].mean if t in folder1_stats else folder1_data[t]['latency_ms'].mean() if t in folder1_data else 0 for t in topic_list]
+    means2 = [folder2_stats[t].mean if t in folder2_stats else folder2_data[t]['latency_ms'].mean() if t in folder2_data else 0 for t in topic_list]
     
     # Bar chart for mean latency comparison
     fig, ax = plt.subplots(figsize=(14, 8))
@@ -224,6 +404,151 @@ def create_comparison_charts(folder1_data, folder2_data, output_folder, folder1_
         except Exception as e:
             print(f"Could not create time-series chart for {topic}: {str(e)}")
 
+def binned_density(latency, stats):
+    """Gaussian kernel density of the latencies, as sns.kdeplot draws it, from the values binned on a grid.
+    The bins are convolved with the kernel through an FFT, so the cost does not depend on the number of values"""
+    if stats.count < 2 or not stats.std > 0:
+        return None
+    # Scott's rule and a curve that goes 3 bandwidths past the extremes, the kdeplot defaults
+    bandwidth = stats.std * stats.count ** (-1 / 5)
+    counts, edges = np.histogram(latency, bins=DENSITY_GRID, range=(stats.min - 3 * bandwidth, stats.max + 3 * bandwidth))
+    step = edges[1] - edges[0]
+    kernel = np.exp(-0.5 * (np.arange(-DENSITY_GRID, DENSITY_GRID + 1) * step / bandwidth) ** 2)
+    # long enough for the full convolution, so it does not wrap around
+    size = 4 * DENSITY_GRID
+    convolved = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)[DENSITY_GRID:2 * DENSITY_GRID]
+    density = np.maximum(convolved, 0) / (counts.sum() * bandwidth * np.sqrt(2 * np.pi))
+    return (edges[:-1] + edges[1:]) / 2, density
+
+def box_stats(stats, label):
+    """Box plot statistics for ax.bxp from the quantiles of the histogram, whiskers at 1.5 IQR like ax.boxplot"""
+    q1, median, q3 = stats.quantile(25), stats.quantile(50), stats.quantile(75)
+    iqr = q3 - q1
+    return {'label': label, 'med': median, 'q1': q1, 'q3': q3,
+            'whislo': max(stats.min, q1 - 1.5 * iqr), 'whishi': min(stats.max, q3 + 1.5 * iqr)}
+
+def downsampled_series(df, pixels=CHART_PIXELS):
+    """Mean latency per second, as resample('1S').mean() gives it, reduced to the min and max of every pixel column"""
+    seconds = df['send_time'].to_numpy() // 1000
+    start = seconds.min()
+    index = seconds - start
+    counts = np.bincount(index)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(index, weights=df['latency_ms'].to_numpy(dtype='float64')) / counts
+    if len(means) > 2 * pixels:
+        bucket = -(-len(means) // pixels)
+        columns = np.concatenate([means, np.full(bucket * pixels - len(means), np.nan)]).reshape(pixels, bucket)
+        empty = np.isnan(columns).all(axis=1)
+        lowest = np.where(np.isnan(columns), np.inf, columns).argmin(axis=1)
+        highest = np.where(np.isnan(columns), -np.inf, columns).argmax(axis=1)
+        # both points of a column in the order they were sent, so the line still goes through them in time order
+        offsets = np.stack([np.minimum(lowest, highest), np.maximum(lowest, highest)], axis=1)
+        positions = (np.arange(pixels)[:, None] * bucket + offsets).ravel()
+        values = columns[np.arange(pixels)[:, None], offsets].ravel()
+        values[np.repeat(empty, 2)] = np.nan
+    else:
+        positions = np.arange(len(means))
+        values = means
+    return pd.to_datetime(start + positions, unit='s'), values
+
+def render_chart(task):
+    """Draw one chart of the fast mode, in a worker process of the pool"""
+    kind, title, output_file, series = task
+    fig, ax = plt.subplots(figsize=(14, 8) if kind in ('means', 'boxplot') else (12, 6) if kind == 'density' else (14, 6))
+    if kind == 'density':
+        for index, (label, curve) in enumerate(series):
+            if curve is not None:
+                ax.plot(curve[0], curve[1], color=f"C{index}", label=label)
+                ax.fill_between(curve[0], curve[1], color=f"C{index}", alpha=0.25)
+        ax.set_ylim(bottom=0)
+        ax.set_xlabel("Latency (ms)")
+        ax.set_ylabel("Density")
+        ax.legend()
+    elif kind == 'timeseries':
+        for index, (label, (times, values)) in enumerate(series):
+            ax.plot(times, values, color=f"C{index}", label=label)
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Latency (ms)")
+        ax.legend()
+    elif kind == 'means':
+        topic_list, runs = series
+        x = np.arange(len(topic_list))
+        width = 0.35
+        ax.bar(x - width/2, runs[0][1], width, label=runs[0][0])
+        ax.bar(x + width/2, runs[1][1], width, label=runs[1][0])
+        ax.set_xlabel('Topic')
+        ax.set_ylabel('Mean Latency (ms)')
+        ax.set_xticks(x)
+        ax.set_xticklabels(topic_list, rotation=45, ha='right')
+        ax.legend()
+    else:
+        ax.bxp(series, showfliers=False)
+        ax.set_ylabel('Latency (ms)')
+        ax.set_xticklabels([box['label'] for box in series], rotation=45, ha='right')
+    ax.set_title(title)
+    plt.tight_layout()
+    fig.savefig(output_file, dpi=FIGURE_DPI)
+    plt.close(fig)
+    return output_file
+
+def use_agg_backend():
+    plt.switch_backend('Agg')
+
+def create_comparison_charts_fast(folder1_data, folder2_data, output_folder, folder1_name="Run 1", folder2_name="Run 2", folder1_stats=None, folder2_stats=None, jobs=None):
+    """The charts of create_comparison_charts from data reduced to what can be seen, rendered in parallel.
+    Densities are binned, box plots drawn from quantiles and time series reduced to min/max per pixel,
+    so the time taken does not grow with the number of samples beyond one pass over them."""
+    output_folder = Path(output_folder)
+    output_folder.mkdir(exist_ok=True, parents=True)
+    runs = []
+    for name, data, stats in ((folder1_name, folder1_data, folder1_stats or {}), (folder2_name, folder2_data, folder2_stats or {})):
+        stats = dict(stats)
+        for topic, df in data.items():
+            if topic not in stats:
+                stats[topic] = LatencyStats()
+                stats[topic].update(df['latency_ms'].to_numpy())
+        runs.append((name, data, stats))
+    topic_list = list(set(folder1_data.keys()) | set(folder2_data.keys()))
+    
+    tasks = []
+    stats_data = []
+    boxes = []
+    for topic in topic_list:
+        densities = []
+        series = []
+        for name, data, stats in runs:
+            if topic not in data:
+                continue
+            topic_stats = stats[topic]
+            densities.append((f"{name} (mean: {topic_stats.mean:.2f}ms)", binned_density(data[topic]['latency_ms'].to_numpy(), topic_stats)))
+            if len(data[topic]):
+                series.append((name, downsampled_series(data[topic])))
+            boxes.append(box_stats(topic_stats, f"{topic}\n({name})"))
+            stats_data.append({
+                'Topic': topic,
+                'Run': name,
+                'Count': topic_stats.count,
+                'Mean (ms)': topic_stats.mean,
+                'Median (ms)': topic_stats.median,
+                'Min (ms)': topic_stats.min,
+                'Max (ms)': topic_stats.max,
+                'Std Dev (ms)': topic_stats.std
+            })
+        file_topic = topic.replace('/', '_')
+        tasks.append(('density', f"Latency Distribution for Topic: {topic}", output_folder / f"latency_comparison_{file_topic}.png", densities))
+        tasks.append(('timeseries', f"Latency Over Time for Topic: {topic}", output_folder / f"latency_time_{file_topic}.png", series))
+    means = [(name, [stats[t].mean if t in stats else 0 for t in topic_list]) for name, _, stats in runs]
+    tasks.append(('means', 'Mean Latency Comparison Across Topics', output_folder / "latency_means_comparison.png", (topic_list, means)))
+    tasks.append(('boxplot', 'Latency Distribution Comparison (Box Plot)', output_folder / "latency_boxplot_comparison.png", boxes))
+    
+    with ProcessPoolExecutor(max_workers=jobs, initializer=use_agg_backend) as pool:
+        for output_file in pool.map(render_chart, tasks):
+            print(f"Created chart: {output_file}")
+    
+    stats_output = output_folder / "latency_statistics.csv"
+    pd.DataFrame(stats_data).to_csv(stats_output, index=False)
+    print(f"Saved statistics to: {stats_output}")
+
 def main():
     parser = argparse.ArgumentParser(description='Compare MQTT latency logs between two folders')
     parser.add_argument('folder1', help='Path to first folder with latency logs')
@@ -231,17 +556,23 @@ def main():
     parser.add_argument('--output', '-o', default='./latency_analysis', help='Output folder for charts')
     parser.add_argument('--name1', default='Run 1', help='Name for the first run')
     parser.add_argument('--name2', default='Run 2', help='Name for the second run')
+    parser.add_argument('--jobs', '-j', type=int, default=None, help='Number of latency files loaded in parallel (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='Neither read nor write the Parquet cache next to the latency logs')
+    parser.add_argument('--fast', action='store_true', help='Draw the charts from binned and downsampled data in parallel, for runs with millions of samples')
     
     args = parser.parse_args()
     
     print(f"Loading data from {args.folder1}...")
-    folder1_data = load_latency_data(args.folder1)
+    folder1_data, folder1_stats = load_latency_data(args.folder1, args.jobs, not args.no_cache)
     
     print(f"Loading data from {args.folder2}...")
-    folder2_data = load_latency_data(args.folder2)
+    folder2_data, folder2_stats = load_latency_data(args.folder2, args.jobs, not args.no_cache)
     
     print("Creating comparison charts...")
-    create_comparison_charts(folder1_data, folder2_data, args.output, args.name1, args.name2)
+    if args.fast:
+        create_comparison_charts_fast(folder1_data, folder2_data, args.output, args.name1, args.name2, folder1_stats, folder2_stats, args.jobs)
+    else:
+        create_comparison_charts(folder1_data, folder2_data, args.output, args.name1, args.name2, folder1_stats, folder2_stats)
     
     print(f"Analysis complete! Charts saved to: {args.output}")
 